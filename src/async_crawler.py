@@ -0,0 +1,207 @@
+# async_crawler.py
+"""
+Chế độ thu thập bất đồng bộ (asyncio + aiohttp).
+
+Không cần Chrome: mỗi sản phẩm là một coroutine gọi API đánh giá qua một
+`aiohttp.ClientSession` dùng chung (connection pool, keep-alive). Số request
+đồng thời bị chặn theo từng host bởi `TCPConnector`, nên throughput tăng theo
+mạng chứ không theo số Chrome vừa RAM.
+
+`sink`/`on_done` có thể chặn (hàng đợi writer đầy, băm khử trùng lặp, SQLite), nên
+chúng chạy trên một luồng hand-off riêng: event loop không bao giờ bị chặn, coroutine
+chỉ chờ tới lượt giao kết quả của mình.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from http_engine import (
+    API_BASE_URL,
+    REVIEWS_API_PATH,
+    HTTP_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    MAX_REVIEW_PAGES,
+    USER_AGENT,
+    HttpFetchError,
+    parse_product_ids,
+    build_review_params,
+    reviews_from_payload,
+    last_page_from_payload,
+)
+from review_records import ReviewColumns, ReviewRecord
+
+# --- Constants ---
+ASYNC_PRODUCT_WORKERS = 200  # Số sản phẩm được xử lý song song
+ASYNC_MAX_IN_FLIGHT = 1000  # Tổng số kết nối đồng thời của cả session
+ASYNC_PER_HOST_LIMIT = 64  # Giới hạn kết nối đồng thời cho mỗi host
+ASYNC_KEEPALIVE_TIMEOUT = 30  # Giây giữ kết nối keep-alive
+RETRY_BACKOFF_SECONDS = 1.0
+
+
+async def fetch_page_async(session: aiohttp.ClientSession, base_url: str, product_id: str,
+                           spid: Optional[str], page: int) -> Dict[str, Any]:
+    """Fetches one page of the reviews API, retrying transient failures."""
+    params = {key: str(value) for key, value in build_review_params(product_id, spid, page).items()}
+    last_error: Optional[Exception] = None
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        try:
+            async with session.get(f"{base_url}{REVIEWS_API_PATH}", params=params) as response:
+                if response.status == 429 or response.status >= 500:
+                    last_error = HttpFetchError(f"HTTP {response.status}")
+                elif response.status >= 400:
+                    # Lỗi phía client (404, 403, ...) không tự hết khi thử lại
+                    raise HttpFetchError(f"Request for product {product_id} page {page} failed: HTTP {response.status}")
+                else:
+                    payload = await response.json(content_type=None)
+                    if not isinstance(payload, dict):
+                        raise HttpFetchError(f"Unexpected payload type for product {product_id} page {page}.")
+                    return payload
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            last_error = e
+        except ValueError as e:
+            raise HttpFetchError(f"Invalid JSON for product {product_id} page {page}: {e}") from e
+        await asyncio.sleep(RETRY_BACKOFF_SECONDS * (attempt + 1))
+    raise HttpFetchError(f"Request for product {product_id} page {page} failed: {last_error}")
+
+
+async def fetch_product_reviews_async(session: aiohttp.ClientSession, base_url: str, url: str,
+                                      detail_type: str, max_pages: int = MAX_REVIEW_PAGES,
+                                      start_page: int = 1) -> Tuple[List[ReviewRecord], int, Optional[str]]:
+    """Fetches the first needed page to learn the page count, then all remaining pages concurrently.
+
+    Returns (rows, last page saved, error). When a later page fails, only the pages before the first
+    failed one are returned, with the error, so the product can resume from that page.
+    Raises HttpFetchError when the first page fails.
+    """
+    ids = parse_product_ids(url)
+    if ids is None:
+        raise HttpFetchError(f"Cannot parse product id from URL: {url}")
+    product_id, spid = ids
+
+    start_page = max(1, start_page)
+    first_payload = await fetch_page_async(session, base_url, product_id, spid, start_page)
+    all_reviews = reviews_from_payload(first_payload, detail_type)
+    if not all_reviews:
+        return [], start_page - 1, None
+
+    saved_through = start_page
+    last_page = min(last_page_from_payload(first_payload), max_pages)
+    if last_page > start_page:
+        payloads = await asyncio.gather(*(
+            fetch_page_async(session, base_url, product_id, spid, page_num)
+            for page_num in range(start_page + 1, last_page + 1)
+        ), return_exceptions=True)
+        for payload in payloads: # gather giữ nguyên thứ tự trang
+            if isinstance(payload, BaseException):
+                if not isinstance(payload, HttpFetchError):
+                    raise payload
+                # Chỉ giữ các trang liền mạch trước chỗ hổng để checkpoint không nhảy qua trang thiếu
+                return all_reviews, saved_through, f"page {saved_through + 1} failed: {payload}"
+            all_reviews.extend(reviews_from_payload(payload, detail_type))
+            saved_through += 1
+    return all_reviews, saved_through, None
+
+
+async def _product_worker(queue: "asyncio.Queue[Tuple[str, str]]", session: aiohttp.ClientSession, base_url: str,
+                          sink: Callable[[List[ReviewRecord]], None], failed: List[Tuple[str, str]],
+                          start_page_for: Callable[[str], int], on_done: Optional[Callable[[str, int], None]],
+                          on_partial: Optional[Callable[[str, int, int], None]], hand_off: ThreadPoolExecutor):
+    """Takes (url, detail) tasks off the queue until it is drained."""
+    loop = asyncio.get_running_loop()
+
+    def deliver(url: str, reviews: List[ReviewRecord], saved_through: int, error: Optional[str]):
+        # Chạy trên luồng hand-off: được phép chặn khi writer đang dồn việc (backpressure)
+        if reviews:
+            sink(reviews)
+        if error is None:
+            if on_done is not None:
+                on_done(url, len(reviews))
+        elif on_partial is not None:
+            on_partial(url, saved_through, len(reviews))
+
+    while True:
+        try:
+            url, detail_type = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        try:
+            start_page = await loop.run_in_executor(hand_off, start_page_for, url)
+            reviews, saved_through, error = await fetch_product_reviews_async(session, base_url, url, detail_type,
+                                                                              start_page=start_page)
+            await loop.run_in_executor(hand_off, deliver, url, reviews, saved_through, error)
+            if error is None:
+                logging.info(f"[async] Finished processing {url}. Found {len(reviews)} reviews.")
+            else:
+                logging.warning(f"[async] Partially scraped {url}: {error}; pages up to {saved_through} saved "
+                                f"({len(reviews)} reviews).")
+                failed.append((url, detail_type))
+        except HttpFetchError as e:
+            logging.warning(f"[async] Failed {url}: {e}")
+            failed.append((url, detail_type))
+        except Exception as e:
+            logging.error(f"[async] Unexpected error for {url}: {e}", exc_info=True)
+            failed.append((url, detail_type))
+        finally:
+            queue.task_done()
+
+
+async def crawl_async(tasks: List[Tuple[str, str]], base_url: str = API_BASE_URL,
+                      product_workers: int = ASYNC_PRODUCT_WORKERS,
+                      max_in_flight: int = ASYNC_MAX_IN_FLIGHT,
+                      per_host_limit: int = ASYNC_PER_HOST_LIMIT,
+                      sink: Optional[Callable[[List[ReviewRecord]], None]] = None,
+                      start_page_for: Optional[Callable[[str], int]] = None,
+                      on_done: Optional[Callable[[str, int], None]] = None,
+                      on_partial: Optional[Callable[[str, int, int], None]] = None) -> Tuple[ReviewColumns, List[Tuple[str, str]]]:
+    """Crawls reviews for all (url, detail) tasks; returns (rows, failed tasks).
+
+    When `sink` is given, each product's rows are handed to it instead of being collected in memory.
+    `start_page_for(url)` gives the page to resume from and `on_done(url, n_reviews)` is called per finished product.
+    A product whose later pages failed still has the pages before the gap delivered; it is then reported through
+    `on_partial(url, last_saved_page, n_reviews)` and listed as failed so it can resume from the gap.
+    All callbacks run one at a time on a dedicated thread, so they may block without stalling the event loop.
+    """
+    queue: "asyncio.Queue[Tuple[str, str]]" = asyncio.Queue()
+    for task in tasks:
+        queue.put_nowait(task)
+
+    results = ReviewColumns() # Giữ theo cột khi không có sink: hàng triệu review vẫn gọn trong RAM
+    failed: List[Tuple[str, str]] = []
+    if sink is None:
+        sink = results.extend
+    if start_page_for is None:
+        start_page_for = lambda url: 1
+    connector = aiohttp.TCPConnector(limit=max_in_flight, limit_per_host=per_host_limit,
+                                     keepalive_timeout=ASYNC_KEEPALIVE_TIMEOUT, ttl_dns_cache=300)
+    # Không đặt timeout tổng: request có thể phải xếp hàng chờ kết nối khi đạt giới hạn per-host
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=HTTP_TIMEOUT, sock_read=HTTP_TIMEOUT)
+    headers = {"User-Agent": USER_AGENT, "Accept": "application/json"}
+    # Một luồng duy nhất: giữ thứ tự giao kết quả và sink không cần thread-safe
+    hand_off = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncHandOff")
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            worker_count = max(1, min(product_workers, len(tasks)))
+            logging.info(f"[async] Crawling {len(tasks)} products with {worker_count} coroutines "
+                         f"(max {max_in_flight} in flight, {per_host_limit} per host).")
+            await asyncio.gather(*(
+                _product_worker(queue, session, base_url.rstrip("/"), sink, failed, start_page_for, on_done, on_partial,
+                                hand_off)
+                for _ in range(worker_count)
+            ))
+            await queue.join()
+    finally:
+        hand_off.shutdown(wait=True)
+    return results, failed
+
+
+def run_async_crawl(tasks: List[Tuple[str, str]], base_url: str = API_BASE_URL,
+                    sink: Optional[Callable[[List[ReviewRecord]], None]] = None,
+                    start_page_for: Optional[Callable[[str], int]] = None,
+                    on_done: Optional[Callable[[str, int], None]] = None,
+                    on_partial: Optional[Callable[[str, int, int], None]] = None) -> Tuple[ReviewColumns, List[Tuple[str, str]]]:
+    """Synchronous entry point for callers outside an event loop."""
+    return asyncio.run(crawl_async(tasks, base_url=base_url, sink=sink, start_page_for=start_page_for, on_done=on_done,
+                                   on_partial=on_partial))
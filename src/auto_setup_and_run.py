@@ -37,6 +37,9 @@ REQUIRED_PACKAGES = [
     "webdriver-manager",
     "tkinter",
     "requests",
+    "aiohttp",
+    "lxml",
+    "cssselect",
 ]
 
 class RedirectOutput:
@@ -0,0 +1,199 @@
+# benchmark.py
+"""
+Benchmark offline: chạy scraper end-to-end trên `fixture_server.py` thay vì tiki.vn.
+
+Mỗi chế độ (`selenium`, `http`, `async` của multiThreads4All.py và `single` của
+singleThread.py) chạy trên cùng một catalogue giả lập, với thư mục dữ liệu tạm
+riêng và `--fresh`, nên các lần đo so sánh được với nhau trước/sau mỗi thay đổi.
+Báo cáo: reviews/giây, p50/p95 độ trễ mỗi trang, RSS đỉnh (gồm cả tiến trình con
+như chromedriver/Chrome) và số review thu được so với số review của catalogue.
+
+Ví dụ:  python benchmark.py --modes http async --products 40 --latency-ms 50 --failure-rate 0.02
+Chế độ `selenium` và `single` cần Chrome + chromedriver như khi chạy thật.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fixture_server import FixtureServer, add_config_arguments, config_from_args
+from log_setup import configure_logging
+
+try:
+    import psutil
+except ImportError: # Không có psutil: dùng getrusage (chỉ biết đỉnh của tiến trình đã kết thúc)
+    psutil = None
+
+# --- Constants ---
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Thư mục gốc của dự án
+REPORT_FILE = os.path.join(BASE_DIR, "logs", "benchmark_report.json")  # Báo cáo JSON của lần benchmark gần nhất
+LOG_FILE = os.path.join(BASE_DIR, "logs", "benchmark.log")  # Log của các scraper khi chạy benchmark (tách khỏi log chạy thật)
+BENCHMARK_MODES = ("selenium", "http", "async", "single")
+RSS_SAMPLE_INTERVAL = 0.2  # Giây giữa hai lần đo RSS
+
+
+def _quantile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 4)
+
+
+class PeakRssSampler(threading.Thread):
+    """Samples the resident memory of this process and all its children in the background."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        super().__init__(name="PeakRssSampler", daemon=True)
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if psutil is None:
+            return
+        process = psutil.Process()
+        while not self._stop_event.is_set():
+            total = 0
+            for proc in [process] + process.children(recursive=True):
+                try:
+                    total += proc.memory_info().rss
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    pass
+            self.peak_bytes = max(self.peak_bytes, total)
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        if psutil is None:
+            import resource
+            # ru_maxrss tính bằng KB trên Linux; tiến trình con chỉ được tính khi đã kết thúc
+            self.peak_bytes = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss +
+                               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * 1024
+        return self.peak_bytes
+
+
+def count_output_reviews(output_file: str) -> int:
+    if not os.path.exists(output_file):
+        return 0
+    with open(output_file, newline="", encoding="utf-8-sig") as handle:
+        return sum(1 for _ in csv.DictReader(handle))
+
+
+def _run_multithreaded(engine: str, server: FixtureServer, url_file: str, work_dir: str, lean: bool) -> Dict[str, object]:
+    import multiThreads4All
+    from metrics import METRICS
+
+    multiThreads4All.METRICS_PROM_FILE = os.path.join(work_dir, "scrape_metrics.prom")
+    multiThreads4All.METRICS_JSON_FILE = os.path.join(work_dir, "scrape_metrics.json")
+    multiThreads4All.process_urls_and_save_multithreaded(
+        url_file=url_file, output_file=os.path.join(work_dir, "raw_data.csv"), engine=engine,
+        api_base_url=server.base_url, lean=lean, frontier_file=os.path.join(work_dir, "crawl_frontier.sqlite"),
+        fresh=True, resolve_trackers=False,
+    )
+    return METRICS.summary()
+
+
+def _run_single(server: FixtureServer, url_file: str, work_dir: str) -> Dict[str, object]:
+    import singleThread
+
+    singleThread.URL_FILE = url_file
+    singleThread.OUTPUT_FILE = os.path.join(work_dir, "raw_data.csv")
+    singleThread.JOURNAL_FILE = singleThread.journal_path_for(singleThread.OUTPUT_FILE)
+    singleThread.process_urls_and_save_reviews(fresh=True)
+    return {}
+
+
+def run_mode(mode: str, server: FixtureServer, lean: bool = False, keep_dir: bool = False) -> Dict[str, object]:
+    """Runs one scraper mode against the fixture server and returns its measurements."""
+    work_dir = tempfile.mkdtemp(prefix=f"tiki_bench_{mode}_")
+    url_file = os.path.join(work_dir, "urls.csv")
+    server.write_url_file(url_file)
+    server.reset_stats()
+
+    sampler = PeakRssSampler()
+    sampler.start()
+    started = time.monotonic()
+    error = None
+    summary: Dict[str, object] = {}
+    try:
+        if mode == "single":
+            summary = _run_single(server, url_file, work_dir)
+        else:
+            summary = _run_multithreaded(mode, server, url_file, work_dir, lean)
+    except Exception as e: # Một chế độ lỗi (vd. thiếu Chrome) không dừng cả benchmark
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.monotonic() - started
+    peak_rss = sampler.stop()
+
+    phases = summary.get("phases", {}) if summary else {}
+    if "page" in phases:
+        latency = {"p50": phases["page"]["p50"], "p95": phases["page"]["p95"], "source": "client"}
+    else:
+        # Chế độ không đo từng trang (async, single): lấy khoảng cách giữa các request của cùng sản phẩm
+        page_latencies = server.page_intervals()
+        latency = {"p50": _quantile(page_latencies, 0.5), "p95": _quantile(page_latencies, 0.95), "source": "server"}
+
+    reviews = count_output_reviews(os.path.join(work_dir, "raw_data.csv"))
+    result = {
+        "mode": mode,
+        "elapsed_seconds": round(elapsed, 3),
+        "reviews": reviews,
+        "expected_reviews": server.catalogue.total_reviews(),
+        "reviews_per_second": round(reviews / elapsed, 3) if elapsed > 0 else None,
+        "page_latency_p50": latency["p50"],
+        "page_latency_p95": latency["p95"],
+        "page_latency_source": latency["source"],
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+        "requests_served": server.requests_served,
+        "error": error,
+    }
+    if keep_dir:
+        result["work_dir"] = work_dir
+    else:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+
+def print_report(results: List[Dict[str, object]]):
+    header = f"{'mode':<10}{'reviews':>10}{'expected':>10}{'rev/s':>10}{'p50 (s)':>10}{'p95 (s)':>10}{'RSS (MB)':>10}  note"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(f"{result['mode']:<10}{result['reviews']:>10}{result['expected_reviews']:>10}"
+              f"{str(result['reviews_per_second']):>10}{str(result['page_latency_p50']):>10}"
+              f"{str(result['page_latency_p95']):>10}{result['peak_rss_mb']:>10}  {result['error'] or ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers end to end against a local fixture server.")
+    parser.add_argument("--modes", nargs="+", choices=BENCHMARK_MODES, default=["http", "async"],
+                        help="Scraper modes to run, in order ('selenium' and 'single' need Chrome).")
+    parser.add_argument("--lean", action="store_true", help="Run the Selenium modes in lean mode.")
+    parser.add_argument("--report", default=REPORT_FILE, help="Where to write the JSON report.")
+    parser.add_argument("--keep", action="store_true", help="Keep each mode's temporary data directory.")
+    parser.add_argument("--log-file", default=LOG_FILE, help="Where the scrapers' logs go during the benchmark.")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.log_file)), exist_ok=True)
+    configure_logging(args.log_file, console=False) # Bảng kết quả in ra console, log của scraper chỉ vào file
+    config = config_from_args(args)
+    results = []
+    with FixtureServer(config) as server:
+        print(f"Fixture server on {server.base_url}: {len(server.catalogue.products)} products, "
+              f"{server.catalogue.total_reviews()} reviews")
+        for mode in args.modes:
+            print(f"Running '{mode}'...")
+            results.append(run_mode(mode, server, lean=args.lean, keep_dir=args.keep))
+
+    print_report(results)
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as handle:
+        json.dump({"config": vars(config), "results": results}, handle, ensure_ascii=False, indent=2)
+    print(f"Report written to '{args.report}'.")
@@ -0,0 +1,340 @@
+# category_tree.py
+"""
+Khám phá cây danh mục Tiki theo chiều rộng (BFS) đến các danh mục lá.
+
+Thay vì đọc các link "Danh mục" trên trang chủ theo class CSS dễ vỡ, cây được
+duyệt qua API danh mục (`/api/v2/categories?parent_id=...`) với số request song
+song giới hạn. Cây được lưu trong chỉ mục SQLite (mặc định
+`data/category_index.sqlite`): id, slug, tên, cha, độ sâu, lá hay không, lần thấy
+cuối và lần mở rộng cuối.
+
+Lần chạy sau chỉ gọi API cho các nút mới, các nút có thông tin thay đổi so với
+lần trước, hoặc các nút đã quá hạn làm mới; các nhánh còn lại được lấy thẳng từ
+chỉ mục. Danh sách lá là đơn vị chia việc (shard) cho các bước crawl phía sau,
+nhỏ và đều hơn nhiều so với 26 danh mục gốc.
+
+Cột `detail` của file danh mục (thành cột `type` của review) vẫn là số thứ tự
+0–25 của danh mục cấp 1 chứa lá đó, như khi mỗi dòng là một danh mục cấp 1. Số thứ
+tự được lưu trong bảng `top_level_types`: lần đầu lấy theo thứ tự dòng của
+`urls.csv` cũ (chỉ có cột URL), danh mục cấp 1 mới nhận số kế tiếp. Id của lá nằm
+ở cột `category_id` riêng.
+"""
+import csv
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from http_engine import API_BASE_URL, HTTP_TIMEOUT, USER_AGENT, retrying_adapter
+
+# --- Constants ---
+CATEGORY_API_PATH = "/api/v2/categories"
+ROOT_CATEGORY_ID = 2  # Danh mục gốc của Tiki; con của nó là các danh mục cấp 1
+MAX_CATEGORY_DEPTH = 6  # Chặn trên độ sâu, phòng API trả cây vòng
+CATEGORY_WORKERS = 8  # Số request danh mục chạy song song
+CATEGORY_REFRESH_SECONDS = 7 * 24 * 3600  # Nút không đổi vẫn được mở rộng lại sau khoảng này
+CATEGORY_FILE_COLUMNS = ["URL", "detail", "category_id", "parent_id", "depth", "name"]
+CATEGORY_URL_PATTERN = re.compile(r"/c(\d+)/?$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL,
+    name TEXT,
+    parent_id INTEGER,
+    depth INTEGER NOT NULL,
+    is_leaf INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 1,
+    first_seen REAL,
+    last_seen REAL,
+    last_expanded REAL
+);
+CREATE INDEX IF NOT EXISTS idx_categories_parent ON categories (parent_id);
+CREATE TABLE IF NOT EXISTS top_level_types (
+    category_id INTEGER PRIMARY KEY,
+    type_index INTEGER NOT NULL UNIQUE
+);
+"""
+
+
+class CategoryFetchError(Exception):
+    """Raised when the children of a category cannot be fetched."""
+
+
+class CategoryNode:
+    """One category of the tree as listed by its parent."""
+
+    __slots__ = ("id", "slug", "name", "parent_id", "depth", "is_leaf")
+
+    def __init__(self, id: int, slug: str, name: str, parent_id: Optional[int], depth: int, is_leaf: bool):
+        self.id = id
+        self.slug = slug
+        self.name = name
+        self.parent_id = parent_id
+        self.depth = depth
+        self.is_leaf = is_leaf
+
+    @classmethod
+    def from_api_item(cls, item: Dict[str, Any], parent_id: int, depth: int) -> Optional["CategoryNode"]:
+        """Builds a node from one item of the categories API, or None if it has no id/slug."""
+        try:
+            category_id = int(item.get("id"))
+        except (TypeError, ValueError):
+            return None
+        slug = (item.get("url_key") or "").strip()
+        if not slug:
+            return None
+        return cls(category_id, slug, (item.get("name") or "").strip(), parent_id, depth, bool(item.get("is_leaf")))
+
+    def url(self, base_url: str = API_BASE_URL) -> str:
+        return f"{base_url.rstrip('/')}/{self.slug}/c{self.id}"
+
+    def same_listing(self, other: "CategoryNode") -> bool:
+        """True when the parent still lists this node with the same slug, name, parent and leaf flag."""
+        return (self.slug, self.name, self.parent_id, self.is_leaf) == \
+            (other.slug, other.name, other.parent_id, other.is_leaf)
+
+    def __repr__(self) -> str:
+        return f"CategoryNode(id={self.id}, slug={self.slug!r}, depth={self.depth})"
+
+
+class CategoryFetcher:
+    """Fetches the direct children of a category through a pooled `requests.Session`."""
+
+    def __init__(self, base_url: str = API_BASE_URL, timeout: float = HTTP_TIMEOUT, pool_size: int = CATEGORY_WORKERS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = retrying_adapter(pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT, "Accept": "application/json"})
+
+    def fetch_children(self, parent_id: int) -> List[Dict[str, Any]]:
+        """Returns the raw API items of the children of `parent_id`."""
+        params = {"include": "children", "parent_id": parent_id}
+        try:
+            response = self.session.get(f"{self.base_url}{CATEGORY_API_PATH}", params=params, timeout=self.timeout)
+            response.raise_for_status()
+            payload = response.json()
+        except requests.RequestException as e:
+            raise CategoryFetchError(f"Category request for parent {parent_id} failed: {e}") from e
+        except ValueError as e:
+            raise CategoryFetchError(f"Invalid JSON for parent {parent_id}: {e}") from e
+        return [item for item in (payload.get("data") or []) if isinstance(item, dict)]
+
+    def close(self):
+        self.session.close()
+
+
+class CategoryIndex:
+    """Thread-safe SQLite index of the category tree."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _node(row: Tuple) -> CategoryNode:
+        category_id, slug, name, parent_id, depth, is_leaf = row
+        return CategoryNode(category_id, slug, name or "", parent_id, depth, bool(is_leaf))
+
+    def lookup(self, category_id: int) -> Optional[Tuple[CategoryNode, Optional[float]]]:
+        """Returns the stored (node, last_expanded) of an active category, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, slug, name, parent_id, depth, is_leaf, last_expanded FROM categories "
+                "WHERE id = ? AND active = 1", (category_id,)
+            ).fetchone()
+        return (self._node(row[:6]), row[6]) if row else None
+
+    def children(self, parent_id: int) -> List[CategoryNode]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, slug, name, parent_id, depth, is_leaf FROM categories "
+                "WHERE parent_id = ? AND active = 1 ORDER BY id", (parent_id,)
+            ).fetchall()
+        return [self._node(row) for row in rows]
+
+    def upsert(self, node: CategoryNode, seen_at: float):
+        """Records that `node` was listed (or reached through the index) at `seen_at`."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO categories (id, slug, name, parent_id, depth, is_leaf, active, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET slug = excluded.slug, name = excluded.name, "
+                "parent_id = excluded.parent_id, depth = excluded.depth, is_leaf = excluded.is_leaf, "
+                "active = 1, last_seen = excluded.last_seen",
+                (node.id, node.slug, node.name, node.parent_id, node.depth, int(node.is_leaf), seen_at, seen_at),
+            )
+
+    def mark_expanded(self, parent_id: int, child_ids: List[int], expanded_at: float):
+        """Stores a fresh expansion; children no longer listed are deactivated."""
+        placeholders = ",".join("?" * len(child_ids))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                f"UPDATE categories SET active = 0 WHERE parent_id = ? AND id NOT IN ({placeholders})",
+                (parent_id, *child_ids),
+            )
+            self._conn.execute("UPDATE categories SET last_expanded = ? WHERE id = ?", (expanded_at, parent_id))
+            self._conn.execute("COMMIT")
+
+    def crawl_units(self, seen_since: float, max_depth: int = MAX_CATEGORY_DEPTH,
+                    top_level: bool = False) -> List[CategoryNode]:
+        """Categories seen since `seen_since` to crawl: leaves (or depth-capped nodes), or depth-1 nodes."""
+        # Nút không có con nào đang hoạt động cũng là lá, dù API không đánh dấu is_leaf
+        condition = "depth = 1" if top_level else (
+            "(is_leaf = 1 OR depth >= ? OR NOT EXISTS (SELECT 1 FROM categories AS child "
+            "WHERE child.parent_id = categories.id AND child.active = 1))")
+        params = (seen_since,) if top_level else (seen_since, max_depth)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, slug, name, parent_id, depth, is_leaf FROM categories "
+                f"WHERE active = 1 AND last_seen >= ? AND {condition} ORDER BY id", params
+            ).fetchall()
+        return [self._node(row) for row in rows]
+
+    def seed_type_indexes(self, category_ids: List[int]) -> int:
+        """Numbers top-level categories in the given order if none are numbered yet; returns how many were."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM top_level_types LIMIT 1").fetchone():
+                return 0
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR IGNORE INTO top_level_types (category_id, type_index) VALUES (?, ?)",
+                                   [(category_id, index) for index, category_id in enumerate(category_ids)])
+            self._conn.execute("COMMIT")
+            return self._conn.execute("SELECT COUNT(*) FROM top_level_types").fetchone()[0]
+
+    def type_indexes(self, nodes: Iterable[CategoryNode]) -> Dict[int, int]:
+        """Maps each node id to the stable index of its depth-1 ancestor, numbering new top-levels after the rest."""
+        with self._lock:
+            parents = {category_id: (parent_id, depth) for category_id, parent_id, depth in
+                       self._conn.execute("SELECT id, parent_id, depth FROM categories")}
+            known = dict(self._conn.execute("SELECT category_id, type_index FROM top_level_types"))
+
+        def top_level(category_id: int) -> int:
+            # Đi ngược lên cha đến nút độ sâu 1 (giới hạn số bước phòng cây vòng)
+            for _ in range(MAX_CATEGORY_DEPTH + 1):
+                parent_id, depth = parents.get(category_id, (None, 1))
+                if depth <= 1 or parent_id is None:
+                    break
+                category_id = parent_id
+            return category_id
+
+        tops = {node.id: top_level(node.id) for node in nodes}
+        new_tops = sorted(set(tops.values()) - set(known))
+        if new_tops:
+            next_index = max(known.values(), default=-1) + 1
+            added = [(category_id, next_index + offset) for offset, category_id in enumerate(new_tops)]
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("INSERT INTO top_level_types (category_id, type_index) VALUES (?, ?)", added)
+                self._conn.execute("COMMIT")
+            known.update(added)
+        return {node_id: known[top_id] for node_id, top_id in tops.items()}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM categories WHERE active = 1").fetchone()[0]
+
+
+def discover_category_tree(index: CategoryIndex, fetcher: CategoryFetcher, root_id: int = ROOT_CATEGORY_ID,
+                           max_depth: int = MAX_CATEGORY_DEPTH, workers: int = CATEGORY_WORKERS,
+                           refresh_after: float = CATEGORY_REFRESH_SECONDS, full: bool = False) -> Dict[str, Any]:
+    """Walks the tree breadth-first from `root_id`, calling the API only for new, changed or stale nodes."""
+    started = time.time()
+    stats = {"started": started, "expanded": 0, "reused": 0, "new": 0, "changed": 0, "failed": 0}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="CategoryWalker") as pool:
+        pending: Dict[Future, Tuple[int, int]] = {}
+
+        def expand(category_id: int, depth: int):
+            pending[pool.submit(fetcher.fetch_children, category_id)] = (category_id, depth)
+
+        def visit(node: CategoryNode, listed_changed: bool, last_expanded: Optional[float]):
+            # Chỉ chạy trên luồng chính: mọi thao tác với chỉ mục đều tuần tự
+            index.upsert(node, started)
+            if node.is_leaf or node.depth >= max_depth:
+                return
+            stale = last_expanded is None or started - last_expanded > refresh_after
+            if full or listed_changed or stale:
+                expand(node.id, node.depth)
+                return
+            stats["reused"] += 1
+            reuse_children(node.id)
+
+        def reuse_children(category_id: int):
+            # Nhánh không đổi: đi tiếp theo chỉ mục, không gọi API
+            for child in index.children(category_id):
+                stored = index.lookup(child.id)
+                visit(child, False, stored[1] if stored else None)
+
+        expand(root_id, 0)
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                parent_id, depth = pending.pop(future)
+                try:
+                    items = future.result()
+                except CategoryFetchError as e:
+                    # Giữ nhánh đã biết trong chỉ mục thay vì làm mất cả cây con
+                    logging.warning(f"{e}; reusing indexed children.")
+                    stats["failed"] += 1
+                    reuse_children(parent_id)
+                    continue
+                stats["expanded"] += 1
+                children = [node for node in (CategoryNode.from_api_item(item, parent_id, depth + 1)
+                                              for item in items) if node is not None]
+                for child in children:
+                    stored = index.lookup(child.id)
+                    changed = stored is None or not child.same_listing(stored[0])
+                    if changed:
+                        stats["new" if stored is None else "changed"] += 1
+                    visit(child, changed, stored[1] if stored else None)
+                index.mark_expanded(parent_id, [child.id for child in children], time.time())
+    return stats
+
+
+def legacy_type_order(category_file: str) -> List[int]:
+    """Category ids of a pre-index `urls.csv` (URL column only) in row order, i.e. by their old `detail` index."""
+    if not os.path.exists(category_file):
+        return []
+    with open(category_file, newline="", encoding="utf-8-sig") as handle:
+        reader = csv.DictReader(handle)
+        if "category_id" in (reader.fieldnames or []):
+            return [] # File đã do chỉ mục ghi: số thứ tự nằm trong bảng top_level_types
+        category_ids = []
+        for row in reader:
+            match = CATEGORY_URL_PATTERN.search((row.get("URL") or "").strip())
+            if match:
+                category_ids.append(int(match.group(1)))
+    return category_ids
+
+
+def write_category_file(nodes: List[CategoryNode], output_file: str, type_indexes: Dict[int, int],
+                        base_url: str = API_BASE_URL) -> int:
+    """Writes the crawl units as a `urls.csv`-style file (URL, detail = top-level index, ...); returns the row count."""
+    temp_file = output_file + ".tmp"
+    with open(temp_file, "w", newline="", encoding="utf-8-sig") as handle:
+        writer = csv.DictWriter(handle, fieldnames=CATEGORY_FILE_COLUMNS)
+        writer.writeheader()
+        for node in nodes:
+            writer.writerow({"URL": node.url(base_url), "detail": type_indexes[node.id], "category_id": node.id,
+                             "parent_id": node.parent_id, "depth": node.depth, "name": node.name})
+    os.replace(temp_file, output_file)
+    return len(nodes)
@@ -0,0 +1,255 @@
+# columnar_writer.py
+"""
+Ghi review ra Parquet theo cột, chia thư mục theo `type` (partition kiểu Hive).
+
+Thay cho một file CSV UTF-8-BOM phải đọc lại toàn bộ bằng `pd.read_csv` mỗi lần
+phân tích, kết quả được ghi thành dataset:
+    data/raw_data_parquet/type=<detail>/part-<run>-<n>.parquet
+  - mỗi partition gom dòng thành row group rồi ghi ngay khi đủ, không chờ hết crawl;
+  - cột ngắn, lặp nhiều (title, ...) dùng dictionary encoding, văn bản nén zstd;
+  - file đang ghi mang đuôi `.tmp` và được đổi tên khi đóng; file được đóng định kỳ
+    (`PARQUET_FILE_SECONDS`) nên crash chỉ mất phần dữ liệu của file đang mở.
+    Checkpoint của frontier và seen-set chỉ được ghi sau khi file chứa các dòng đó
+    đã đổi tên, nên dòng trong file `.tmp` bỏ dở sẽ được crawl lại ở lần chạy sau.
+
+Đọc một danh mục hoặc một cột mà không đọc cả dataset:
+    read_reviews("data/raw_data_parquet", types=["12"], columns=["content"])
+
+Cần `pyarrow` (tuỳ chọn: chỉ khi chọn output Parquet).
+"""
+import argparse
+import glob
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import quote
+
+from result_writer import StreamingResultWriter
+from review_dedup import ReviewDeduplicator
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError: # pyarrow là tuỳ chọn: chỉ cần khi ghi/đọc Parquet
+    pa = None
+
+# --- Constants ---
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+OUTPUT_FORMATS = (FORMAT_CSV, FORMAT_PARQUET)
+PARTITION_COLUMN = "type"
+PARQUET_COMPRESSION = "zstd"
+PARQUET_COMPRESSION_LEVEL = 6
+PARQUET_ROW_GROUP_ROWS = 20000  # Số dòng mỗi row group của một partition
+PARQUET_FILE_SECONDS = 60.0  # Đóng (commit) các file đang mở sau khoảng này
+PARQUET_DIR_SUFFIX = "_parquet"
+NON_DICTIONARY_COLUMNS = {"content"}  # Cột gần như không lặp lại: dictionary chỉ tốn chỗ
+TEMP_SUFFIX = ".tmp"
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+
+
+def parquet_dir_for(output_file: str) -> str:
+    """Default dataset directory next to an output CSV (`raw_data.csv` -> `raw_data_parquet`)."""
+    return os.path.splitext(output_file)[0] + PARQUET_DIR_SUFFIX
+
+
+def partition_dir(root: str, value: Optional[str]) -> str:
+    # Giá trị được mã hoá URI như pyarrow mong đợi với partition Hive
+    return os.path.join(root, f"{PARTITION_COLUMN}={quote(str(value if value is not None else 'N/A'), safe='')}")
+
+
+def dataset_files(root: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(root, f"{PARTITION_COLUMN}=*", "*.parquet")))
+
+
+def remove_stale_parts(root: str) -> int:
+    """Deletes half-written `.tmp` parts left by a crashed run; returns how many were removed."""
+    stale = glob.glob(os.path.join(root, f"{PARTITION_COLUMN}=*", f"*.parquet{TEMP_SUFFIX}"))
+    for path in stale:
+        os.remove(path)
+    return len(stale)
+
+
+class _PartitionPart:
+    """The open Parquet file of one partition plus its rows not yet written as a row group."""
+
+    def __init__(self, final_path: str, schema: "pa.Schema", use_dictionary: List[str]):
+        self.final_path = final_path
+        self.temp_path = final_path + TEMP_SUFFIX
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        self.writer = pq.ParquetWriter(self.temp_path, schema, compression=PARQUET_COMPRESSION,
+                                       compression_level=PARQUET_COMPRESSION_LEVEL, use_dictionary=use_dictionary)
+        self.columns: Dict[str, List[Optional[str]]] = {name: [] for name in schema.names}
+        self.pending = 0
+
+    def add(self, row: Dict[str, str]):
+        for name, values in self.columns.items():
+            value = row.get(name)
+            values.append(None if value is None else str(value))
+        self.pending += 1
+
+    def flush(self):
+        if self.pending:
+            self.writer.write_table(pa.table(self.columns, schema=self.writer.schema))
+            for values in self.columns.values():
+                values.clear()
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        os.replace(self.temp_path, self.final_path) # Chỉ file đã đóng (có footer) mới mang đuôi .parquet
+
+
+class ParquetDatasetWriter:
+    """Appends review rows to a `type`-partitioned Parquet dataset, one row group per full buffer."""
+
+    def __init__(self, root: str, columns: List[str], row_group_rows: int = PARQUET_ROW_GROUP_ROWS,
+                 file_seconds: float = PARQUET_FILE_SECONDS):
+        require_pyarrow()
+        self.root = root
+        self.row_group_rows = row_group_rows
+        self.file_seconds = file_seconds
+        # Cột partition nằm trong tên thư mục, không lặp lại trong từng file
+        data_columns = [name for name in columns if name != PARTITION_COLUMN]
+        self.schema = pa.schema([(name, pa.string()) for name in data_columns])
+        self.use_dictionary = [name for name in data_columns if name not in NON_DICTIONARY_COLUMNS]
+        self.run_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._parts: Dict[str, _PartitionPart] = {}
+        self._sequence = 0
+        self._opened_at = time.monotonic()
+        self.rows_written = 0
+        os.makedirs(root, exist_ok=True)
+
+    def write_rows(self, rows: Iterable[Dict[str, str]]):
+        for row in rows:
+            value = row.get(PARTITION_COLUMN) or "N/A"
+            part = self._parts.get(value)
+            if part is None:
+                if not self._parts:
+                    self._opened_at = time.monotonic()
+                self._sequence += 1
+                path = os.path.join(partition_dir(self.root, value), f"part-{self.run_id}-{self._sequence:05d}.parquet")
+                part = self._parts[value] = _PartitionPart(path, self.schema, self.use_dictionary)
+            part.add(row)
+            self.rows_written += 1
+            if part.pending >= self.row_group_rows:
+                part.flush()
+
+    def checkpoint(self) -> bool:
+        """Commits the open files once they are older than `file_seconds`; True when no rows are left uncommitted."""
+        if self._parts and time.monotonic() - self._opened_at >= self.file_seconds:
+            self.close()
+        return not self._parts
+
+    def close(self):
+        """Commits every open file; a file that fails does not stop the others, its error is raised after."""
+        errors = []
+        for value, part in list(self._parts.items()):
+            try:
+                part.close()
+            except (OSError, pa.ArrowException) as e:
+                errors.append(e)
+            del self._parts[value]
+        if errors:
+            raise errors[0]
+
+
+class ColumnarResultWriter(StreamingResultWriter):
+    """`StreamingResultWriter` that writes a partitioned Parquet dataset instead of a CSV file."""
+
+    _WRITE_ERRORS = (OSError,) if pa is None else (OSError, pa.ArrowException)
+
+    def __init__(self, output_dir: str, columns: List[str], append: bool = False,
+                 deduplicator: Optional[ReviewDeduplicator] = None,
+                 row_group_rows: int = PARQUET_ROW_GROUP_ROWS, file_seconds: float = PARQUET_FILE_SECONDS):
+        require_pyarrow()
+        super().__init__(output_dir, columns, append=append, deduplicator=deduplicator)
+        self.row_group_rows = row_group_rows
+        self.file_seconds = file_seconds
+
+    def _open_sink(self):
+        if not self.append:
+            for path in dataset_files(self.output_file):
+                os.remove(path)
+        self._dataset = ParquetDatasetWriter(self.output_file, self.columns, self.row_group_rows, self.file_seconds)
+
+    def _write_rows(self, rows: List[Dict[str, str]]):
+        self._dataset.write_rows(rows)
+
+    def _sync(self) -> bool:
+        # Dòng chỉ bền vững khi file chứa nó đã đổi tên khỏi `.tmp`
+        if self.error is not None:
+            return False
+        try:
+            return self._dataset.checkpoint()
+        except self._WRITE_ERRORS as e:
+            # File hỏng không được đổi tên: không checkpoint gì thêm để lần sau crawl lại
+            self.error = e
+            logging.error(f"Could not commit Parquet parts in '{self.output_file}': {e}")
+            return False
+
+    def _close_sink(self):
+        self._dataset.close()
+
+
+def write_parquet_dataset(rows: Iterable[Dict[str, str]], root: str, columns: List[str]) -> int:
+    """Writes `rows` as a fresh partitioned dataset in `root`; returns the row count."""
+    for path in dataset_files(root):
+        os.remove(path)
+    writer = ParquetDatasetWriter(root, columns, file_seconds=float("inf"))
+    try:
+        writer.write_rows(rows)
+    finally:
+        writer.close()
+    return writer.rows_written
+
+
+def open_dataset(root: str) -> "ds.Dataset":
+    require_pyarrow()
+    # `type` luôn là chuỗi dictionary-encoded, kể cả khi giá trị trông như số
+    partitioning = ds.HivePartitioning.discover(
+        schema=pa.schema([(PARTITION_COLUMN, pa.dictionary(pa.int32(), pa.string()))]))
+    return ds.dataset(root, format="parquet", partitioning=partitioning)
+
+
+def iter_dataset_rows(root: str, columns: Optional[List[str]] = None) -> Iterator[Dict[str, str]]:
+    """Yields the rows of a dataset as dicts, one record batch at a time."""
+    dataset = open_dataset(root)
+    for batch in dataset.to_batches(columns=columns):
+        yield from batch.to_pylist()
+
+
+def read_reviews(root: str, types: Optional[List[str]] = None, columns: Optional[List[str]] = None):
+    """Loads a dataset into pandas, reading only the requested `type` partitions and columns."""
+    dataset = open_dataset(root)
+    row_filter = ds.field(PARTITION_COLUMN).isin([str(value) for value in types]) if types else None
+    # `type` là cột dictionary nên thành pandas Categorical
+    return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Inspect a type-partitioned Parquet review dataset.")
+    parser.add_argument("dataset", help="Dataset directory (e.g. data/raw_data_parquet).")
+    args = parser.parse_args()
+
+    require_pyarrow()
+    files = dataset_files(args.dataset)
+    partitions: Dict[str, List[int]] = {}
+    for path in files:
+        metadata = pq.ParquetFile(path).metadata
+        stats = partitions.setdefault(os.path.basename(os.path.dirname(path)), [0, 0, 0])
+        stats[0] += metadata.num_rows
+        stats[1] += metadata.num_row_groups
+        stats[2] += os.path.getsize(path)
+    for name, (rows, row_groups, size) in sorted(partitions.items()):
+        print(f"{name}: {rows} rows in {row_groups} row groups, {size / 1024:.0f} KiB")
+    print(f"{len(partitions)} partitions, {len(files)} files, {sum(s[0] for s in partitions.values())} rows")
@@ -0,0 +1,201 @@
+# concurrency_controller.py
+"""
+Điều chỉnh số worker hoạt động theo kiểu AIMD thay cho MAX_WORKERS cố định.
+
+Worker gọi `acquire()` trước mỗi URL và `release(latency, timed_out)` sau khi xong.
+Một luồng nền định kỳ đo độ trễ trang, tỉ lệ timeout, CPU và RAM còn trống:
+  - máy/website quá tải (trễ tăng vọt, nhiều timeout, CPU cao, RAM thấp)
+    -> giảm theo cấp số nhân (multiplicative decrease);
+  - mọi thứ ổn và tất cả slot đang bận -> tăng thêm 1 worker (additive increase).
+Số worker được chọn luôn nằm trong [min_workers, max_workers] và được ghi log.
+psutil là tuỳ chọn; không có thì dùng load average và /proc/meminfo nếu có.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:  # psutil là tuỳ chọn
+    psutil = None
+
+# --- Constants ---
+ADJUST_INTERVAL = 10.0  # Giây giữa hai lần điều chỉnh
+LATENCY_TOLERANCE = 2.0  # Giảm khi độ trễ trung bình vượt quá N lần mức nền (độ trễ thấp gần đây)
+TIMEOUT_RATE_LIMIT = 0.2  # Giảm khi tỉ lệ timeout trong một chu kỳ vượt ngưỡng này
+CPU_HIGH_PERCENT = 90.0  # Giảm khi CPU vượt ngưỡng này
+MIN_FREE_MEMORY_MB = 1024  # Giảm khi RAM trống dưới ngưỡng này (mỗi Chrome ~300-500 MB)
+BASELINE_DRIFT = 1.1  # Mức nền được phép tăng dần mỗi chu kỳ để thích nghi khi website chậm hẳn đi
+DECREASE_FACTOR = 0.7  # Hệ số giảm (multiplicative decrease)
+INCREASE_STEP = 1  # Số worker tăng thêm mỗi chu kỳ (additive increase)
+LATENCY_SAMPLES_KEPT = 1000
+
+
+def cpu_percent() -> Optional[float]:
+    """System-wide CPU utilization in percent, or None if it cannot be measured."""
+    if psutil is not None:
+        return psutil.cpu_percent(interval=None)
+    try:
+        return 100.0 * os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def free_memory_mb() -> Optional[float]:
+    """Available memory in MB, or None if it cannot be measured."""
+    if psutil is not None:
+        return psutil.virtual_memory().available / (1024 * 1024)
+    try:
+        with open("/proc/meminfo") as handle:
+            for line in handle:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class ConcurrencyController:
+    """Gates worker threads and adapts how many may run at once."""
+
+    def __init__(self, min_workers: int, max_workers: int, initial: Optional[int] = None,
+                 interval: float = ADJUST_INTERVAL, latency_tolerance: float = LATENCY_TOLERANCE,
+                 timeout_rate_limit: float = TIMEOUT_RATE_LIMIT, cpu_high: float = CPU_HIGH_PERCENT,
+                 min_free_memory_mb: float = MIN_FREE_MEMORY_MB,
+                 on_change: Optional[Callable[[int], None]] = None):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        initial = self.max_workers if initial is None else initial
+        self.limit = min(self.max_workers, max(self.min_workers, initial))
+        self.interval = interval
+        self.latency_tolerance = latency_tolerance
+        self.timeout_rate_limit = timeout_rate_limit
+        self.cpu_high = cpu_high
+        self.min_free_memory_mb = min_free_memory_mb
+        self.on_change = on_change # Ví dụ: thu nhỏ pool driver khi giảm số worker
+        self._cond = threading.Condition()
+        self._active = 0
+        self._window: List[Tuple[float, bool]] = [] # (latency, timed_out) trong chu kỳ hiện tại
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES_KEPT)
+        self._baseline: Optional[float] = None
+        self._peak_active = 0
+        self.history: List[Tuple[float, int, str]] = [] # (thời điểm, số worker, lý do)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ConcurrencyController", daemon=True)
+        if psutil is not None:
+            psutil.cpu_percent(interval=None) # Lần gọi đầu chỉ khởi tạo bộ đếm
+
+    # --- Lifecycle ---
+    def start(self):
+        self._record(self.limit, "initial")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join(timeout=self.interval + 1)
+        logging.info(f"Concurrency controller stopped. Worker limit history: "
+                     f"{[limit for _, limit, _ in self.history]}")
+
+    # --- API cho worker ---
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until this worker may start a task; False on timeout or after stop()."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._active >= self.limit and not self._stop.is_set():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 1.0)
+            self._active += 1
+            self._peak_active = max(self._peak_active, self._active)
+            return True
+
+    def release(self, latency: Optional[float] = None, timed_out: bool = False):
+        """Frees the slot and records how long the task took (per page, ideally)."""
+        with self._cond:
+            self._active -= 1
+            if latency is not None or timed_out:
+                self._window.append((latency or 0.0, timed_out))
+            self._cond.notify()
+
+    def record_latency(self, latency: float, timed_out: bool = False):
+        """Records one more latency sample without touching the slot count."""
+        with self._cond:
+            self._window.append((latency, timed_out))
+
+    # --- Điều chỉnh ---
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.adjust()
+
+    def adjust(self) -> int:
+        """Runs one AIMD step and returns the new limit."""
+        with self._cond:
+            window, self._window = self._window, []
+            saturated = self._peak_active >= self.limit
+            self._peak_active = self._active
+            old_limit = self.limit
+
+        reasons = []
+        latencies = [latency for latency, timed_out in window if not timed_out]
+        avg_latency = sum(latencies) / len(latencies) if latencies else None
+        if avg_latency is not None:
+            self._latencies.extend(latencies)
+            if self._baseline is None:
+                self._baseline = avg_latency
+            else:
+                self._baseline = min(avg_latency, self._baseline * BASELINE_DRIFT)
+            if avg_latency > self._baseline * self.latency_tolerance:
+                reasons.append(f"latency {avg_latency:.2f}s > {self.latency_tolerance}x baseline {self._baseline:.2f}s")
+        timeout_rate = sum(1 for _, timed_out in window if timed_out) / len(window) if window else 0.0
+        if timeout_rate > self.timeout_rate_limit:
+            reasons.append(f"timeout rate {timeout_rate:.0%}")
+        cpu = cpu_percent()
+        if cpu is not None and cpu > self.cpu_high:
+            reasons.append(f"CPU {cpu:.0f}%")
+        free_mb = free_memory_mb()
+        if free_mb is not None and free_mb < self.min_free_memory_mb:
+            reasons.append(f"free memory {free_mb:.0f} MB")
+
+        if reasons:
+            new_limit = max(self.min_workers, int(old_limit * DECREASE_FACTOR))
+            reason = "decrease: " + ", ".join(reasons)
+        elif saturated and window:
+            new_limit = min(self.max_workers, old_limit + INCREASE_STEP)
+            reason = "increase: all workers busy, no pressure"
+        else:
+            new_limit, reason = old_limit, "hold"
+
+        with self._cond:
+            self.limit = new_limit
+            self._cond.notify_all()
+        cpu_text = "n/a" if cpu is None else f"{cpu:.0f}%"
+        mem_text = "n/a" if free_mb is None else f"{free_mb:.0f} MB"
+        latency_text = "n/a" if avg_latency is None else f"{avg_latency:.2f}s"
+        # Chỉ ghi INFO khi số worker thay đổi để log không bị ngập
+        log = logging.info if new_limit != old_limit else logging.debug
+        log(f"[concurrency] workers {old_limit} -> {new_limit} ({reason}; {len(window)} samples, "
+            f"avg latency {latency_text}, timeouts {timeout_rate:.0%}, CPU {cpu_text}, free {mem_text})")
+        if new_limit != old_limit:
+            self._record(new_limit, reason)
+            if self.on_change is not None:
+                self.on_change(new_limit)
+        return new_limit
+
+    def _record(self, limit: int, reason: str):
+        self.history.append((time.time(), limit, reason))
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            samples = sorted(self._latencies)
+            result: Dict[str, float] = {"limit": self.limit, "active": self._active, "changes": len(self.history) - 1}
+        if samples:
+            result["latency_p50"] = samples[len(samples) // 2]
+            result["latency_p95"] = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return result
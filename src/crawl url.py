@@ -1,63 +1,71 @@
-from selenium import webdriver
-from selenium.webdriver.edge.options import Options
-from selenium.webdriver.common.by import By
-import pandas as pd
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+# crawl url.py
+"""
+Khám phá cây danh mục Tiki và ghi danh sách danh mục cần crawl (`data/urls.csv`).
+
+Cây được duyệt BFS qua API danh mục đến các danh mục lá (xem category_tree.py) và
+lưu trong `data/category_index.sqlite`; lần chạy sau chỉ gọi API cho các nút mới,
+thay đổi hoặc quá hạn làm mới. Mặc định mỗi dòng của `urls.csv` là một danh mục
+lá để main.py chia việc theo lá; `--top-level` ghi lại danh sách danh mục cấp 1 như
+trước. Cột `detail` vẫn là số thứ tự 0–25 của danh mục cấp 1 chứa lá (giữ nguyên
+ý nghĩa cột `type` của review), id của lá nằm ở cột `category_id`.
+
+Chạy:  python "crawl url.py" [--max-depth 6] [--workers 8] [--full] [--top-level]
+"""
+import argparse
+import logging
 import os
+import time
+
+from category_tree import (CATEGORY_REFRESH_SECONDS, CATEGORY_WORKERS, MAX_CATEGORY_DEPTH, ROOT_CATEGORY_ID,
+                           CategoryFetcher, CategoryIndex, discover_category_tree, legacy_type_order,
+                           write_category_file)
+from http_engine import API_BASE_URL
 
 # Đường dẫn thư mục
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Thư mục gốc của dự án
 DATA_DIR = os.path.join(BASE_DIR, "data")  # Thư mục chứa dữ liệu
+OUTPUT_FILE = os.path.join(DATA_DIR, "urls.csv")  # Danh sách danh mục cho main.py
+INDEX_FILE = os.path.join(DATA_DIR, "category_index.sqlite")  # Chỉ mục cây danh mục
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(threadName)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Discover the Tiki category tree and write the categories to crawl.")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="CSV of category URLs for main.py.")
+    parser.add_argument("--index", default=INDEX_FILE, help="SQLite taxonomy index.")
+    parser.add_argument("--root", type=int, default=ROOT_CATEGORY_ID, help="Category id to start from.")
+    parser.add_argument("--max-depth", type=int, default=MAX_CATEGORY_DEPTH)
+    parser.add_argument("--workers", type=int, default=CATEGORY_WORKERS, help="Parallel category requests.")
+    parser.add_argument("--refresh-days", type=float, default=CATEGORY_REFRESH_SECONDS / 86400,
+                        help="Re-expand unchanged categories older than this.")
+    parser.add_argument("--full", action="store_true", help="Re-expand every category, ignoring the index.")
+    parser.add_argument("--top-level", action="store_true", help="Write the depth-1 categories instead of leaves.")
+    parser.add_argument("--api-base-url", default=API_BASE_URL)
+    args = parser.parse_args()
+
+    # Đảm bảo thư mục data tồn tại
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(args.index)), exist_ok=True)
 
-# Đảm bảo thư mục data tồn tại
-os.makedirs(DATA_DIR, exist_ok=True)
-
-options = Options()
-
-driver = webdriver.Chrome()
-
-url = "https://tiki.vn/"
-
-driver.get(url)
-
-wait = WebDriverWait(driver, 10)
-
-try:
-    close_button_selector = "img[alt='close-icon']"
-    close_button = wait.until(
-        EC.element_to_be_clickable((By.CSS_SELECTOR, close_button_selector))
-    )
-    close_button.click()
-    print("Đã click nút đóng pop-up.")
-except TimeoutException:
-    print(
-        "Không tìm thấy hoặc không thể click nút đóng pop-up "
-        "trong thời gian chờ."
-    )
-except Exception as e:
-    print(f"Lỗi khi click nút đóng: {e}")
-
-xpath_expression = (
-    "//div[@class='sc-cffe1c5-0 bKBPyH']"
-    "[.//div[normalize-space(.)='Danh mục']]//a"
-)
-urls_list = []
-elements = driver.find_elements(
-    By.XPATH,
-    "//div[@class='sc-cffe1c5-0 bKBPyH'][div[text()='Danh mục']]//a"
-)
-hrefs = [el.get_attribute('href') for el in elements]
-for href in hrefs:
-    if href not in urls_list:
-        urls_list.append(href)
-print(urls_list)
-df = pd.DataFrame(urls_list, columns=['URL'])
-# Lưu vào thư mục data
-output_file = os.path.join(DATA_DIR, 'urls.csv')
-df.to_csv(output_file, index=False)
-print(f"Đã lưu danh sách URL vào {output_file}")
-
-# Đóng trình duyệt khi hoàn thành
-driver.quit()
+    index = CategoryIndex(args.index)
+    # urls.csv cũ (chỉ cột URL) định nghĩa số thứ tự detail của các danh mục cấp 1
+    seeded = index.seed_type_indexes(legacy_type_order(args.output))
+    if seeded:
+        logging.info(f"Kept the detail index of {seeded} top-level categories from '{args.output}'.")
+    fetcher = CategoryFetcher(args.api_base_url, pool_size=args.workers)
+    try:
+        stats = discover_category_tree(index, fetcher, root_id=args.root, max_depth=args.max_depth,
+                                       workers=args.workers, refresh_after=args.refresh_days * 86400,
+                                       full=args.full)
+        nodes = index.crawl_units(stats["started"], max_depth=args.max_depth, top_level=args.top_level)
+        logging.info(f"Walked {len(index)} categories in {time.time() - stats['started']:.1f}s: "
+                     f"{stats['expanded']} expanded ({stats['new']} new, {stats['changed']} changed), "
+                     f"{stats['reused']} reused from the index, {stats['failed']} failed.")
+        if nodes:
+            write_category_file(nodes, args.output, index.type_indexes(nodes), args.api_base_url)
+            logging.info(f"Saved {len(nodes)} categories to {args.output}")
+        else:
+            logging.error(f"No categories discovered; '{args.output}' left unchanged.")
+    finally:
+        fetcher.close()
+        index.close()
@@ -0,0 +1,177 @@
+# crawl_frontier.py
+"""
+Frontier lưu trạng thái crawl của từng URL trong SQLite (mặc định `data/crawl_frontier.sqlite`).
+
+Trạng thái mỗi URL: pending, in_progress (có lease), done (kèm số review và trang
+cuối đã thu thập), partial (một phần trang lỗi, đã lưu tới trước chỗ hổng) hoặc
+failed. Mỗi trang review được ghi checkpoint khi các dòng của nó đã được writer ghi
+và fsync (không phải khi mới vào hàng đợi), nên khi chạy lại: URL đã xong được bỏ
+qua, URL làm dở được tiếp tục từ trang kế tiếp.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# --- Constants ---
+STATE_PENDING = "pending"
+STATE_IN_PROGRESS = "in_progress"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+STATE_PARTIAL = "partial"
+FRONTIER_LEASE_SECONDS = 30 * 60  # Lease hết hạn thì URL được coi như chưa có ai xử lý
+FRONTIER_MAX_ATTEMPTS = 3  # URL lỗi được thử lại ở các lần chạy sau tối đa số lần này
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    detail TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    last_page INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS frontier_state ON frontier(state);
+"""
+
+
+class CrawlFrontier:
+    """Thread-safe SQLite-backed record of per-URL crawl progress."""
+
+    def __init__(self, db_path: str, lease_seconds: float = FRONTIER_LEASE_SECONDS,
+                 max_attempts: int = FRONTIER_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Nạp và chọn URL ---
+    def add_tasks(self, tasks: Iterable[Tuple[str, str]]) -> int:
+        """Registers (url, detail) pairs as pending; URLs already known keep their state."""
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO frontier (url, detail, state, updated_at) VALUES (?, ?, ?, ?)",
+                    ((url, detail, STATE_PENDING, now) for url, detail in tasks),
+                )
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def resumable_tasks(self, steal_active_leases: bool = True) -> List[Tuple[str, str]]:
+        """Returns (url, detail) pairs that still need work, in insertion order.
+
+        In-progress URLs are included when their lease expired, or always when
+        `steal_active_leases` is set (a restarted single crawler owns every lease).
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT url, detail FROM frontier
+                   WHERE state = ?
+                      OR (state = ? AND (? OR lease_expires IS NULL OR lease_expires < ?))
+                      OR (state IN (?, ?) AND attempts < ?)
+                   ORDER BY rowid""",
+                (STATE_PENDING, STATE_IN_PROGRESS, int(steal_active_leases), now, STATE_FAILED, STATE_PARTIAL,
+                 self.max_attempts),
+            ).fetchall()
+        return [(url, detail) for url, detail in rows]
+
+    def has_progress(self) -> bool:
+        """True when an earlier run already finished or started some URLs."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM frontier WHERE state != ? OR last_page > 0 LIMIT 1", (STATE_PENDING,)
+            ).fetchone()
+        return row is not None
+
+    def reset(self):
+        """Forgets all progress (used for a fresh crawl)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM frontier")
+
+    # --- Cập nhật trạng thái ---
+    def lease(self, url: str, owner: str) -> int:
+        """Marks a URL in progress for `owner` and returns the page to resume from (1-based)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """UPDATE frontier SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1,
+                   updated_at = ? WHERE url = ?""",
+                (STATE_IN_PROGRESS, owner, now + self.lease_seconds, now, url),
+            )
+            row = self._conn.execute("SELECT last_page FROM frontier WHERE url = ?", (url,)).fetchone()
+        return (row[0] if row else 0) + 1
+
+    def resume_page(self, url: str) -> int:
+        """Returns the first page not yet checkpointed for a URL (1-based)."""
+        with self._lock:
+            row = self._conn.execute("SELECT last_page FROM frontier WHERE url = ?", (url,)).fetchone()
+        return (row[0] if row else 0) + 1
+
+    def record_page(self, url: str, page: int, reviews_on_page: int):
+        """Checkpoints one finished review page and renews the lease."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """UPDATE frontier SET last_page = MAX(last_page, ?), review_count = review_count + ?,
+                   lease_expires = ?, updated_at = ? WHERE url = ?""",
+                (page, reviews_on_page, now + self.lease_seconds, now, url),
+            )
+
+    def mark_done(self, url: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """UPDATE frontier SET state = ?, lease_owner = NULL, lease_expires = NULL, error = NULL,
+                   updated_at = ? WHERE url = ?""",
+                (STATE_DONE, now, url),
+            )
+
+    def mark_failed(self, url: str, error: str, state: str = STATE_FAILED):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """UPDATE frontier SET state = ?, lease_owner = NULL, lease_expires = NULL, error = ?,
+                   updated_at = ? WHERE url = ?""",
+                (state, error[:500], now, url),
+            )
+
+    def mark_partial(self, url: str, error: str):
+        """Some pages failed for good; the pages before the first gap are checkpointed and the URL is retried."""
+        self.mark_failed(url, error, state=STATE_PARTIAL)
+
+    # --- Báo cáo ---
+    def summary(self) -> Dict[str, int]:
+        """Returns the number of URLs per state."""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def review_count(self, url: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT review_count FROM frontier WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+
+def default_owner() -> str:
+    """Lease owner name for the current thread."""
+    return f"{os.getpid()}:{threading.current_thread().name}"
@@ -0,0 +1,267 @@
+# driver_pool.py
+"""
+Pool WebDriver dùng lại giữa các luồng.
+
+- Khởi động sẵn (warm-up) một số Chrome trước khi worker bắt đầu.
+- Worker mượn driver bằng `lease()` và trả lại bằng `release()`.
+- Trước khi cho mượn, driver được kiểm tra còn sống (liveness probe).
+- Driver bị thay mới sau N lượt dùng hoặc M phút để tránh Chrome phình bộ nhớ.
+- Việc tắt/khởi động Chrome diễn ra ở luồng nền, worker không phải chờ Chrome khởi động nguội.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from queue import Queue, Empty
+from typing import Any, Callable, Deque, Dict, Optional
+
+# --- Constants ---
+RECYCLE_AFTER_PAGES = 50  # Thay driver sau N trang review đã mở (một sản phẩm có thể tốn nhiều trang)
+RECYCLE_AFTER_SECONDS = 15 * 60  # Hoặc sau M giây kể từ lúc khởi động
+POOL_SPARE_DRIVERS = 1  # Số driver dự phòng để thay thế trong lúc một driver đang được recycle
+POOL_LAUNCHER_THREADS = 2  # Số luồng nền khởi động/tắt Chrome
+POOL_LEASE_TIMEOUT = 120  # Giây tối đa một worker chờ driver
+MAX_CONSECUTIVE_LAUNCH_FAILURES = 3
+WAIT_SAMPLES_KEPT = 10000
+
+_LAUNCH = "launch"
+_RETIRE = "retire"
+
+
+class PooledDriver:
+    """A WebDriver owned by the pool, with its usage counters."""
+
+    __slots__ = ("driver", "created_at", "pages_served", "driver_id")
+
+    def __init__(self, driver: Any, driver_id: int):
+        self.driver = driver
+        self.driver_id = driver_id
+        self.created_at = time.monotonic()
+        self.pages_served = 0
+
+    def is_expired(self, max_pages: int, max_age: float) -> bool:
+        """Returns True once the driver has served enough pages or lived long enough."""
+        return self.pages_served >= max_pages or time.monotonic() - self.created_at >= max_age
+
+
+class DriverPool:
+    """Thread-safe pool of pre-warmed WebDrivers with background recycling."""
+
+    def __init__(self, factory: Callable[[], Optional[Any]], size: int, spare: int = POOL_SPARE_DRIVERS,
+                 max_pages: int = RECYCLE_AFTER_PAGES, max_age: float = RECYCLE_AFTER_SECONDS,
+                 launcher_threads: int = POOL_LAUNCHER_THREADS,
+                 disposer: Optional[Callable[[Any], None]] = None):
+        self.factory = factory
+        self.disposer = disposer # Mặc định gọi driver.quit()
+        self.capacity = max(0, size) + max(0, spare)
+        self.max_pages = max_pages
+        self.max_age = max_age
+        self._idle: "Queue[PooledDriver]" = Queue()
+        self._jobs: Queue = Queue()
+        self._lock = threading.Lock()
+        self._live = 0  # Driver đang sống hoặc đang được khởi động
+        self._next_id = 0
+        self._closing = False
+        self._consecutive_failures = 0
+        self._launchers = [
+            threading.Thread(target=self._launcher_loop, name=f"DriverPoolLauncher-{i}", daemon=True)
+            for i in range(max(1, launcher_threads))
+        ]
+        # --- Metrics ---
+        self._wait_samples: Deque[float] = deque(maxlen=WAIT_SAMPLES_KEPT)
+        self._leases = 0
+        self._launched = 0
+        self._launch_failures = 0
+        self._recycled = 0
+        self._failed_probes = 0
+
+    # --- Lifecycle ---
+    def start(self, warm: Optional[int] = None):
+        """Starts the launcher threads and blocks until `warm` drivers are ready."""
+        for thread in self._launchers:
+            thread.start()
+        warm = self.capacity if warm is None else min(warm, self.capacity)
+        for _ in range(warm):
+            self._schedule_launch()
+        deadline = time.monotonic() + POOL_LEASE_TIMEOUT
+        while self._idle.qsize() < warm and time.monotonic() < deadline and self.is_usable():
+            time.sleep(0.1)
+        logging.info(f"Driver pool warmed up: {self._idle.qsize()}/{warm} drivers ready (capacity {self.capacity}).")
+
+    def close(self):
+        """Quits every idle driver and stops the launcher threads."""
+        with self._lock:
+            self._closing = True
+        for _ in self._launchers:
+            self._jobs.put(None)
+        for thread in self._launchers:
+            thread.join(timeout=60)
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except Empty:
+                break
+            self._quit(pooled)
+            with self._lock:
+                self._live -= 1
+        logging.info(f"Driver pool closed. Metrics: {self.metrics()}")
+
+    def is_usable(self) -> bool:
+        """False once Chrome has failed to launch too many times in a row."""
+        return self._consecutive_failures < MAX_CONSECUTIVE_LAUNCH_FAILURES
+
+    # --- Lease / return ---
+    def lease(self, timeout: float = POOL_LEASE_TIMEOUT) -> Optional[PooledDriver]:
+        """Returns a healthy driver, or None if none became available in time."""
+        started = time.monotonic()
+        deadline = started + timeout
+        while not self._closing:
+            if self._idle.empty():
+                self._ensure_capacity()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.is_usable():
+                break
+            try:
+                pooled = self._idle.get(timeout=min(remaining, 1.0))
+            except Empty:
+                continue
+            if pooled.is_expired(self.max_pages, self.max_age):
+                self._retire(pooled)
+                continue
+            if not self._probe(pooled):
+                with self._lock:
+                    self._failed_probes += 1
+                self._retire(pooled)
+                continue
+            with self._lock:
+                self._leases += 1
+                self._wait_samples.append(time.monotonic() - started)
+            return pooled
+        with self._lock:
+            self._wait_samples.append(time.monotonic() - started)
+        return None
+
+    def release(self, pooled: PooledDriver, pages: int = 1, broken: bool = False):
+        """Returns a leased driver after `pages` review pages; broken or worn-out drivers are replaced in the background."""
+        pooled.pages_served += pages
+        if self._closing:
+            self._quit(pooled)
+            with self._lock:
+                self._live -= 1
+            return
+        if broken or pooled.is_expired(self.max_pages, self.max_age):
+            self._retire(pooled)
+        else:
+            self._idle.put(pooled)
+
+    def trim(self, max_live: int) -> int:
+        """Quits idle drivers until at most `max_live` are alive; returns how many were quit."""
+        quit_count = 0
+        while True:
+            with self._lock:
+                if self._live <= max_live:
+                    break
+            try:
+                pooled = self._idle.get_nowait()
+            except Empty:
+                break
+            self._quit(pooled)
+            with self._lock:
+                self._live -= 1
+            quit_count += 1
+        if quit_count:
+            logging.info(f"Driver pool trimmed {quit_count} idle drivers (live {self._live}).")
+        return quit_count
+
+    # --- Metrics ---
+    def metrics(self) -> Dict[str, float]:
+        """Returns pool counters and lease wait-time statistics (seconds)."""
+        with self._lock:
+            samples = sorted(self._wait_samples)
+            result: Dict[str, float] = {
+                "leases": self._leases,
+                "launched": self._launched,
+                "launch_failures": self._launch_failures,
+                "recycled": self._recycled,
+                "failed_probes": self._failed_probes,
+                "idle": self._idle.qsize(),
+                "live": self._live,
+            }
+        if samples:
+            result["wait_avg"] = sum(samples) / len(samples)
+            result["wait_p50"] = samples[len(samples) // 2]
+            result["wait_p95"] = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            result["wait_max"] = samples[-1]
+        return result
+
+    # --- Internals ---
+    def _probe(self, pooled: PooledDriver) -> bool:
+        try:
+            return pooled.driver.execute_script("return 1;") == 1
+        except Exception as e:
+            logging.warning(f"Driver #{pooled.driver_id} failed liveness probe: {e}")
+            return False
+
+    def _ensure_capacity(self):
+        """Schedules a launch if the pool is below capacity (nothing idle and room to grow)."""
+        with self._lock:
+            if self._live >= self.capacity or self._closing:
+                return
+        self._schedule_launch()
+
+    def _schedule_launch(self):
+        with self._lock:
+            self._live += 1
+        self._jobs.put((_LAUNCH, None))
+
+    def _retire(self, pooled: PooledDriver):
+        with self._lock:
+            self._recycled += 1
+        self._jobs.put((_RETIRE, pooled))
+
+    def _quit(self, pooled: PooledDriver):
+        try:
+            if self.disposer is not None:
+                self.disposer(pooled.driver)
+            else:
+                pooled.driver.quit()
+        except Exception as e:
+            logging.debug(f"Error quitting driver #{pooled.driver_id}: {e}")
+
+    def _launch(self) -> Optional[PooledDriver]:
+        driver = self.factory()
+        with self._lock:
+            if driver is None:
+                self._launch_failures += 1
+                self._consecutive_failures += 1
+                return None
+            self._launched += 1
+            self._consecutive_failures = 0
+            self._next_id += 1
+            driver_id = self._next_id
+        logging.debug(f"Driver #{driver_id} launched for pool.")
+        return PooledDriver(driver, driver_id)
+
+    def _launcher_loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            action, pooled = job
+            if action == _RETIRE:
+                self._quit(pooled)
+                logging.debug(f"Driver #{pooled.driver_id} retired after {pooled.pages_served} pages.")
+                if self._closing:
+                    with self._lock:
+                        self._live -= 1
+                    continue
+            if self._closing:
+                with self._lock:
+                    self._live -= 1
+                continue
+            new_driver = self._launch() if self.is_usable() else None
+            if new_driver is None:
+                with self._lock:
+                    self._live -= 1
+                continue
+            self._idle.put(new_driver)
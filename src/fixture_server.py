@@ -0,0 +1,316 @@
+# fixture_server.py
+"""
+Server HTTP cục bộ giả lập Tiki để benchmark mà không cần truy cập tiki.vn.
+
+- Trang sản phẩm `/<slug>-p<id>.html?spid=<spid>` dùng đúng markup thật:
+  `#customer-review-widget-id`, `div.review-comment`, `div.review-comment__title`,
+  `div.review-comment__content`, `span.show-more-content` ("Xem thêm"),
+  `a.btn.next` (thêm class `disabled` ở trang cuối). Bấm "next" gọi API bên dưới
+  và vẽ lại danh sách review như trang thật.
+- API đánh giá `/api/v2/reviews?product_id=&page=` cùng định dạng với Tiki
+  (`data`, `paging.last_page`) cho engine http/async.
+- Số sản phẩm, số trang, độ trễ và tỉ lệ lỗi (500/429) cấu hình được; nội dung
+  review sinh tất định từ seed nên các lần chạy so sánh được với nhau.
+
+Chạy riêng:  python fixture_server.py --port 8765 --products 50 --latency-ms 80
+"""
+import argparse
+import csv
+import html
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from http_engine import PRODUCT_ID_PATTERN, REVIEWS_API_PATH
+
+# --- Constants ---
+FIXTURE_HOST = "127.0.0.1"
+DEFAULT_PRODUCTS = 20
+DEFAULT_MIN_PAGES = 1
+DEFAULT_MAX_PAGES = 15
+DEFAULT_REVIEWS_PER_PAGE = 5  # Giống số review mỗi trang trên Tiki
+TRUNCATE_AT = 80  # Nội dung dài hơn được cắt và có nút "Xem thêm"
+
+_WORDS = ("sách", "hay", "giao", "hàng", "nhanh", "đóng", "gói", "cẩn", "thận", "giá", "tốt", "nội", "dung",
+          "bổ", "ích", "giấy", "đẹp", "shop", "nhiệt", "tình", "sẽ", "ủng", "hộ", "tiếp", "chất", "lượng")
+
+PRODUCT_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="vi"><head><meta charset="utf-8"><title>{title}</title></head>
+<body><main>
+<h1>{title}</h1>
+<div style="height: 1500px">Mô tả sản phẩm</div>
+<div id="customer-review-widget-id" data-product-id="{product_id}" data-spid="{spid}">
+  <div class="review-list">{reviews}</div>
+  <div class="customer-reviews__pagination">
+    <a class="btn prev" href="javascript:void(0)">&lt;</a>
+    <a class="{next_class}" href="javascript:void(0)">&gt;</a>
+  </div>
+</div>
+</main>
+<script>
+const widget = document.getElementById("customer-review-widget-id");
+let currentPage = 1;
+let lastPage = {last_page};
+function escapeHtml(text) {{
+  const div = document.createElement("div");
+  div.textContent = text;
+  return div.innerHTML;
+}}
+function renderReview(item) {{
+  const full = item.content;
+  const truncated = full.length > {truncate_at};
+  const shown = truncated ? full.slice(0, {truncate_at}) + "..." : full;
+  return `<div class="review-comment">
+    <div class="review-comment__user-name">${{escapeHtml(item.created_by.name)}}</div>
+    <div class="review-comment__title">${{escapeHtml(item.title)}}</div>
+    <div class="review-comment__content"><span class="text" data-full="${{escapeHtml(full)}}">${{escapeHtml(shown)}}</span>` +
+    (truncated ? `<span class="show-more-content">Xem thêm</span>` : "") +
+    `</div></div>`;
+}}
+document.addEventListener("click", (event) => {{
+  const more = event.target.closest("span.show-more-content");
+  if (more) {{
+    const text = more.parentElement.querySelector("span.text");
+    text.textContent = text.dataset.full;
+    more.remove();
+    return;
+  }}
+  const next = event.target.closest("a.btn.next");
+  if (next && !next.classList.contains("disabled")) {{
+    fetch(`{api_path}?product_id=${{widget.dataset.productId}}&spid=${{widget.dataset.spid}}&page=${{currentPage + 1}}`)
+      .then((response) => response.json())
+      .then((payload) => {{
+        currentPage = payload.paging.current_page;
+        lastPage = payload.paging.last_page;
+        widget.querySelector(".review-list").innerHTML = payload.data.map(renderReview).join("");
+        next.classList.toggle("disabled", currentPage >= lastPage);
+      }});
+  }}
+}});
+</script>
+</body></html>
+"""
+
+
+class FixtureConfig:
+    """Shape of the simulated catalogue and the injected latency / failures."""
+
+    def __init__(self, products: int = DEFAULT_PRODUCTS, min_pages: int = DEFAULT_MIN_PAGES,
+                 max_pages: int = DEFAULT_MAX_PAGES, reviews_per_page: int = DEFAULT_REVIEWS_PER_PAGE,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, failure_rate: float = 0.0,
+                 throttle_rate: float = 0.0, seed: int = 42):
+        self.products = products
+        self.min_pages = max(1, min_pages)
+        self.max_pages = max(self.min_pages, max_pages)
+        self.reviews_per_page = reviews_per_page
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate # Tỉ lệ request trả 500
+        self.throttle_rate = throttle_rate # Tỉ lệ request trả 429
+        self.seed = seed
+
+
+class FixtureCatalogue:
+    """Deterministic products and reviews generated from the config's seed."""
+
+    def __init__(self, config: FixtureConfig):
+        self.config = config
+        rng = random.Random(config.seed)
+        self.products: Dict[str, Tuple[str, int]] = {} # product_id -> (spid, số trang)
+        for index in range(config.products):
+            product_id = str(100000 + index)
+            self.products[product_id] = (str(500000 + index), rng.randint(config.min_pages, config.max_pages))
+
+    def review(self, product_id: str, page: int, index: int) -> Dict[str, object]:
+        rng = random.Random(f"{self.config.seed}:{product_id}:{page}:{index}")
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(5, 40))]
+        return {
+            "id": int(product_id) * 10000 + page * 100 + index,
+            "title": rng.choice(("Cực kì hài lòng", "Hài lòng", "Bình thường", "Không hài lòng")),
+            "content": " ".join(words).capitalize() + f" (#{product_id}-{page}-{index})",
+            "rating": rng.randint(1, 5),
+            "created_by": {"name": f"Khách hàng {rng.randint(1, 9999)}"},
+        }
+
+    def page_payload(self, product_id: str, page: int) -> Optional[Dict[str, object]]:
+        if product_id not in self.products:
+            return None
+        last_page = self.products[product_id][1]
+        data = [self.review(product_id, page, i) for i in range(self.config.reviews_per_page)] if 1 <= page <= last_page else []
+        return {"data": data, "paging": {"current_page": page, "last_page": last_page,
+                                         "per_page": self.config.reviews_per_page,
+                                         "total": last_page * self.config.reviews_per_page}}
+
+    def product_urls(self, base_url: str) -> List[Tuple[str, str, int]]:
+        """Returns (url, detail, review_count) for every product."""
+        rows = []
+        for index, (product_id, (spid, pages)) in enumerate(self.products.items()):
+            url = f"{base_url}/san-pham-gia-lap-{index}-p{product_id}.html?spid={spid}"
+            rows.append((url, str(index % 5), pages * self.config.reviews_per_page))
+        return rows
+
+    def total_reviews(self) -> int:
+        return sum(pages for _, pages in self.products.values()) * self.config.reviews_per_page
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    server: "FixtureServer"
+
+    def log_message(self, format, *args): # Không in log truy cập ra console
+        pass
+
+    def do_GET(self):
+        server = self.server
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        match = PRODUCT_ID_PATTERN.search(parsed.path)
+        server.record_request(query.get("product_id", [match.group(1) if match else ""])[0])
+        config = server.catalogue.config
+        delay = max(0.0, config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+        if delay:
+            time.sleep(delay)
+        roll = random.random()
+        if roll < config.failure_rate:
+            return self._send(500, "text/plain", b"injected failure")
+        if roll < config.failure_rate + config.throttle_rate:
+            return self._send(429, "text/plain", b"injected throttling")
+
+        if parsed.path == REVIEWS_API_PATH:
+            try:
+                page = int(query.get("page", ["1"])[0])
+            except ValueError:
+                page = 1
+            payload = server.catalogue.page_payload(query.get("product_id", [""])[0], page)
+            if payload is None:
+                return self._send(404, "application/json", b'{"error": "not found"}')
+            return self._send(200, "application/json", json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+        if match and match.group(1) in server.catalogue.products:
+            return self._send(200, "text/html; charset=utf-8", server.render_product(match.group(1)).encode("utf-8"))
+        return self._send(404, "text/plain", b"not found")
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Threaded local server for the simulated catalogue; use as a context manager."""
+
+    daemon_threads = True
+
+    def __init__(self, config: Optional[FixtureConfig] = None, port: int = 0):
+        super().__init__((FIXTURE_HOST, port), _FixtureHandler)
+        self.catalogue = FixtureCatalogue(config or FixtureConfig())
+        self.requests_served = 0
+        self.request_times: Dict[str, List[float]] = defaultdict(list) # product_id -> thời điểm các request
+        self._count_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{FIXTURE_HOST}:{self.server_address[1]}"
+
+    def record_request(self, product_id: str):
+        with self._count_lock:
+            self.requests_served += 1
+            if product_id:
+                self.request_times[product_id].append(time.monotonic())
+
+    def page_intervals(self) -> List[float]:
+        """Client-side page latency seen from the server: gaps between consecutive requests per product."""
+        with self._count_lock:
+            series = [sorted(times) for times in self.request_times.values()]
+        return [later - earlier for times in series for earlier, later in zip(times, times[1:])]
+
+    def reset_stats(self):
+        with self._count_lock:
+            self.requests_served = 0
+            self.request_times.clear()
+
+    def render_product(self, product_id: str) -> str:
+        spid, last_page = self.catalogue.products[product_id]
+        first_page = self.catalogue.page_payload(product_id, 1)["data"]
+        reviews = "".join(_render_review_html(item) for item in first_page)
+        return PRODUCT_PAGE_TEMPLATE.format(
+            title=f"Sản phẩm giả lập {product_id}", product_id=product_id, spid=spid, reviews=reviews,
+            next_class="btn next" + (" disabled" if last_page <= 1 else ""), last_page=last_page,
+            truncate_at=TRUNCATE_AT, api_path=REVIEWS_API_PATH,
+        )
+
+    def write_url_file(self, path: str) -> int:
+        """Writes a url_final-style CSV (URL, detail, review_count) for the catalogue."""
+        rows = self.catalogue.product_urls(self.base_url)
+        with open(path, "w", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["URL", "detail", "review_count"])
+            writer.writerows(rows)
+        return len(rows)
+
+    def __enter__(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="FixtureServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def _render_review_html(item: Dict[str, object]) -> str:
+    full = str(item["content"])
+    truncated = len(full) > TRUNCATE_AT
+    shown = full[:TRUNCATE_AT] + "..." if truncated else full
+    more = '<span class="show-more-content">Xem thêm</span>' if truncated else ""
+    return (f'<div class="review-comment">'
+            f'<div class="review-comment__user-name">{html.escape(item["created_by"]["name"])}</div>'
+            f'<div class="review-comment__title">{html.escape(str(item["title"]))}</div>'
+            f'<div class="review-comment__content"><span class="text" data-full="{html.escape(full)}">'
+            f'{html.escape(shown)}</span>{more}</div></div>')
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """Adds the catalogue / latency / failure options shared by this script and benchmark.py."""
+    parser.add_argument("--products", type=int, default=DEFAULT_PRODUCTS)
+    parser.add_argument("--min-pages", type=int, default=DEFAULT_MIN_PAGES)
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES)
+    parser.add_argument("--reviews-per-page", type=int, default=DEFAULT_REVIEWS_PER_PAGE)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- variation of the delay.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 500.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def config_from_args(args: argparse.Namespace) -> FixtureConfig:
+    return FixtureConfig(products=args.products, min_pages=args.min_pages, max_pages=args.max_pages,
+                         reviews_per_page=args.reviews_per_page, latency_ms=args.latency_ms,
+                         jitter_ms=args.jitter_ms, failure_rate=args.failure_rate,
+                         throttle_rate=args.throttle_rate, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local Tiki-like catalogue for benchmarks.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url-file", help="Also write the product URL list to this CSV.")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    with FixtureServer(config_from_args(args), port=args.port) as server:
+        if args.url_file:
+            server.write_url_file(args.url_file)
+        print(f"Serving {len(server.catalogue.products)} products ({server.catalogue.total_reviews()} reviews) "
+              f"on {server.base_url} - Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
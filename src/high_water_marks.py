@@ -0,0 +1,144 @@
+# high_water_marks.py
+"""
+Mốc "review mới nhất đã thu thập" của từng sản phẩm, cho chế độ crawl tăng dần.
+
+Sau mỗi lần crawl, review mới nhất của sản phẩm (id, thời điểm tạo và digest nội
+dung) được lưu trong SQLite (mặc định `data/high_water_marks.sqlite`). Lần crawl
+sau sắp review mới nhất trước và dừng ngay khi gặp review đã biết, nên chỉ các
+review mới được lấy và ghi ra; một lần làm mới hằng tuần chỉ tốn một hai trang
+mỗi sản phẩm thay vì toàn bộ.
+
+Mốc chỉ được cập nhật khi sản phẩm được crawl xong, nên lần chạy bị dừng giữa
+chừng không làm mất các review chưa được ghi.
+"""
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from review_dedup import review_digest
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS high_water_marks (
+    url TEXT PRIMARY KEY,
+    review_id INTEGER,
+    created_at INTEGER,
+    digest TEXT NOT NULL,
+    updated_at REAL
+);
+"""
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class HighWaterMark:
+    """The newest review of a product seen by a finished crawl."""
+
+    __slots__ = ("review_id", "created_at", "digest")
+
+    def __init__(self, review_id: Optional[int], created_at: Optional[int], digest: str):
+        self.review_id = review_id
+        self.created_at = created_at
+        self.digest = digest
+
+    @classmethod
+    def from_api_item(cls, item: Dict[str, Any], detail_type: str) -> "HighWaterMark":
+        """Builds a mark from one item of the reviews API (`id`, `created_at`, `title`, `content`)."""
+        digest = review_digest((item.get("title") or "").strip() or "N/A",
+                               (item.get("content") or "").strip() or "N/A", detail_type).hex()
+        return cls(_as_int(item.get("id")), _as_int(item.get("created_at")), digest)
+
+    @classmethod
+    def from_row(cls, row: Dict[str, str]) -> "HighWaterMark":
+        """Builds a mark from a scraped `title/content/type` row (the page shows no review id)."""
+        return cls(None, None, review_digest(row.get("title"), row.get("content"), row.get("type")).hex())
+
+    def covers(self, other: "HighWaterMark") -> bool:
+        """True when `other` is this review or an older one.
+
+        Ids (then timestamps) decide whenever both marks have them; the digest is only a fallback for
+        scraped rows without an id, since boilerplate titles with empty content often share a digest.
+        """
+        if self.review_id is not None and other.review_id is not None:
+            return other.review_id <= self.review_id
+        if self.created_at is not None and other.created_at is not None and other.created_at != self.created_at:
+            return other.created_at < self.created_at
+        return other.digest == self.digest
+
+    def __repr__(self) -> str:
+        return f"HighWaterMark(id={self.review_id}, created_at={self.created_at}, digest={self.digest[:8]}...)"
+
+
+class IncrementalCutoff:
+    """Per-URL stop test for a newest-first crawl; remembers the newest review it saw as the next mark."""
+
+    def __init__(self, detail_type: str, mark: Optional[HighWaterMark]):
+        self.detail_type = detail_type
+        self.mark = mark
+        self.newest: Optional[HighWaterMark] = None
+        self.reached = False
+
+    def _check(self, seen: HighWaterMark) -> bool:
+        if self.newest is None:
+            self.newest = seen
+        if self.mark is not None and self.mark.covers(seen):
+            self.reached = True
+        return self.reached
+
+    def reached_by_item(self, item: Dict[str, Any]) -> bool:
+        """Stop test for one reviews API item, in newest-first order."""
+        return self._check(HighWaterMark.from_api_item(item, self.detail_type))
+
+    def reached_by_row(self, row: Dict[str, str]) -> bool:
+        """Stop test for one scraped row, in newest-first order."""
+        return self._check(HighWaterMark(None, None, review_digest(row.get("title"), row.get("content"),
+                                                                   self.detail_type).hex()))
+
+    def next_mark(self) -> Optional[HighWaterMark]:
+        """The mark to store once this URL finished: the newest review seen, else the previous mark."""
+        return self.newest or self.mark
+
+
+class HighWaterMarkStore:
+    """Thread-safe SQLite table of per-URL high-water marks."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, url: str) -> Optional[HighWaterMark]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT review_id, created_at, digest FROM high_water_marks WHERE url = ?", (url,)
+            ).fetchone()
+        return HighWaterMark(*row) if row else None
+
+    def put(self, url: str, mark: HighWaterMark):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO high_water_marks (url, review_id, created_at, digest, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, mark.review_id, mark.created_at, mark.digest, time.time()),
+            )
+
+    def reset(self):
+        """Forgets every mark (the next incremental run crawls everything again)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM high_water_marks")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM high_water_marks").fetchone()[0]
@@ -0,0 +1,195 @@
+# http_engine.py
+"""
+Engine thu thập đánh giá không cần trình duyệt.
+
+Thay vì mở cả một Chrome headless cho mỗi sản phẩm, engine này lấy product id và
+`spid` từ URL (`...-p170708233.html?spid=170708234`) rồi gọi thẳng API đánh giá
+của Tiki qua một HTTP session có connection pool (keep-alive).
+Kết quả trả về đúng định dạng `{"title", "content", "type"}` như đường Selenium.
+"""
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from review_records import ReviewColumns, ReviewRecord
+
+# --- Constants ---
+API_BASE_URL = "https://tiki.vn"  # Có thể trỏ sang server giả lập cục bộ khi test
+REVIEWS_API_PATH = "/api/v2/reviews"
+REVIEWS_PER_PAGE = 20
+REVIEWS_SORT_DEFAULT = "score|desc,id|desc,stars|all"  # Thứ tự mặc định của Tiki (hữu ích nhất trước)
+REVIEWS_SORT_NEWEST = "id|desc,stars|all"  # Mới nhất trước, dùng cho crawl tăng dần
+HTTP_TIMEOUT = 15  # Giây cho mỗi request
+HTTP_POOL_SIZE = 8  # Số kết nối keep-alive giữ lại cho mỗi host
+HTTP_MAX_RETRIES = 2
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)  # Lỗi tạm thời của server/giới hạn tốc độ: thử lại
+HTTP_RETRY_BACKOFF = 0.5  # Giây cơ sở cho backoff lũy thừa giữa các lần thử lại
+MAX_REVIEW_PAGES = 500  # Chặn trên để không lặp vô hạn nếu API trả paging sai
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36"
+
+PRODUCT_ID_PATTERN = re.compile(r"-p(\d+)\.html")
+
+
+class HttpFetchError(Exception):
+    """Raised when reviews for a product cannot be fetched over HTTP."""
+
+
+def parse_product_ids(url: str) -> Optional[Tuple[str, Optional[str]]]:
+    """Returns (product_id, spid) parsed from a Tiki product URL, or None if it is not one."""
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None
+    match = PRODUCT_ID_PATTERN.search(parsed.path)
+    if not match:
+        return None
+    spid_values = parse_qs(parsed.query).get("spid")
+    spid = spid_values[0] if spid_values and spid_values[0].isdigit() else None
+    return match.group(1), spid
+
+
+def build_review_params(product_id: str, spid: Optional[str], page: int, limit: int = REVIEWS_PER_PAGE,
+                        sort: str = REVIEWS_SORT_DEFAULT) -> Dict[str, Any]:
+    """Builds the query string for one page of the reviews API."""
+    params: Dict[str, Any] = {
+        "product_id": product_id,
+        "page": page,
+        "limit": limit,
+        "include": "comments",
+        "sort": sort,
+    }
+    if spid:
+        params["spid"] = spid
+    return params
+
+
+def reviews_from_payload(payload: Dict[str, Any], detail_type: str) -> List[ReviewRecord]:
+    """Converts one reviews API payload into `title/content/type` rows."""
+    reviews = []
+    for item in payload.get("data") or []:
+        if not isinstance(item, dict):
+            continue
+        title = (item.get("title") or "").strip() or "N/A"
+        content = (item.get("content") or "").strip() or "N/A"
+        reviews.append(ReviewRecord(title, content, detail_type))
+    return reviews
+
+
+def cut_payload_at(payload: Dict[str, Any], stop_at: Callable[[Dict[str, Any]], bool]) -> Tuple[Dict[str, Any], bool]:
+    """Drops the first item for which `stop_at` is true and everything after it; returns (payload, stopped)."""
+    items = payload.get("data") or []
+    for index, item in enumerate(items):
+        if isinstance(item, dict) and stop_at(item):
+            return {**payload, "data": items[:index]}, True
+    return payload, False
+
+
+def last_page_from_payload(payload: Dict[str, Any]) -> int:
+    """Returns the last page number announced by the API (1 if unknown)."""
+    paging = payload.get("paging") or {}
+    try:
+        return max(1, int(paging.get("last_page") or 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+def retrying_adapter(pool_size: int = HTTP_POOL_SIZE, max_retries: int = HTTP_MAX_RETRIES) -> HTTPAdapter:
+    """Pooled adapter that retries GETs on connection errors, 429 and 5xx, honouring `Retry-After`."""
+    retry = Retry(total=max_retries, status_forcelist=HTTP_RETRY_STATUSES, backoff_factor=HTTP_RETRY_BACKOFF,
+                  allowed_methods={"GET"}, respect_retry_after_header=True)
+    return HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+
+class HttpReviewFetcher:
+    """Fetches all review pages of a product through a pooled `requests.Session`."""
+
+    def __init__(self, base_url: str = API_BASE_URL, timeout: float = HTTP_TIMEOUT,
+                 pool_size: int = HTTP_POOL_SIZE, max_pages: int = MAX_REVIEW_PAGES):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.session = requests.Session()
+        adapter = retrying_adapter(pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT, "Accept": "application/json"})
+
+    def fetch_page(self, product_id: str, spid: Optional[str], page: int,
+                   sort: str = REVIEWS_SORT_DEFAULT) -> Dict[str, Any]:
+        """Fetches one page of the reviews API and returns the decoded JSON payload."""
+        try:
+            response = self.session.get(
+                f"{self.base_url}{REVIEWS_API_PATH}",
+                params=build_review_params(product_id, spid, page, sort=sort),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            payload = response.json()
+        except requests.RequestException as e:
+            raise HttpFetchError(f"Request for product {product_id} page {page} failed: {e}") from e
+        except ValueError as e:
+            raise HttpFetchError(f"Invalid JSON for product {product_id} page {page}: {e}") from e
+        if not isinstance(payload, dict):
+            raise HttpFetchError(f"Unexpected payload type for product {product_id} page {page}.")
+        return payload
+
+    def fetch_reviews(self, url: str, detail_type: str, start_page: int = 1,
+                      on_page: Optional[Callable[[int, List[ReviewRecord]], None]] = None,
+                      end_page: Optional[int] = None,
+                      on_paging: Optional[Callable[[int, int], Optional[int]]] = None,
+                      sort: str = REVIEWS_SORT_DEFAULT,
+                      stop_at: Optional[Callable[[Dict[str, Any]], bool]] = None) -> ReviewColumns:
+        """Fetches every review page for one product URL, raising HttpFetchError on failure.
+
+        Pages before `start_page` (resume) and after `end_page` (page-range task) are skipped.
+        Rows are returned as a `ReviewColumns` buffer, or handed to `on_page(page, rows)` after each
+        page instead of being kept. `on_paging(first_page, last_page)` is called
+        once the page count is known and may return a smaller end page (the rest is handed to other workers).
+        With `stop_at(item)` (incremental crawl, newest-first `sort`), fetching stops at the first API item
+        for which it returns True; only the items before it are returned.
+        """
+        ids = parse_product_ids(url)
+        if ids is None:
+            raise HttpFetchError(f"Cannot parse product id from URL: {url}")
+        product_id, spid = ids
+
+        # Khi có on_page, các trang đã được giao đi nên không giữ lại bản sao thứ hai trong bộ nhớ
+        all_reviews = ReviewColumns()
+        review_count = 0
+        first_page = page_num = max(1, start_page)
+        last_page = page_num
+        while page_num <= min(last_page, self.max_pages, end_page or self.max_pages):
+            payload = self.fetch_page(product_id, spid, page_num, sort=sort)
+            stopped = False
+            if stop_at is not None:
+                payload, stopped = cut_payload_at(payload, stop_at)
+            page_reviews = reviews_from_payload(payload, detail_type)
+            if not page_reviews:
+                if stopped:
+                    logging.debug(f"[http] Reached already-crawled reviews of product {product_id} on page {page_num}.")
+                break
+            last_page = last_page_from_payload(payload)
+            if page_num == first_page and on_paging is not None:
+                end_page = on_paging(first_page, min(last_page, self.max_pages)) or end_page
+            review_count += len(page_reviews)
+            if on_page is not None:
+                on_page(page_num, page_reviews)
+            else:
+                all_reviews.extend(page_reviews)
+            logging.debug(f"[http] Extracted {len(page_reviews)} reviews from page {page_num} of product {product_id}.")
+            page_num += 1
+            if stopped:
+                logging.debug(f"[http] Reached already-crawled reviews of product {product_id} on page {page_num - 1}.")
+                break
+
+        logging.info(f"[http] Finished processing {url} (pages {first_page}-{page_num - 1}). Found {review_count} reviews.")
+        return all_reviews
+
+    def close(self):
+        """Closes the pooled connections."""
+        self.session.close()
@@ -0,0 +1,86 @@
+# lean_mode.py
+"""
+Chế độ tải trang "lean" cho việc thu thập review.
+
+Chỉ cần phần `customer-review-widget-id`, nên chặn ảnh, media, font và các host
+bên thứ ba (quảng cáo, tracking) qua DevTools (`Network.setBlockedURLs`), dùng
+page load strategy "eager" và đọc performance log để báo số byte đã tải / ước
+tính số byte tiết kiệm được cho mỗi trang.
+"""
+import json
+import logging
+from typing import Any, Dict, List
+
+# --- Constants ---
+BLOCKED_URL_PATTERNS: List[str] = [
+    # Ảnh
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*salt.tikicdn.com/cache/*",
+    # Font và media
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+    # Quảng cáo / tracking bên thứ ba
+    "*googletagmanager.com*", "*google-analytics.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*googleadservices.com*", "*facebook.net*", "*facebook.com/tr*", "*tiktok.com*", "*criteo.*",
+    "*hotjar.com*", "*clarity.ms*", "*tka.tiki.vn*", "*tracking.tiki.vn*",
+]
+
+# Kích thước điển hình (byte) theo loại tài nguyên, dùng để ước tính byte tiết kiệm khi request bị chặn
+TYPICAL_RESOURCE_BYTES: Dict[str, int] = {
+    "Image": 35_000,
+    "Media": 500_000,
+    "Font": 40_000,
+    "Script": 60_000,
+    "Stylesheet": 20_000,
+    "XHR": 2_000,
+    "Fetch": 2_000,
+    "Ping": 500,
+    "Other": 5_000,
+}
+
+
+def apply_lean_options(chrome_options: Any):
+    """Configures Chrome options for lean crawling (eager load, no images, performance log)."""
+    chrome_options.page_load_strategy = "eager"
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.media_stream": 2,
+    })
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def enable_request_blocking(driver: Any, patterns: List[str] = BLOCKED_URL_PATTERNS):
+    """Turns on DevTools network interception that blocks the given URL patterns."""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    driver.lean_mode = True
+
+
+def page_transfer_stats(driver: Any) -> Dict[str, int]:
+    """Drains the performance log and returns bytes transferred / blocked requests since the last call."""
+    stats = {"requests": 0, "transferred_bytes": 0, "blocked_requests": 0, "estimated_saved_bytes": 0}
+    try:
+        entries = driver.get_log("performance")
+    except Exception as e:
+        logging.debug(f"Could not read performance log: {e}")
+        return stats
+
+    resource_types: Dict[str, str] = {}
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get("method")
+        params = message.get("params") or {}
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            stats["requests"] += 1
+            resource_types[request_id] = params.get("type") or "Other"
+        elif method == "Network.loadingFinished":
+            stats["transferred_bytes"] += int(params.get("encodedDataLength") or 0)
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            stats["blocked_requests"] += 1
+            resource_type = params.get("type") or resource_types.get(request_id, "Other")
+            stats["estimated_saved_bytes"] += TYPICAL_RESOURCE_BYTES.get(resource_type, TYPICAL_RESOURCE_BYTES["Other"])
+    return stats
@@ -0,0 +1,136 @@
+# log_setup.py
+"""
+Logging không chặn cho scraper đa luồng.
+
+Luồng scraper chỉ đưa record vào một hàng đợi không giới hạn (`QueueHandler`);
+một luồng nền (`QueueListener`) mới thực sự ghi ra console và file, nên worker
+không bao giờ phải chờ I/O của log. File log xoay vòng (`RotatingFileHandler`):
+mỗi lần chạy bắt đầu một file mới, các lần trước được giữ lại thành `.1`, `.2`...
+thay vì bị xoá. Tuỳ chọn ghi thêm file JSON-lines có các trường url, page,
+worker, elapsed để phân tích sau.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+# --- Constants ---
+LOG_FORMAT = "%(asctime)s - %(threadName)s - %(levelname)s - %(message)s"
+LOG_MAX_BYTES = 20 * 1024 * 1024  # Xoay file khi vượt kích thước này
+LOG_BACKUP_COUNT = 5  # Số file log cũ giữ lại
+CONTEXT_FIELDS = ("url", "page", "worker")
+
+_context = threading.local()
+_listener: Optional[logging.handlers.QueueListener] = None
+_rolled_over: Set[str] = set()  # File đã được xoay trong tiến trình này (chỉ xoay một lần mỗi lần chạy)
+
+
+# --- Ngữ cảnh theo luồng ---
+def update_log_context(reset_clock: bool = False, **fields: Any):
+    """Sets url/page/worker for this thread's log records; `reset_clock` restarts the elapsed timer."""
+    for key, value in fields.items():
+        setattr(_context, key, value)
+    if reset_clock or not hasattr(_context, "started"):
+        _context.started = time.monotonic()
+
+
+def clear_log_context(*fields: str):
+    """Removes the given fields (all of them if none given) from this thread's log context."""
+    for key in fields or CONTEXT_FIELDS:
+        if hasattr(_context, key):
+            delattr(_context, key)
+
+
+class _ContextFilter(logging.Filter):
+    """Copies the producing thread's context onto the record before it is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key in CONTEXT_FIELDS:
+            if not hasattr(record, key):
+                setattr(record, key, getattr(_context, key, None))
+        started = getattr(_context, "started", None)
+        record.elapsed = round(time.monotonic() - started, 3) if started is not None else None
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS + ("elapsed",):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _rotating_handler(path: str, max_bytes: int, backup_count: int) -> logging.handlers.RotatingFileHandler:
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                   encoding="utf-8", delay=True)
+    if path not in _rolled_over:
+        _rolled_over.add(path)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            handler.doRollover() # Lần chạy mới bắt đầu file mới, log cũ được giữ lại
+    return handler
+
+
+def configure_logging(log_file: str, level: int = logging.INFO, json_log_file: Optional[str] = None,
+                      max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                      console: bool = True) -> logging.handlers.QueueListener:
+    """Routes the root logger through a queue to a background listener (re-configurable)."""
+    global _listener
+    shutdown_logging()
+
+    file_handler = _rotating_handler(log_file, max_bytes, backup_count)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers: List[logging.Handler] = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(console_handler)
+    if json_log_file:
+        json_handler = _rotating_handler(json_log_file, max_bytes, backup_count)
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue() # Không giới hạn: put() không bao giờ chặn
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the background listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
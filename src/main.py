@@ -1,128 +1,231 @@
+# main.py
+"""
+Thu thập link sản phẩm của các danh mục (`data/urls.csv` -> `data/url_final.csv`).
+
+Thay vì mở Chrome, cuộn trang và bấm "Xem thêm" lần lượt từng danh mục, script gọi
+API listing của Tiki theo tham số `page`:
+  - trang 1 của mọi danh mục chạy song song; khi biết số trang, các trang còn lại
+    được đưa vào cùng thread pool nên danh mục lớn không chặn danh mục nhỏ;
+  - mỗi sản phẩm được chuẩn hoá URL (bỏ tham số tracking) và khử trùng lặp theo
+    (product id, spid) ngay khi nhận được;
+  - các dòng `URL,detail,review_count` được ghi dần xuống file bằng luồng writer,
+    không giữ toàn bộ kết quả trong bộ nhớ. Cột `review_count` giúp
+    multiThreads4All.py xử lý sản phẩm lớn trước.
+
+Với danh sách danh mục lá từ "crawl url.py", có thể chia việc cho nhiều máy bằng
+`--shard K/N` (mỗi máy một file output riêng).
+
+Chạy:  python main.py [--input data/urls.csv] [--output data/url_final.csv] [--max-pages 50] [--shard 0/4]
+"""
+import argparse
 import csv
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementNotInteractableException
-from urllib.parse import urljoin
-import time
+import logging
 import os
-
-# --- Cấu hình ---
-input_csv_file = 'urls.csv'
-output_csv_file = 'url_final.csv'
-so_lan_nhap_xem_them_toi_da = 0
-base_url = "https://tiki.vn"
-
-xem_them_button_selector = "div[data-view-id='category_infinity_view.more']"
-product_link_selector = "a.product-item" 
-
-# --- Khởi tạo WebDriver ---
-print("Đang khởi tạo WebDriver...")
-options = webdriver.ChromeOptions()
-driver = webdriver.Chrome(options=options)
-driver.maximize_window()
-print("WebDriver đã sẵn sàng.")
-
-# --- Danh sách để lưu tất cả kết quả ---
-all_results = []
-
-# --- Đọc file CSV đầu vào ---
-try:
-    with open(input_csv_file, mode='r', newline='', encoding='utf-8') as infile:
-        reader = csv.reader(infile)
-        header = next(reader)
-        category_urls = [row[0] for row in reader if row]
-    print(f"Đã đọc {len(category_urls)} URL danh mục từ {input_csv_file}")
-except FileNotFoundError:
-    print(f"LỖI: Không tìm thấy file {input_csv_file}. Vui lòng tạo file này.")
-    driver.quit()
-    exit()
-except Exception as e:
-    print(f"LỖI khi đọc file {input_csv_file}: {e}")
-    driver.quit()
-    exit()
-
-# --- Xử lý từng URL danh mục ---
-for index, category_url in enumerate(category_urls):
-    print(f"\n--- Đang xử lý URL danh mục {index + 1}/{len(category_urls)}: {category_url} ---")
-    driver.get(category_url)
-    time.sleep(2)
-
-    # --- Nhấp nút "Xem thêm" ---
-    so_lan_nhap_thuc_te = 0
-    for i in range(so_lan_nhap_xem_them_toi_da):
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from http_engine import API_BASE_URL, HTTP_TIMEOUT, USER_AGENT, retrying_adapter
+from result_writer import StreamingResultWriter
+from url_canonicalizer import canonical_product_url, product_key
+
+# --- Constants ---
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Thư mục gốc của dự án
+DATA_DIR = os.path.join(BASE_DIR, "data")  # Thư mục chứa dữ liệu
+INPUT_FILE = os.path.join(DATA_DIR, "urls.csv")  # Danh sách URL danh mục
+OUTPUT_FILE = os.path.join(DATA_DIR, "url_final.csv")  # Danh sách URL sản phẩm
+LISTING_API_PATH = "/api/personalish/v1/blocks/listings"
+LISTING_PAGE_SIZE = 40  # Số sản phẩm mỗi trang listing
+MAX_LISTING_PAGES = 50  # Tiki không trả quá khoảng 50 trang cho mỗi danh mục
+HARVEST_WORKERS = 8  # Số request listing chạy song song
+OUTPUT_COLUMNS = ["URL", "detail", "review_count"]
+
+CATEGORY_ID_PATTERN = re.compile(r"/c(\d+)/?$")
+
+
+class ListingFetchError(Exception):
+    """Raised when a category listing page cannot be fetched."""
+
+
+def parse_category(url: str) -> Optional[Tuple[str, str]]:
+    """Returns (category_id, url_key) from a category URL such as `https://tiki.vn/nha-sach-tiki/c8322`."""
+    path = urlparse(url).path
+    match = CATEGORY_ID_PATTERN.search(path)
+    if not match:
+        return None
+    segments = [segment for segment in path.split("/") if segment]
+    url_key = segments[-2] if len(segments) >= 2 else ""
+    return match.group(1), url_key
+
+
+def product_url_from_item(item: Dict[str, Any], base_url: str = API_BASE_URL) -> Optional[str]:
+    """Builds the canonical product URL of one listing item, or None if it has no usable link."""
+    url_path = item.get("url_path")
+    if not url_path and item.get("url_key") and item.get("id"):
+        url_path = f"{item['url_key']}-p{item['id']}.html"
+    if not url_path:
+        return None
+    return canonical_product_url(urljoin(base_url.rstrip("/") + "/", str(url_path)))
+
+
+class ListingFetcher:
+    """Fetches category listing pages through a pooled `requests.Session` (thread-safe for GETs)."""
+
+    def __init__(self, base_url: str = API_BASE_URL, timeout: float = HTTP_TIMEOUT, pool_size: int = HARVEST_WORKERS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = retrying_adapter(pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT, "Accept": "application/json"})
+
+    def fetch_page(self, category_id: str, url_key: str, page: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Returns (items, last_page) for one listing page."""
+        params = {"limit": LISTING_PAGE_SIZE, "category": category_id, "page": page, "urlKey": url_key}
         try:
-            wait = WebDriverWait(driver, 10)
-            # Di chuyển tới cuối trang trước khi tìm nút
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(0.8)
-
-            xem_them_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, xem_them_button_selector)))
-            driver.execute_script("arguments[0].click();", xem_them_button)
-            so_lan_nhap_thuc_te += 1
-            print(f"  -> Đã nhấp 'Xem thêm' lần thứ {so_lan_nhap_thuc_te}")
-            time.sleep(3)
-
-        except (TimeoutException, NoSuchElementException,
-                ElementNotInteractableException):
-            print("  -> Không tìm thấy hoặc không thể nhấp 'Xem thêm' nữa.")
-            break
-        except Exception as e:
-            print(f"  -> Lỗi khi nhấp 'Xem thêm': {e}")
-            break
-
-    print(f"  -> Đã nhấp 'Xem thêm' tổng cộng {so_lan_nhap_thuc_te} lần.")
-
-    # --- Thu thập link sản phẩm sau khi đã nhấp "Xem thêm" ---
-    category_product_links = set()
-    print("  -> Bắt đầu thu thập link sản phẩm...")
-    try:
-        time.sleep(2)
-        # Tìm tất cả các phần tử link sản phẩm
-        product_elements = driver.find_elements(By.CSS_SELECTOR, product_link_selector)
-        print(f"  -> Tìm thấy {len(product_elements)}"
-              " phần tử sản phẩm tiềm năng.")
-
-        for element in product_elements:
-            try:
-                href = element.get_attribute('href')
-                if href:
-                    full_url = urljoin(base_url, href)
-                    category_product_links.add(full_url)
-            except Exception as e_inner:
-                print(f"    -> Lỗi nhỏ khi lấy href: {e_inner}")
-
-        print(f"  -> Thu thập được {len(category_product_links)} "
-              "link sản phẩm duy nhất cho danh mục này.")
-
-        # Thêm kết quả vào danh sách tổng
-        for product_url in category_product_links:
-            all_results.append({'URL': product_url, 'detail': category_url})
-
-    except Exception as e:
-        print(f"  -> LỖI khi thu thập link sản phẩm cho {category_url}: {e}")
-
-# --- Đóng trình duyệt ---
-print("\nĐang đóng trình duyệt...")
-driver.quit()
-
-# --- Ghi kết quả ra file CSV đầu ra ---
-if all_results:
-    print(f"\nĐang ghi {len(all_results)} kết quả vào file {output_csv_file}...")
+            response = self.session.get(f"{self.base_url}{LISTING_API_PATH}", params=params, timeout=self.timeout)
+            response.raise_for_status()
+            payload = response.json()
+        except requests.RequestException as e:
+            raise ListingFetchError(f"Listing request for category {category_id} page {page} failed: {e}") from e
+        except ValueError as e:
+            raise ListingFetchError(f"Invalid JSON for category {category_id} page {page}: {e}") from e
+        items = [item for item in (payload.get("data") or []) if isinstance(item, dict)]
+        paging = payload.get("paging") or {}
+        try:
+            last_page = max(1, int(paging.get("last_page") or 1))
+        except (TypeError, ValueError):
+            last_page = 1
+        return items, last_page
+
+    def close(self):
+        self.session.close()
+
+
+def read_categories(input_file: str) -> List[Tuple[str, str]]:
+    """Reads (category_url, detail) pairs; detail is the `detail` column if present, else the row index."""
+    with open(input_file, newline="", encoding="utf-8-sig") as handle:
+        reader = csv.DictReader(handle)
+        categories = []
+        for index, row in enumerate(reader):
+            url = (row.get("URL") or "").strip()
+            if url:
+                categories.append((url, (row.get("detail") or "").strip() or str(index)))
+    return categories
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parses a `K/N` shard spec (0 <= K < N) for argparse."""
     try:
-        with open(output_csv_file, mode='w', newline='',
-                  encoding='utf-8') as outfile:
-            fieldnames = ['URL', 'detail'] # Tên cột
-            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-
-            writer.writeheader() # Ghi dòng tiêu đề
-            writer.writerows(all_results) # Ghi tất cả dữ liệu
-        print(f"Đã ghi kết quả thành công vào: {os.path.join(os.getcwd(),
-              output_csv_file)}")
-    except Exception as e:
-        print(f"LỖI khi ghi vào file {output_csv_file}: {e}")
-else:
-    print("\nKhông có kết quả nào để ghi ra file.")
-
-print("\n--- Hoàn tất ---")
\ No newline at end of file
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', expected K/N")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', expected 0 <= K < N")
+    return index, count
+
+
+def in_shard(category_url: str, shard: Optional[Tuple[int, int]]) -> bool:
+    """True when the category belongs to shard (K, N), chosen by category id modulo N."""
+    if shard is None:
+        return True
+    parsed = parse_category(category_url)
+    return parsed is not None and int(parsed[0]) % shard[1] == shard[0]
+
+
+def harvest_product_links(input_file: str = INPUT_FILE, output_file: str = OUTPUT_FILE,
+                          max_pages: int = MAX_LISTING_PAGES, workers: int = HARVEST_WORKERS,
+                          base_url: str = API_BASE_URL, shard: Optional[Tuple[int, int]] = None) -> Dict[str, int]:
+    """Harvests every category's product links in parallel and streams unique rows to `output_file`."""
+    categories = [category for category in read_categories(input_file) if in_shard(category[0], shard)]
+    logging.info(f"Read {len(categories)} category URLs from '{input_file}'"
+                 f"{f' (shard {shard[0]}/{shard[1]})' if shard else ''}.")
+
+    fetcher = ListingFetcher(base_url, pool_size=workers)
+    writer = StreamingResultWriter(output_file, OUTPUT_COLUMNS)
+    writer.start()
+    seen: Set[Tuple[str, Optional[str]]] = set() # Chỉ luồng chính đọc/ghi tập này
+    stats = {"categories": len(categories), "pages": 0, "products": 0, "duplicates": 0, "failed_pages": 0}
+    per_category: Dict[str, int] = {}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Harvester") as pool:
+        pending: Dict[Future, Tuple[str, str, str, str, int]] = {}
+
+        def submit(category_url: str, detail: str, category_id: str, url_key: str, page: int):
+            future = pool.submit(fetcher.fetch_page, category_id, url_key, page)
+            pending[future] = (category_url, detail, category_id, url_key, page)
+
+        for category_url, detail in categories:
+            parsed = parse_category(category_url)
+            if parsed is None:
+                logging.warning(f"Skipping '{category_url}': no category id in URL.")
+                continue
+            per_category[category_url] = 0
+            submit(category_url, detail, parsed[0], parsed[1], 1)
+
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                category_url, detail, category_id, url_key, page = pending.pop(future)
+                try:
+                    items, last_page = future.result()
+                except ListingFetchError as e:
+                    logging.warning(str(e))
+                    stats["failed_pages"] += 1
+                    continue
+                stats["pages"] += 1
+                if page == 1:
+                    # Biết số trang rồi mới đưa các trang còn lại vào pool
+                    for next_page in range(2, min(last_page, max_pages) + 1):
+                        submit(category_url, detail, category_id, url_key, next_page)
+
+                rows = []
+                for item in items:
+                    url = product_url_from_item(item, base_url)
+                    key = product_key(url) if url else None
+                    if key is None:
+                        continue
+                    if key in seen:
+                        stats["duplicates"] += 1
+                        continue
+                    seen.add(key)
+                    rows.append({"URL": url, "detail": detail, "review_count": item.get("review_count") or 0})
+                writer.submit(rows)
+                stats["products"] += len(rows)
+                per_category[category_url] += len(rows)
+                logging.debug(f"Category {category_id} page {page}: {len(rows)} new products.")
+
+    fetcher.close()
+    writer.close()
+    for category_url, count in per_category.items():
+        logging.info(f"  {category_url}: {count} products")
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(threadName)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Harvest product links of Tiki categories through the listing API.")
+    parser.add_argument("--input", default=INPUT_FILE, help="CSV of category URLs (column 'URL', optional 'detail').")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="CSV of product URLs to write.")
+    parser.add_argument("--max-pages", type=int, default=MAX_LISTING_PAGES, help="Listing pages per category.")
+    parser.add_argument("--workers", type=int, default=HARVEST_WORKERS, help="Parallel listing requests.")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="Only harvest categories whose id %% N == K (e.g. 0/4), to split leaves across machines.")
+    parser.add_argument("--api-base-url", default=API_BASE_URL)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        logging.error(f"Input file '{args.input}' not found. Run 'crawl url.py' first.")
+    else:
+        started = time.time()
+        stats = harvest_product_links(args.input, args.output, max_pages=args.max_pages, workers=args.workers,
+                                      base_url=args.api_base_url, shard=args.shard)
+        logging.info(f"Harvested {stats['products']} unique products from {stats['pages']} pages of "
+                     f"{stats['categories']} categories ({stats['duplicates']} duplicates, "
+                     f"{stats['failed_pages']} failed pages) in {time.time() - started:.1f}s.")
+        logging.info(f"Saved to '{args.output}'.")
@@ -0,0 +1,201 @@
+# metrics.py
+"""
+Đo thời gian từng giai đoạn của scraper và xuất số liệu khi kết thúc.
+
+Mỗi giai đoạn (`driver.get`, chờ phần review, mở "Xem thêm", trích xuất, chuyển
+trang, sleep, gọi API...) được bọc trong `METRICS.phase(...)`. Thời gian được gom
+thành histogram theo giai đoạn, worker và danh mục (`type`); cùng với các bộ
+đếm (review, trang, URL, lệnh WebDriver). Cuối lần chạy ghi ra:
+  - file text định dạng Prometheus (node_exporter textfile collector đọc được),
+  - file JSON tóm tắt: p50/p95 từng giai đoạn, reviews/giây, lệnh WebDriver/review.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+# --- Constants ---
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # Giây
+PHASE_SAMPLES_KEPT = 10000  # Số mẫu giữ lại mỗi giai đoạn để tính p50/p95
+METRIC_PREFIX = "tiki_scraper"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _quantile(samples: List[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "total", "count")
+
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.buckets[bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class ScrapeMetrics:
+    """Thread-safe registry of phase timings and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms: Dict[Labels, _Histogram] = defaultdict(_Histogram)
+            self._counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+            self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=PHASE_SAMPLES_KEPT))
+            self.started_at = time.time()
+            self._started_monotonic = time.monotonic()
+
+    # --- Ngữ cảnh của luồng hiện tại ---
+    def set_context(self, worker: Optional[str] = None, review_type: Optional[str] = None):
+        """Sets the worker / category labels used by this thread's timers and counters."""
+        if worker is not None:
+            self._local.worker = worker
+        self._local.review_type = review_type
+
+    def _context(self) -> Dict[str, Optional[str]]:
+        return {
+            "worker": getattr(self._local, "worker", threading.current_thread().name),
+            "type": getattr(self._local, "review_type", None),
+        }
+
+    # --- Ghi nhận ---
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Times the enclosed block as phase `name` (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, phase: str, seconds: float):
+        labels = _labels(phase=phase, **self._context())
+        with self._lock:
+            self._histograms[labels].observe(seconds)
+            self._samples[phase].append(seconds)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """Adds `value` to counter `name`, labelled with this thread's worker/type plus `labels`."""
+        key = (name, _labels(**{**self._context(), **labels}))
+        with self._lock:
+            self._counters[key] += value
+
+    # --- Tổng hợp ---
+    def _counter_total(self, name: str) -> float:
+        return sum(value for (counter, _), value in self._counters.items() if counter == name)
+
+    def summary(self) -> Dict[str, object]:
+        """Returns run totals, throughput and per-phase latency statistics."""
+        elapsed = max(time.monotonic() - self._started_monotonic, 1e-9)
+        with self._lock:
+            reviews = self._counter_total("reviews")
+            commands = self._counter_total("webdriver_commands")
+            phases = {}
+            for phase, samples in self._samples.items():
+                ordered = sorted(samples)
+                totals = [h for labels, h in self._histograms.items() if ("phase", phase) in labels]
+                phases[phase] = {
+                    "count": sum(h.count for h in totals),
+                    "total_seconds": round(sum(h.total for h in totals), 3),
+                    "p50": round(_quantile(ordered, 0.5), 4),
+                    "p95": round(_quantile(ordered, 0.95), 4),
+                    "max": round(ordered[-1], 4),
+                }
+            by_type: Dict[str, float] = defaultdict(float)
+            by_worker: Dict[str, float] = defaultdict(float)
+            for (counter, labels), value in self._counters.items():
+                if counter == "reviews":
+                    label_map = dict(labels)
+                    by_type[label_map.get("type", "N/A")] += value
+                    by_worker[label_map.get("worker", "N/A")] += value
+            result = {
+                "started_at": self.started_at,
+                "elapsed_seconds": round(elapsed, 3),
+                "reviews": int(reviews),
+                "pages": int(self._counter_total("pages")),
+                "urls": int(self._counter_total("urls")),
+                "reviews_per_second": round(reviews / elapsed, 3),
+                "webdriver_commands": int(commands),
+                "webdriver_commands_per_review": round(commands / reviews, 3) if reviews else None,
+                "reviews_by_type": dict(by_type),
+                "reviews_by_worker": dict(by_worker),
+                "phases": dict(sorted(phases.items(), key=lambda item: -item[1]["total_seconds"])),
+            }
+        return result
+
+    # --- Xuất file ---
+    def prometheus_text(self) -> str:
+        """Renders every histogram and counter in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_phase_seconds Time spent per scraping phase.",
+            f"# TYPE {METRIC_PREFIX}_phase_seconds histogram",
+        ]
+        with self._lock:
+            for labels, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(HISTOGRAM_BUCKETS + (float("inf"),), histogram.buckets):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{METRIC_PREFIX}_phase_seconds_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{METRIC_PREFIX}_phase_seconds_sum{_format_labels(labels)} {histogram.total:.6f}")
+                lines.append(f"{METRIC_PREFIX}_phase_seconds_count{_format_labels(labels)} {histogram.count}")
+            names = sorted({name for name, _ in self._counters})
+            for name in names:
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+                for (counter, labels), value in sorted(self._counters.items()):
+                    if counter == name:
+                        lines.append(f"{METRIC_PREFIX}_{name}_total{_format_labels(labels)} {value:g}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_reviews_per_second gauge")
+        lines.append(f"{METRIC_PREFIX}_reviews_per_second {summary['reviews_per_second']}")
+        if summary["webdriver_commands_per_review"] is not None:
+            lines.append(f"# TYPE {METRIC_PREFIX}_webdriver_commands_per_review gauge")
+            lines.append(f"{METRIC_PREFIX}_webdriver_commands_per_review {summary['webdriver_commands_per_review']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, prometheus_file: str, json_file: str) -> Dict[str, object]:
+        """Writes the Prometheus text file and the JSON summary (atomically); returns the summary."""
+        summary = self.summary()
+        _write_atomic(prometheus_file, self.prometheus_text())
+        _write_atomic(json_file, json.dumps(summary, ensure_ascii=False, indent=2))
+        return summary
+
+
+def _write_atomic(path: str, content: str):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        handle.write(content)
+    os.replace(temp_path, path)
+
+
+METRICS = ScrapeMetrics()  # Registry dùng chung cho cả tiến trình
@@ -4,7 +4,6 @@ import time
 import os
 import logging
 import threading # Thêm thư viện threading
-from queue import Queue # Thêm thư viện queue
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service as ChromeService
@@ -13,19 +12,56 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import (
     TimeoutException,
-    NoSuchElementException,
-    StaleElementReferenceException,
-    ElementClickInterceptedException,
     WebDriverException, # Bắt lỗi WebDriver chung
 )
 from webdriver_manager.chrome import ChromeDriverManager
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
+import argparse
+from urllib.parse import urlparse
+from http_engine import HttpReviewFetcher, HttpFetchError, API_BASE_URL, REVIEWS_PER_PAGE, REVIEWS_SORT_NEWEST
+from async_crawler import run_async_crawl
+from driver_pool import DriverPool, POOL_SPARE_DRIVERS
+from concurrency_controller import ConcurrencyController
+from scheduler import WorkStealingScheduler, DEFAULT_TASK_COST
+from metrics import METRICS
+from page_tasks import PageMerger, PageRangeTask, split_page_range, PAGE_SPLIT_THRESHOLD, PAGE_RANGE_MAX_ATTEMPTS
+from profile_manager import ProfileCloneError, ProfileManager
+from tiki_selectors import (
+    REVIEWS_SECTION_ID,
+    REVIEW_CONTAINER_CSS,
+    REVIEW_TITLE_CSS,
+    REVIEW_CONTENT_CSS,
+    SHOW_MORE_CONTENT_CSS,
+    NEXT_PAGE_BUTTON_CSS,
+)
+from review_extraction import (
+    extract_reviews_batched,
+    extract_reviews_from_html,
+    capture_widget_html,
+    instrument_driver,
+    commands_issued,
+    PARSER_BACKENDS,
+    available_parser_backends,
+)
+from page_events import expand_all_show_more, click_next_and_wait, sort_reviews_newest_first
+from lean_mode import apply_lean_options, enable_request_blocking, page_transfer_stats
+from result_writer import StreamingResultWriter
+from columnar_writer import (ColumnarResultWriter, FORMAT_CSV, FORMAT_PARQUET, OUTPUT_FORMATS, dataset_files,
+                             iter_dataset_rows, parquet_dir_for, remove_stale_parts, require_pyarrow)
+from review_dedup import ReviewDeduplicator, seen_set_path_for
+from url_canonicalizer import TrackingResolver, canonicalize_tasks, product_key, repair_scheme
+from crawl_frontier import CrawlFrontier, default_owner
+from snapshot_archive import SnapshotArchive
+from high_water_marks import HighWaterMarkStore, IncrementalCutoff
+from log_setup import configure_logging, update_log_context, clear_log_context
+from review_records import ReviewColumns, ReviewRecord
 
 # --- Đường dẫn thư mục ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Thư mục gốc của dự án
 DATA_DIR = os.path.join(BASE_DIR, "data")  # Thư mục chứa dữ liệu
 LOGS_DIR = os.path.join(BASE_DIR, "logs")  # Thư mục chứa log
 BROWSER_PROFILES_DIR = os.path.join(BASE_DIR, "browser_profiles")  # Thư mục chứa profile trình duyệt
+CHROME_PROFILE_TEMPLATE_DIR = os.path.join(BROWSER_PROFILES_DIR, "chrome_data")  # Profile mẫu, mỗi driver dùng một bản sao riêng
 
 # Đảm bảo các thư mục tồn tại
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -34,43 +70,49 @@ os.makedirs(LOGS_DIR, exist_ok=True)
 # --- Constants ---
 URL_FILE = os.path.join(DATA_DIR, "url_final_5.csv")  # Cập nhật đường dẫn
 OUTPUT_FILE = os.path.join(DATA_DIR, "raw_data.csv")  # Cập nhật đường dẫn
+METRICS_PROM_FILE = os.path.join(LOGS_DIR, "scrape_metrics.prom")  # Số liệu định dạng Prometheus
+METRICS_JSON_FILE = os.path.join(LOGS_DIR, "scrape_metrics.json")  # Tóm tắt số liệu dạng JSON
+FRONTIER_FILE = os.path.join(DATA_DIR, "crawl_frontier.sqlite")  # Trạng thái crawl từng URL để chạy tiếp khi bị dừng
+HIGH_WATER_MARKS_FILE = os.path.join(DATA_DIR, "high_water_marks.sqlite")  # Review mới nhất đã thu thập của từng sản phẩm
 DEFAULT_WAIT_TIME = 15 # Tăng thời gian chờ một chút khi chạy đa luồng
 SHORT_WAIT_TIME = 3
 URL_COLUMN_NAME = "URL" 
 DETAIL_COLUMN_NAME = "detail" 
+REVIEW_COUNT_COLUMN_NAME = "review_count" # Cột tuỳ chọn: số review trên trang danh mục, dùng để ưu tiên sản phẩm lớn
 OUTPUT_COLUMNS = ['title', 'content', 'type'] 
-MAX_WORKERS = 4  # !!! ĐIỀU CHỈNH SỐ LUỒNG PHÙ HỢP VỚI MÁY CỦA BẠN !!!
-
-# Selectors
-REVIEWS_SECTION_ID = "customer-review-widget-id" 
-REVIEW_CONTAINER_CSS = "div.review-comment"
-REVIEW_TITLE_CSS = "div.review-comment__title"
-REVIEW_CONTENT_CSS = "div.review-comment__content"
-SHOW_MORE_CONTENT_CSS = "span.show-more-content" 
-NEXT_PAGE_BUTTON_CSS = "a.btn.next:not(.disabled)" 
+# Số worker hoạt động được điều chỉnh tự động (AIMD) trong khoảng [MIN_WORKERS, MAX_WORKERS]
+MIN_WORKERS = 1
+INITIAL_WORKERS = 4
+MAX_WORKERS = 12  # Chặn trên; bộ điều khiển sẽ giảm khi CPU/RAM không đủ hoặc website chậm lại
+ENGINE_SELENIUM = "selenium"
+ENGINE_HTTP = "http" # Gọi API đánh giá trực tiếp, fallback về Selenium nếu lỗi
+ENGINE_ASYNC = "async" # asyncio + aiohttp cho toàn bộ danh sách, URL lỗi được chạy lại bằng Selenium
+FETCH_ENGINES = (ENGINE_SELENIUM, ENGINE_HTTP, ENGINE_ASYNC)
+FETCH_ENGINE = ENGINE_SELENIUM # Engine mặc định cho mỗi lần chạy
+RESOLVE_TRACKING_URLS = True # Giải URL tracking (tka.tiki.vn) qua HTTP redirect; False thì loại luôn
+LEAN_MODE = False # Chặn ảnh/font/media/tracking và dùng page load "eager" (xem lean_mode.py)
+INCREMENTAL = False # Chỉ lấy review mới hơn lần crawl trước (mới nhất trước, dừng ở review đã biết)
+CAPTURE_SNAPSHOTS = False # Lưu HTML widget review của mỗi trang để trích xuất lại offline (xem snapshot_archive.py)
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")  # Kho HTML nén của các trang review
+PARSER_JS = "js" # Trích xuất trong trình duyệt bằng một execute_script
+PARSER_CHOICES = (PARSER_JS,) + PARSER_BACKENDS # Các backend khác phân tích outerHTML của widget trong tiến trình Python
+PARSER_BACKEND = PARSER_JS
+OUTPUT_FORMAT = FORMAT_CSV # "parquet": dataset Parquet chia theo type cạnh OUTPUT_FILE (xem columnar_writer.py)
 
 # --- Logging Setup ---
-# Log cơ bản, có thể bị xen kẽ giữa các luồng
+# Worker chỉ đưa record vào hàng đợi, luồng nền ghi ra file (xoay vòng, giữ log các lần chạy trước) và console
 LOG_FILE = os.path.join(LOGS_DIR, "scraper_multithread.log")  # Cập nhật đường dẫn
-if os.path.exists(LOG_FILE):
-    os.remove(LOG_FILE)
-    
-logging.basicConfig(level=logging.INFO, 
-                    format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s', # Thêm tên luồng vào log
-                    handlers=[
-                        logging.FileHandler(LOG_FILE, mode='w', encoding='utf-8'), 
-                        logging.StreamHandler() 
-                    ])
-
-# --- Shared Resources ---
-url_queue: Queue[Tuple[str, str]] = Queue() # Queue để chứa các cặp (url, detail) cần xử lý
-results_list = [] # List chung để lưu kết quả từ các luồng
-results_lock = threading.Lock() # Lock để bảo vệ việc ghi vào results_list
+LOG_JSON_FILE = os.path.join(LOGS_DIR, "scraper_multithread.jsonl")  # Log JSON-lines (bật bằng --json-logs)
+# configure_logging() chỉ được gọi trong __main__: import module (vd. từ benchmark.py) không xoay file log của scraper
 
 # --- Functions (Giữ nguyên hoặc sửa đổi nhỏ) ---
 
-def setup_driver() -> Optional[webdriver.Chrome]:
-    """Initializes and configures the Chrome WebDriver."""
+def setup_driver(user_data_dir: Optional[str] = None, lean: bool = LEAN_MODE,
+                 use_template: bool = True) -> Optional[webdriver.Chrome]:
+    """Initializes and configures the Chrome WebDriver (optionally on a private profile copy, in lean mode).
+
+    Without `user_data_dir`, the shared template profile is used only when `use_template` is set.
+    """
     # (Giữ nguyên phần lớn hàm setup_driver, nhưng thêm return Optional và xử lý lỗi)
     chrome_options = Options()
     # Các options giống như trước
@@ -85,15 +127,20 @@ def setup_driver() -> Optional[webdriver.Chrome]:
     chrome_options.add_argument("--no-sandbox") # Có thể cần trên một số hệ thống Linux/Docker
     chrome_options.add_argument("--disable-dev-shm-usage") # Có thể cần trên một số hệ thống Linux/Docker
     
-    # Sử dụng chrome_data từ thư mục browser_profiles nếu có
-    chrome_data_path = os.path.join(BROWSER_PROFILES_DIR, "chrome_data")
-    if os.path.exists(chrome_data_path):
+    # Sử dụng profile riêng nếu được cấp, nếu không thì dùng chrome_data từ thư mục browser_profiles
+    chrome_data_path = user_data_dir or (CHROME_PROFILE_TEMPLATE_DIR if use_template else None)
+    if chrome_data_path and os.path.exists(chrome_data_path):
         chrome_options.add_argument(f"--user-data-dir={chrome_data_path}")
         logging.debug(f"Using Chrome profile from {chrome_data_path}")
+    if lean:
+        apply_lean_options(chrome_options)
 
     try:
         service = ChromeService(ChromeDriverManager().install())
         driver = webdriver.Chrome(service=service, options=chrome_options)
+        instrument_driver(driver) # Đếm số lệnh WebDriver để đo chi phí mỗi trang
+        if lean:
+            enable_request_blocking(driver)
         logging.debug("WebDriver setup successfully for thread.")
         return driver
     except Exception as e:
@@ -101,69 +148,80 @@ def setup_driver() -> Optional[webdriver.Chrome]:
         logging.error(f"Error setting up WebDriver in thread: {e}", exc_info=True)
         return None # Trả về None nếu không khởi tạo được driver
 
-# click_all_show_more_in_reviews và extract_review_data giữ nguyên như phiên bản trước
-def click_all_show_more_in_reviews(driver: webdriver.Chrome):
-    """Finds and clicks all 'Xem thêm' buttons within review content."""
+def setup_isolated_driver(profile_manager: ProfileManager, lean: bool = LEAN_MODE) -> Optional[webdriver.Chrome]:
+    """Starts a WebDriver on its own copy of the template profile (never on the shared template)."""
     try:
-        show_more_buttons = driver.find_elements(By.CSS_SELECTOR, f"{REVIEW_CONTENT_CSS} {SHOW_MORE_CONTENT_CSS}")
-        if not show_more_buttons: return
-        clicked_count = 0
-        for button in show_more_buttons:
-            try:
-                if button.is_displayed():
-                    driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", button)
-                    time.sleep(0.2) 
-                    driver.execute_script("arguments[0].click();", button)
-                    clicked_count += 1
-                    time.sleep(0.5) 
-            except StaleElementReferenceException: logging.debug("Stale 'Xem thêm' button.")
-            except ElementClickInterceptedException: logging.warning("Intercepted 'Xem thêm' click.")
-            except Exception as e: logging.warning(f"Click 'Xem thêm' error: {e}")
-        if clicked_count > 0: logging.debug(f"Clicked {clicked_count} 'Xem thêm' buttons.")
-    except Exception as e: logging.error(f"Find/Click 'Xem thêm' error: {e}", exc_info=False)
-
-def extract_review_data(driver: webdriver.Chrome) -> List[Dict[str, str]]:
-    """Extracts title and content data from review elements on the current page."""
-    reviews_on_page = []
-    try:
-        review_containers = driver.find_elements(By.CSS_SELECTOR, REVIEW_CONTAINER_CSS) # Dùng find_elements để tránh lỗi nếu không có review nào
-        if not review_containers: return []
-
-        for container in review_containers:
-            title = "N/A"
-            content = "N/A"
-            try:
-                title_element = container.find_element(By.CSS_SELECTOR, REVIEW_TITLE_CSS)
-                title = title_element.text.strip()
-            except NoSuchElementException: pass 
-            except StaleElementReferenceException: pass
-                 
-            try:
-                content_element = container.find_element(By.CSS_SELECTOR, REVIEW_CONTENT_CSS)
-                content = content_element.text.strip() 
-            except NoSuchElementException: pass 
-            except StaleElementReferenceException: pass
-
-            reviews_on_page.append({"title": title, "content": content})
+        profile_dir = profile_manager.acquire()
+    except ProfileCloneError as e:
+        # Không chạy Chrome trên profile mẫu dùng chung: pool coi đây là một lần khởi động lỗi và thử lại
+        logging.error(f"{e}; not launching a WebDriver.")
+        return None
+    driver = setup_driver(user_data_dir=profile_dir, lean=lean, use_template=False)
+    if driver is None:
+        profile_manager.release(profile_dir)
+        return None
+    driver.profile_dir = profile_dir # Để xóa đúng bản sao khi driver thoát
+    return driver
 
-    except Exception as e: logging.error(f"Extract reviews error: {e}", exc_info=False)
-    return reviews_on_page
+def quit_isolated_driver(profile_manager: ProfileManager, driver: webdriver.Chrome):
+    """Quits a driver started by setup_isolated_driver and deletes its profile copy."""
+    try:
+        driver.quit()
+    finally:
+        profile_manager.release(getattr(driver, "profile_dir", None))
 
-def navigate_and_scrape_reviews(driver: webdriver.Chrome, url: str, detail_type: str) -> List[Dict[str, str]]:
-    """Navigates, paginates, scrapes reviews for a single URL, and adds type."""
+def click_all_show_more_in_reviews(driver: webdriver.Chrome):
+    """Clicks all 'Xem thêm' buttons within review content in one script, waiting only until they expand."""
+    expand_all_show_more(driver, REVIEW_CONTENT_CSS, SHOW_MORE_CONTENT_CSS, max_wait=SHORT_WAIT_TIME)
+
+def extract_review_data(driver: webdriver.Chrome, parser_backend: str = PARSER_BACKEND,
+                        page_html: Optional[str] = None) -> List[ReviewRecord]:
+    """Extracts title and content data from all review elements on the current page in one round trip.
+
+    With an HTML parser backend, the widget HTML (`page_html`, or fetched with one command) is parsed in-process.
+    """
+    if parser_backend == PARSER_JS:
+        return extract_reviews_batched(driver, REVIEW_CONTAINER_CSS, REVIEW_TITLE_CSS, REVIEW_CONTENT_CSS)
+    if page_html is None:
+        page_html = capture_widget_html(driver, REVIEWS_SECTION_ID)
+    if not page_html:
+        return []
+    try:
+        return extract_reviews_from_html(page_html, backend=parser_backend)
+    except Exception as e:
+        logging.error(f"Extract reviews error ({parser_backend}): {e}", exc_info=False)
+        return []
+
+def navigate_and_scrape_reviews(driver: webdriver.Chrome, url: str, detail_type: str, start_page: int = 1,
+                                on_page: Optional[Callable[[int, List[ReviewRecord]], None]] = None,
+                                snapshots: Optional[SnapshotArchive] = None,
+                                parser_backend: str = PARSER_BACKEND,
+                                cutoff: Optional[IncrementalCutoff] = None) -> ReviewColumns:
+    """Navigates, paginates, scrapes reviews for a single URL, and adds type.
+
+    Pages before `start_page` are only paged through (resume). Rows are returned as a `ReviewColumns`
+    buffer, or handed to `on_page(page, rows)` after each page instead of being kept.
+    With `snapshots`, each page's expanded review widget HTML is archived for offline re-extraction.
+    With `cutoff` (incremental crawl), reviews are sorted newest first and scraping stops at the first known one.
+    """
     # (Hàm này gần như giữ nguyên logic cốt lõi, chỉ thêm logging rõ hơn)
-    all_reviews_for_url = []
+    all_reviews_for_url = ReviewColumns() # Chỉ dùng khi không có on_page: trang đã giao đi thì không giữ lại
+    reviews_found = 0
+    url_commands_start = commands_issued(driver)
     try:
         logging.info(f"Navigating to: {url}")
-        driver.get(url)
-        WebDriverWait(driver, DEFAULT_WAIT_TIME).until(EC.presence_of_element_located((By.TAG_NAME, "main")))
+        with METRICS.phase("driver_get"):
+            driver.get(url)
+        with METRICS.phase("wait_page_load"):
+            WebDriverWait(driver, DEFAULT_WAIT_TIME).until(EC.presence_of_element_located((By.TAG_NAME, "main")))
         logging.debug(f"Page loaded: {url}")
 
         # Scroll to Reviews Section
         try:
-            reviews_section_element = WebDriverWait(driver, DEFAULT_WAIT_TIME).until(EC.presence_of_element_located((By.ID, REVIEWS_SECTION_ID)))
-            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", reviews_section_element)
-            WebDriverWait(driver, SHORT_WAIT_TIME).until(EC.visibility_of_element_located((By.CSS_SELECTOR, REVIEW_CONTAINER_CSS)))
+            with METRICS.phase("wait_reviews_section"):
+                reviews_section_element = WebDriverWait(driver, DEFAULT_WAIT_TIME).until(EC.presence_of_element_located((By.ID, REVIEWS_SECTION_ID)))
+                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", reviews_section_element)
+                WebDriverWait(driver, SHORT_WAIT_TIME).until(EC.visibility_of_element_located((By.CSS_SELECTOR, REVIEW_CONTAINER_CSS)))
             logging.debug(f"Scrolled to reviews section '{REVIEWS_SECTION_ID}'.")
         except TimeoutException:
             logging.warning(f"Reviews section '{REVIEWS_SECTION_ID}'/'{REVIEW_CONTAINER_CSS}' not found/visible after scroll. Proceeding without specific scroll.")
@@ -171,47 +229,77 @@ def navigate_and_scrape_reviews(driver: webdriver.Chrome, url: str, detail_type:
             # driver.execute_script("window.scrollBy(0, 1200);") 
             # time.sleep(SHORT_WAIT_TIME) 
 
+        if cutoff is not None:
+            with METRICS.phase("sort_newest"):
+                sorted_newest = sort_reviews_newest_first(driver)
+            if not sorted_newest:
+                # Không sắp được theo mới nhất thì không thể dừng sớm: lấy đủ mọi trang, giữ nguyên mốc cũ
+                logging.warning(f"Cannot sort reviews newest first for {url}; crawling every page.")
+                cutoff = None
+
         page_num = 1
         while True:
-            logging.debug(f"Processing page {page_num} for URL: {url}")
-            click_all_show_more_in_reviews(driver)
-            page_reviews_raw = extract_review_data(driver)
-            
-            reviews_processed_count = 0
-            for review in page_reviews_raw:
-                review['type'] = detail_type 
-                all_reviews_for_url.append(review)
-                reviews_processed_count += 1
-
-            if reviews_processed_count > 0:
-                logging.debug(f"Extracted {reviews_processed_count} reviews from page {page_num}.")
+            if page_num < start_page:
+                # Trang đã được thu thập ở lần chạy trước: chỉ chuyển trang, không trích xuất lại
+                logging.debug(f"Skipping checkpointed page {page_num} for URL: {url}")
             else:
-                 # Nếu trang đầu không có review thì dừng luôn cho URL này
-                 if page_num == 1:
-                     logging.warning(f"No reviews found on first page for {url}. Skipping rest of this URL.")
-                     break
-                 else: # Nếu các trang sau không có review thì coi như hết trang
-                     logging.debug(f"No reviews found on page {page_num}, likely end for {url}.")
-                     break 
-
-            # Find and Click Next
-            try:
-                next_button = WebDriverWait(driver, SHORT_WAIT_TIME).until(EC.element_to_be_clickable((By.CSS_SELECTOR, NEXT_PAGE_BUTTON_CSS)))
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", next_button)
-                time.sleep(0.3) 
-                driver.execute_script("arguments[0].click();", next_button)
+                logging.debug(f"Processing page {page_num} for URL: {url}")
+                page_commands_start = commands_issued(driver)
+                with METRICS.phase("expand_show_more"):
+                    click_all_show_more_in_reviews(driver)
+                widget_html = None
+                if snapshots is not None:
+                    with METRICS.phase("snapshot"):
+                        widget_html = capture_widget_html(driver, REVIEWS_SECTION_ID)
+                        if widget_html:
+                            snapshots.capture(url, page_num, widget_html, detail_type)
+                with METRICS.phase("extract"):
+                    # HTML vừa lưu vào kho được dùng lại, không lấy lần thứ hai
+                    page_reviews_raw = extract_review_data(driver, parser_backend, page_html=widget_html)
                 
-                # Wait for next page load (wait for *any* review container)
-                try:
-                    WebDriverWait(driver, DEFAULT_WAIT_TIME).until(EC.presence_of_element_located((By.CSS_SELECTOR, REVIEW_CONTAINER_CSS)))
-                except TimeoutException:
+                reached_known = False
+                if cutoff is not None:
+                    known_at = next((i for i, review in enumerate(page_reviews_raw) if cutoff.reached_by_row(review)), None)
+                    if known_at is not None:
+                        page_reviews_raw = page_reviews_raw[:known_at] # Chỉ giữ các review mới hơn lần crawl trước
+                        reached_known = True
+
+                for review in page_reviews_raw:
+                    review.type = detail_type # Cùng một chuỗi cho mọi review của URL
+                reviews_processed_count = len(page_reviews_raw)
+                reviews_found += reviews_processed_count
+
+                if reviews_processed_count > 0:
+                    logging.debug(f"Extracted {reviews_processed_count} reviews from page {page_num} "
+                                  f"({commands_issued(driver) - page_commands_start} WebDriver commands).")
+                    if on_page is not None:
+                        on_page(page_num, page_reviews_raw) # Ghi kết quả và checkpoint ngay sau mỗi trang
+                    else:
+                        all_reviews_for_url.extend(page_reviews_raw)
+                if reached_known:
+                    logging.debug(f"Reached already-crawled reviews on page {page_num} for {url}.")
+                    break
+                if reviews_processed_count == 0:
+                     # Nếu trang đầu không có review thì dừng luôn cho URL này
+                     if page_num == 1:
+                         logging.warning(f"No reviews found on first page for {url}. Skipping rest of this URL.")
+                         break
+                     else: # Nếu các trang sau không có review thì coi như hết trang
+                         logging.debug(f"No reviews found on page {page_num}, likely end for {url}.")
+                         break 
+
+            # Find and Click Next: click rồi chờ danh sách review đổi (MutationObserver), không sleep cố định
+            try:
+                with METRICS.phase("paginate"):
+                    transition = click_next_and_wait(driver, REVIEWS_SECTION_ID, REVIEW_CONTAINER_CSS,
+                                                     NEXT_PAGE_BUTTON_CSS, max_wait=DEFAULT_WAIT_TIME)
+                if not transition["clicked"]:
+                    logging.debug(f"No clickable 'Next' button. End of pagination for {url}."); break
+                if not transition["changed"]:
                      logging.warning(f"Timeout waiting for reviews on page {page_num + 1}. Assuming end.")
                      break 
                 page_num += 1
-                time.sleep(0.5) 
-            except TimeoutException: logging.debug(f"No clickable 'Next' button. End of pagination for {url}."); break 
-            except StaleElementReferenceException: logging.warning("Next button stale. Stopping pagination."); break
-            except ElementClickInterceptedException: logging.error("Next button click intercepted. Stopping."); break
+            except TimeoutException: logging.warning(f"Page transition script timed out on page {page_num}. Stopping."); break
             except Exception as e: logging.error(f"Next page error: {e}", exc_info=False); break 
     
     except WebDriverException as e:
@@ -220,61 +308,260 @@ def navigate_and_scrape_reviews(driver: webdriver.Chrome, url: str, detail_type:
     except Exception as e:
         logging.error(f"Critical error processing {url}: {e}", exc_info=True) # Log full traceback cho lỗi lạ
     
-    logging.info(f"Finished processing {url}. Found {len(all_reviews_for_url)} reviews.")
+    url_commands = commands_issued(driver) - url_commands_start
+    METRICS.count("webdriver_commands", url_commands)
+    logging.info(f"Finished processing {url}. Found {reviews_found} reviews "
+                 f"using {url_commands} WebDriver commands.")
+    if getattr(driver, "lean_mode", False):
+        transfer = page_transfer_stats(driver)
+        logging.info(f"[lean] {url}: {transfer['transferred_bytes'] / 1024:.0f} KiB transferred, "
+                     f"{transfer['blocked_requests']} requests blocked, "
+                     f"~{transfer['estimated_saved_bytes'] / 1024:.0f} KiB saved.")
     return all_reviews_for_url
 
 # --- Worker Function ---
-def worker():
+def scrape_page_range(http_fetcher: HttpReviewFetcher, task: PageRangeTask, controller: ConcurrencyController):
+    """Fetches one page-range task over HTTP and hands its pages to the product's merger."""
+    logging.info(f"Starting scrape for: {task.url} (Type: {task.detail_type}) pages {task.first_page}-{task.last_page}")
+    METRICS.set_context(review_type=task.detail_type)
+    update_log_context(url=task.url, page=task.first_page, reset_clock=True)
+    page_started = time.monotonic()
+
+    def on_page(page_num: int, page_rows: List[ReviewRecord]):
+        nonlocal page_started
+        page_latency = time.monotonic() - page_started
+        controller.record_latency(page_latency)
+        METRICS.observe("page", page_latency)
+        METRICS.count("pages")
+        METRICS.count("reviews", len(page_rows))
+        task.merger.add(page_num, page_rows)
+        update_log_context(page=page_num + 1)
+        page_started = time.monotonic()
+
+    try:
+        with METRICS.phase("http_fetch"):
+            http_fetcher.fetch_reviews(task.url, task.detail_type, start_page=task.first_page,
+                                       end_page=task.last_page, on_page=on_page)
+    except HttpFetchError as e:
+        logging.warning(f"HTTP engine failed for {task!r}: {e}")
+        task.merger.range_failed(task.first_page, task.last_page, str(e), task.attempt) # Thử lại hoặc bỏ khoảng trang
+        return False
+    task.merger.range_done()
+    return True
+
+
+def worker(worker_id: int, scheduler: WorkStealingScheduler, driver_pool: DriverPool,
+           result_writer: StreamingResultWriter, frontier: CrawlFrontier, controller: ConcurrencyController,
+           engine: str = FETCH_ENGINE, api_base_url: str = API_BASE_URL,
+           snapshots: Optional[SnapshotArchive] = None, parser_backend: str = PARSER_BACKEND,
+           marks: Optional[HighWaterMarkStore] = None):
     """Function executed by each thread."""
-    driver = setup_driver() # Mỗi luồng tự khởi tạo driver
-    if driver is None:
-        logging.error("Thread failed to initialize WebDriver. Exiting worker.")
-        return # Thoát luồng nếu không tạo được driver
+    http_fetcher = HttpReviewFetcher(base_url=api_base_url) if engine == ENGINE_HTTP else None
+    METRICS.set_context(worker=f"worker-{worker_id}")
+    update_log_context(worker=worker_id)
+
+    while True:
+        # Xin slot trước khi nhận task để worker đang bị giới hạn không giữ task mà worker khác có thể lấy
+        controller.acquire() # Chờ tới khi số worker đang chạy nhỏ hơn mức bộ điều khiển cho phép
+        task = scheduler.get(worker_id) # Chờ task (tự lấy từ worker khác nếu deque của mình trống)
+        if task is None:
+            controller.release() # Sentinel: mọi task đã xong
+            break
+
+        if isinstance(task, PageRangeTask):
+            # Một khoảng trang của sản phẩm lớn, được tách ra bởi worker khác
+            range_ok = scrape_page_range(http_fetcher, task, controller)
+            controller.release(timed_out=not range_ok)
+            clear_log_context("url", "page")
+            scheduler.task_done()
+            continue
 
-    while not url_queue.empty():
-        try:
-            url, detail_type = url_queue.get(timeout=1) # Lấy task từ queue
-        except Queue.Empty:
-            continue # Queue trống, luồng tiếp tục kiểm tra
+        url, detail_type = task
+        METRICS.set_context(review_type=detail_type)
+        update_log_context(url=url, page=None, reset_clock=True)
+        url_started = page_started = time.monotonic()
+        start_page = leased_page = frontier.lease(url, default_owner()) # Trang bắt đầu (> 1 nếu lần trước làm dở)
+        # Crawl tăng dần: dừng ở review mới nhất của lần trước
+        cutoff = IncrementalCutoff(detail_type, marks.get(url)) if marks is not None else None
+        update_log_context(page=start_page)
+        if start_page > 1:
+            logging.info(f"Resuming scrape for: {url} (Type: {detail_type}) at page {start_page}")
+        else:
+            logging.info(f"Starting scrape for: {url} (Type: {detail_type})")
+
+        def emit_page(page_num: int, page_rows: List[ReviewRecord], url: str = url):
+            # Luồng writer ghi nối xuống file, không cần lock toàn cục; checkpoint chỉ được ghi
+            # (trên luồng writer) sau khi các dòng của trang đã được ghi và fsync
+            review_count = len(page_rows)
+            result_writer.submit(page_rows, on_durable=lambda: frontier.record_page(url, page_num, review_count))
+
+        def finish_split(error: Optional[str], saved_through: int, url: str = url):
+            if error is None:
+                result_writer.when_durable(lambda: frontier.mark_done(url))
+                logging.info(f"Finished all page ranges of {url}.")
+            elif saved_through >= merger.first_page:
+                # Các trang liền mạch trước chỗ hổng đã được giữ (checkpoint tới đó); lần sau tiếp tục từ chỗ hổng
+                logging.warning(f"Partially scraped {url}: pages up to {saved_through} saved; {error}")
+                frontier.mark_partial(url, error)
+            else:
+                frontier.mark_failed(url, error)
+
+        def requeue_range(first_page: int, last_page: int, attempt: int, url: str = url, detail_type: str = detail_type):
+            logging.warning(f"Requeueing pages {first_page}-{last_page} of {url} "
+                            f"(attempt {attempt}/{PAGE_RANGE_MAX_ATTEMPTS}).")
+            # Cuối deque của worker rảnh nhất: không thử lại ngay lập tức
+            scheduler.submit(PageRangeTask(url, detail_type, first_page, last_page, merger, attempt),
+                             cost=(last_page - first_page + 1) * REVIEWS_PER_PAGE, front=False)
+
+        merger: Optional[PageMerger] = None
+        first_range: Optional[Tuple[int, int]] = None # Khoảng trang đầu, do chính worker này lấy
+
+        def on_paging(first_page: int, last_page: int, url: str = url, detail_type: str = detail_type) -> Optional[int]:
+            # Sản phẩm nhiều trang: tách phần còn lại thành các task khoảng trang cho worker khác
+            nonlocal merger, first_range
+            if last_page - first_page + 1 < PAGE_SPLIT_THRESHOLD:
+                return None
+            ranges = split_page_range(first_page, last_page)
+            first_range = ranges[0]
+            merger = PageMerger(url, first_page, len(ranges), on_emit=emit_page, on_finish=finish_split,
+                                requeue=requeue_range)
+            for range_first, range_last in reversed(ranges[1:]): # Đưa lên đầu deque theo đúng thứ tự trang
+                scheduler.submit(PageRangeTask(url, detail_type, range_first, range_last, merger),
+                                 cost=(range_last - range_first + 1) * REVIEWS_PER_PAGE, worker_id=worker_id)
+            logging.info(f"Split {url} ({last_page - first_page + 1} pages) into {len(ranges)} page-range tasks.")
+            return ranges[0][1]
+
+        emitted_through = start_page - 1 # Trang cuối cùng đã giao cho writer
+        last_page_reached = 0 # Trang xa nhất đã mở (driver đi qua mọi trang trước nó)
+
+        def on_page(page_num: int, page_rows: List[ReviewRecord]):
+            nonlocal page_started, emitted_through, last_page_reached
+            last_page_reached = max(last_page_reached, page_num)
+            page_latency = time.monotonic() - page_started
+            controller.record_latency(page_latency) # Độ trễ từng trang cho bộ điều khiển
+            METRICS.observe("page", page_latency)
+            METRICS.count("pages")
+            METRICS.count("reviews", len(page_rows))
+            if merger is not None:
+                merger.add(page_num, page_rows)
+            else:
+                emit_page(page_num, page_rows)
+                emitted_through = page_num
+            update_log_context(page=page_num + 1) # Các log tiếp theo thuộc về trang kế tiếp
+            page_started = time.monotonic()
+
+        fetched_over_http = False
+        failure = None
+        if http_fetcher is not None:
+            try:
+                with METRICS.phase("http_fetch"):
+                    if cutoff is not None:
+                        # Không tách trang: lượt tăng dần thường dừng sau một hai trang
+                        http_fetcher.fetch_reviews(url, detail_type, start_page=start_page, on_page=on_page,
+                                                   sort=REVIEWS_SORT_NEWEST, stop_at=cutoff.reached_by_item)
+                    else:
+                        http_fetcher.fetch_reviews(url, detail_type, start_page=start_page, on_page=on_page, on_paging=on_paging)
+                fetched_over_http = True
+            except HttpFetchError as e:
+                if merger is None:
+                    logging.warning(f"HTTP engine failed for {url}: {e}. Falling back to Selenium.")
+                    start_page = emitted_through + 1 # Tiếp tục từ trang HTTP engine chưa lấy được
+                else:
+                    # Các khoảng trang khác đang chạy song song nên không chuyển sang Selenium
+                    logging.warning(f"HTTP engine failed for the first page range of {url}: {e}")
+                    failure = str(e)
+                    fetched_over_http = True
+
+        if not fetched_over_http:
+            with METRICS.phase("lease_driver"):
+                pooled = driver_pool.lease() # Mượn driver đã khởi động sẵn từ pool
+            if pooled is None:
+                logging.error(f"No WebDriver available from pool for {url}. Skipping URL.")
+                failure = "no WebDriver available"
+            else:
+                try:
+                     navigate_and_scrape_reviews(pooled.driver, url, detail_type, start_page=start_page, on_page=on_page,
+                                                 snapshots=snapshots, parser_backend=parser_backend, cutoff=cutoff)
+                     # Tính theo số trang review đã mở (kể cả trang chỉ lướt qua khi resume), không theo số URL
+                     driver_pool.release(pooled, pages=max(last_page_reached, start_page))
+                except Exception as e:
+                     logging.error(f"Unhandled exception during scraping {url}: {e}", exc_info=True)
+                     # Driver lỗi được pool thay thế ở luồng nền, worker không phải chờ Chrome khởi động lại
+                     driver_pool.release(pooled, broken=True)
+                     failure = str(e)
+
+        if merger is not None:
+            # Trạng thái frontier được cập nhật khi khoảng trang cuối cùng xong (khoảng lỗi được thử lại trước)
+            if failure is None:
+                merger.range_done()
+            else:
+                merger.range_failed(first_range[0], first_range[1], failure)
+        elif failure is None:
+            # Mốc mới chỉ đáng tin khi đã đi từ trang 1 (review mới nhất) tới hết phần mới
+            new_mark = cutoff.next_mark() if cutoff is not None and leased_page == 1 else None
+
+            def finish_url(url: str = url, new_mark=new_mark):
+                # Chỉ đánh dấu xong (và lưu mốc) khi mọi trang của URL đã nằm trên đĩa
+                frontier.mark_done(url)
+                if new_mark is not None:
+                    marks.put(url, new_mark)
+
+            result_writer.when_durable(finish_url)
+        else:
+            frontier.mark_failed(url, failure)
+        controller.release(timed_out=failure is not None)
+        METRICS.observe("url_total", time.monotonic() - url_started)
+        METRICS.count("urls", outcome="ok" if failure is None else "failed")
 
-        logging.info(f"Starting scrape for: {url} (Type: {detail_type})")
-        scraped_data = [] 
-        try:
-             scraped_data = navigate_and_scrape_reviews(driver, url, detail_type)
-        except Exception as e:
-             logging.error(f"Unhandled exception during scraping {url}: {e}", exc_info=True)
-             # Đảm bảo driver được đóng ngay cả khi có lỗi nghiêm trọng trong scrape
-             try:
-                 driver.quit()
-             except: pass
-             driver = setup_driver() # Thử khởi động lại driver cho task tiếp theo
-             if driver is None:
-                 logging.critical("Failed to restart driver after error. Worker exiting.")
-                 url_queue.task_done() # Đánh dấu task lỗi là hoàn thành để queue không bị treo
-                 # Có thể xem xét đưa task lỗi trở lại queue hoặc bỏ qua
-                 break # Thoát worker nếu không restart được driver
-
-
-        # --- Append results safely ---
-        if scraped_data:
-            with results_lock: # Sử dụng lock để đảm bảo chỉ một luồng ghi vào list tại một thời điểm
-                results_list.extend(scraped_data)
-                logging.debug(f"Added {len(scraped_data)} results from {url}. Total results: {len(results_list)}")
-
-        url_queue.task_done() # Báo cho queue biết task này đã hoàn thành
-        time.sleep(1) # Delay nhỏ giữa các URL trong cùng một luồng
+        clear_log_context("url", "page")
+        scheduler.task_done() # Báo cho scheduler biết task này đã hoàn thành
+        if not fetched_over_http:
+            with METRICS.phase("sleep"):
+                time.sleep(1) # Delay nhỏ giữa các URL trong cùng một luồng
 
     # --- Cleanup for the thread ---
-    if driver:
-        try:
-            driver.quit()
-            logging.debug("WebDriver closed for thread.")
-        except Exception as e:
-            logging.error(f"Error closing WebDriver in thread: {e}")
+    if http_fetcher is not None:
+        http_fetcher.close()
 
 # --- Main Processing Logic ---
-def process_urls_and_save_multithreaded(url_file: str = URL_FILE, output_file: str = OUTPUT_FILE):
-    """Reads URLs, distributes them to worker threads, and saves final results."""
+def process_urls_and_save_multithreaded(url_file: str = URL_FILE, output_file: str = OUTPUT_FILE,
+                                        engine: str = FETCH_ENGINE, api_base_url: str = API_BASE_URL,
+                                        lean: bool = LEAN_MODE, frontier_file: str = FRONTIER_FILE,
+                                        fresh: bool = False, resolve_trackers: bool = RESOLVE_TRACKING_URLS,
+                                        capture_snapshots: bool = CAPTURE_SNAPSHOTS, snapshot_dir: str = SNAPSHOT_DIR,
+                                        parser_backend: str = PARSER_BACKEND, incremental: bool = INCREMENTAL,
+                                        marks_file: str = HIGH_WATER_MARKS_FILE, output_format: str = OUTPUT_FORMAT):
+    """Reads URLs, distributes them to worker threads, and saves final results.
+
+    Progress is checkpointed in `frontier_file`; a later run skips finished URLs and resumes
+    half-done ones, unless `fresh` is set. `capture_snapshots` archives every Selenium-scraped
+    review page's HTML in `snapshot_dir`. `incremental` fetches only reviews newer than the marks
+    kept in `marks_file` from the previous run. With `output_format="parquet"` the results go to a
+    `type`-partitioned Parquet dataset next to `output_file` instead of the CSV.
+    """
+    if engine not in FETCH_ENGINES:
+        logging.error(f"Unknown fetch engine '{engine}'. Expected one of {FETCH_ENGINES}.")
+        return
+    if incremental and engine == ENGINE_ASYNC:
+        # asyncio lấy mọi trang cùng lúc nên không dừng sớm được; http đi tuần tự từ trang mới nhất
+        logging.info("Incremental mode fetches pages in order; using the 'http' engine instead of 'async'.")
+        engine = ENGINE_HTTP
+    if parser_backend != PARSER_JS and parser_backend not in available_parser_backends():
+        logging.error(f"Parser backend '{parser_backend}' is not available. "
+                      f"Expected '{PARSER_JS}' or one of {available_parser_backends()}.")
+        return
+    if output_format not in OUTPUT_FORMATS:
+        logging.error(f"Unknown output format '{output_format}'. Expected one of {OUTPUT_FORMATS}.")
+        return
+    if output_format == FORMAT_PARQUET:
+        try:
+            require_pyarrow()
+        except ImportError as e:
+            logging.error(str(e))
+            return
+        output_file = parquet_dir_for(output_file) # Từ đây output_file là thư mục dataset
+    METRICS.reset()
+
     if not os.path.exists(url_file):
         logging.error(f"Error: Input file '{url_file}' not found.")
         return
@@ -289,13 +576,15 @@ def process_urls_and_save_multithreaded(url_file: str = URL_FILE, output_file: s
         logging.error(f"Error reading '{url_file}': {e}", exc_info=True)
         return
 
-    # --- Populate the queue ---
-    tasks_added = 0
+    # --- Populate the frontier and the queue ---
+    csv_tasks = []
+    cost_hints: Dict[Tuple[str, Optional[str]], float] = {} # (product id, spid) -> số review ước tính
+    has_cost_column = REVIEW_COUNT_COLUMN_NAME in urls_df.columns
     for index, row in urls_df.iterrows():
         url = row[URL_COLUMN_NAME]
         detail_value = row[DETAIL_COLUMN_NAME] 
         
-        if not url or not isinstance(url, str) or not url.lower().startswith(('http://', 'https://')):
+        if not url or not isinstance(url, str):
             logging.warning(f"Row {index}: Skipping invalid URL in input file: '{url}'")
             continue
         if pd.isna(detail_value):
@@ -304,62 +593,224 @@ def process_urls_and_save_multithreaded(url_file: str = URL_FILE, output_file: s
         else:
            detail_value = str(detail_value) 
 
-        url_queue.put((url, detail_value)) # Đưa tuple (url, detail) vào queue
-        tasks_added += 1
-        
-    logging.info(f"Added {tasks_added} tasks to the queue.")
+        csv_tasks.append((url, detail_value))
+        if has_cost_column and not pd.isna(row[REVIEW_COUNT_COLUMN_NAME]):
+            key = product_key(repair_scheme(url))
+            if key is not None:
+                cost_hints[key] = float(row[REVIEW_COUNT_COLUMN_NAME])
+
+    # --- Chuẩn hoá URL: sửa scheme, giải URL tracking, loại sản phẩm trùng trước khi vào queue ---
+    resolver = TrackingResolver() if resolve_trackers else None
+    csv_tasks, canonicalization = canonicalize_tasks(csv_tasks, resolver=resolver,
+                                                     extra_hosts=[urlparse(api_base_url).netloc])
+    if resolver is not None:
+        resolver.close()
+    canonicalization.log()
+
+    frontier = CrawlFrontier(frontier_file)
+    if fresh:
+        frontier.reset()
+    resuming = frontier.has_progress() # Lần chạy trước bị dừng giữa chừng
+    frontier.add_tasks(csv_tasks)
+    if incremental and resuming and not frontier.resumable_tasks():
+        # Lượt trước đã xong hết: bắt đầu một lượt tăng dần mới thay vì bỏ qua mọi URL
+        logging.info("Previous pass finished; starting a new incremental pass.")
+        frontier.reset()
+        frontier.add_tasks(csv_tasks)
+        resuming = False
+
+    pending_tasks = frontier.resumable_tasks() # URL đã xong ở lần chạy trước được bỏ qua
+    tasks_added = len(pending_tasks)
+    task_cost = lambda task: cost_hints.get(product_key(task[0]), DEFAULT_TASK_COST)
+
+    logging.info(f"Added {tasks_added} tasks to the queue ({len(csv_tasks)} valid URLs in input file).")
+    if resuming:
+        logging.info(f"Resuming crawl from frontier '{frontier_file}': {frontier.summary()}")
     if tasks_added == 0:
-        logging.warning("No valid tasks found in the input file.")
+        logging.warning("No pending tasks found (input file empty or everything already crawled).")
+        frontier.close()
         return
 
+    # --- Tập review đã thấy, lưu bền cạnh file output để khử trùng lặp giữa các lần chạy ---
+    deduplicator = ReviewDeduplicator(seen_set_path_for(output_file))
+    if output_format == FORMAT_PARQUET:
+        # File .tmp còn sót = lần trước crash khi file chưa đóng. Frontier và seen-set chỉ
+        # checkpoint sau khi file được đổi tên, nên các trang trong đó sẽ được crawl lại
+        stale_parts = remove_stale_parts(output_file) if os.path.isdir(output_file) else 0
+        if stale_parts:
+            logging.warning(f"Removed {stale_parts} unfinished Parquet parts; their pages will be scraped again.")
+        output_exists = bool(dataset_files(output_file))
+    else:
+        output_exists = os.path.exists(output_file) and os.path.getsize(output_file) > 0
+    if fresh or not output_exists:
+        deduplicator.reset()
+    elif len(deduplicator) == 0:
+        # Output có từ trước khi có seen-set: nạp các review trong đó làm "đã thấy"
+        if output_format == FORMAT_PARQUET:
+            seeded = deduplicator.seed_from_rows(iter_dataset_rows(output_file, columns=OUTPUT_COLUMNS))
+        else:
+            seeded = deduplicator.seed_from_csv(output_file)
+        logging.info(f"Seeded seen-set with {seeded} rows from existing '{output_file}'.")
+
+    # --- Luồng writer ghi kết quả dần xuống file trong suốt quá trình crawl ---
+    # Output tích luỹ qua các lần chạy (trừ --fresh); seen-set đảm bảo không ghi lại review đã có
+    writer_class = ColumnarResultWriter if output_format == FORMAT_PARQUET else StreamingResultWriter
+    result_writer = writer_class(output_file, OUTPUT_COLUMNS, append=output_exists and not fresh,
+                                 deduplicator=deduplicator)
+    result_writer.start()
+    # Chỉ đường Selenium có HTML để lưu; engine http/async nhận JSON từ API
+    snapshots = SnapshotArchive(snapshot_dir) if capture_snapshots else None
+    marks = HighWaterMarkStore(marks_file) if incremental else None
+    if marks is not None:
+        if fresh:
+            marks.reset()
+        logging.info(f"Incremental crawl: {len(marks)} products have a high-water mark from earlier runs.")
+
+    # --- Async mode: xử lý cả queue bằng asyncio, chỉ URL lỗi mới cần tới Chrome ---
+    if engine == ENGINE_ASYNC:
+        def on_async_done(url: str, review_count: int):
+            METRICS.count("reviews", review_count, worker="async")
+            METRICS.count("urls", worker="async", outcome="ok")
+
+            def finish_url():
+                frontier.record_page(url, 0, review_count)
+                frontier.mark_done(url)
+
+            result_writer.when_durable(finish_url) # Sau các review của URL vừa được submit
+
+        def on_async_partial(url: str, saved_through: int, review_count: int):
+            # Các trang trước chỗ hổng đã được giao: fallback Selenium tiếp tục từ trang lỗi
+            METRICS.count("reviews", review_count, worker="async")
+            result_writer.when_durable(lambda: frontier.record_page(url, saved_through, review_count))
+
+        pending_tasks.sort(key=task_cost, reverse=True)
+        _, failed_tasks = run_async_crawl(pending_tasks, base_url=api_base_url, sink=result_writer.submit,
+                                          start_page_for=frontier.resume_page, on_done=on_async_done,
+                                          on_partial=on_async_partial)
+        logging.info(f"Async crawl finished; {len(failed_tasks)} URLs need Selenium fallback.")
+        if failed_tasks:
+            # Chờ checkpoint của các URL làm dở được ghi trước khi fallback đọc trang bắt đầu từ frontier
+            checkpoints_saved = threading.Event()
+            result_writer.when_durable(checkpoints_saved.set)
+            while not checkpoints_saved.wait(1.0) and result_writer.is_alive():
+                pass
+        pending_tasks = failed_tasks
+        engine = ENGINE_SELENIUM
+
     # --- Create and start worker threads ---
-    threads = []
-    logging.info(f"Starting {MAX_WORKERS} worker threads...")
-    for _ in range(MAX_WORKERS):
-        thread = threading.Thread(target=worker, daemon=True) # daemon=True để luồng tự thoát nếu main thread thoát
-        thread.start()
-        threads.append(thread)
-
-    # --- Wait for all tasks in the queue to be processed ---
-    url_queue.join() # Chờ cho đến khi tất cả item trong queue được lấy ra và task_done() được gọi
-    logging.info("All tasks processed by workers.")
-
-    # --- Wait for worker threads to finish (optional but good practice) ---
-    # Mặc dù queue.join() đã đảm bảo task xong, chờ thread kết thúc để chắc chắn driver được quit
-    for thread in threads:
-         thread.join(timeout=60) # Chờ tối đa 60s cho mỗi luồng kết thúc
-         if thread.is_alive():
-              logging.warning(f"Thread {thread.name} did not finish cleanly.")
-
-    logging.info("All worker threads have completed.")
+    if pending_tasks:
+        # Sản phẩm lớn nhất (theo số review ước tính) được xử lý trước để rút ngắn phần đuôi
+        scheduler = WorkStealingScheduler(MAX_WORKERS)
+        scheduler.submit_all((task, task_cost(task)) for task in pending_tasks)
+        if cost_hints:
+            logging.info(f"Ordered {len(pending_tasks)} tasks by estimated review count ({len(cost_hints)} hints).")
+
+        # Engine http chỉ cần Chrome cho fallback nên pool chỉ giữ driver dự phòng
+        pool_size = MAX_WORKERS if engine == ENGINE_SELENIUM else 0
+        warm_drivers = INITIAL_WORKERS if engine == ENGINE_SELENIUM else 0
+        profile_manager = ProfileManager(CHROME_PROFILE_TEMPLATE_DIR)
+        driver_pool = DriverPool(lambda: setup_isolated_driver(profile_manager, lean=lean), size=pool_size,
+                                 spare=POOL_SPARE_DRIVERS,
+                                 disposer=lambda driver: quit_isolated_driver(profile_manager, driver))
+        driver_pool.start(warm=warm_drivers)
+        if not driver_pool.is_usable():
+            logging.error("Could not launch any WebDriver for the pool.")
+
+        # Khi giảm số worker, tắt bớt Chrome đang rảnh để trả RAM cho máy
+        on_change = (lambda limit: driver_pool.trim(limit + POOL_SPARE_DRIVERS)) if engine == ENGINE_SELENIUM else None
+        controller = ConcurrencyController(MIN_WORKERS, MAX_WORKERS, initial=INITIAL_WORKERS, on_change=on_change)
+        controller.start()
+
+        threads = []
+        logging.info(f"Starting {MAX_WORKERS} worker threads, {INITIAL_WORKERS} active at first (engine: {engine})...")
+        for worker_id in range(MAX_WORKERS):
+            thread = threading.Thread(target=worker, args=(worker_id, scheduler, driver_pool, result_writer, frontier, controller, engine, api_base_url, snapshots, parser_backend, marks), daemon=True) # daemon=True để luồng tự thoát nếu main thread thoát
+            thread.start()
+            threads.append(thread)
+
+        # --- Wait for all tasks in the queue to be processed ---
+        scheduler.join() # Chờ cho đến khi mọi task (kể cả task khoảng trang sinh thêm) gọi task_done()
+        logging.info(f"All tasks processed by workers ({scheduler.steals} tasks stolen between workers).")
+        controller.stop()
+        logging.info(f"Concurrency stats: {controller.stats()}")
+
+        # --- Wait for worker threads to finish (optional but good practice) ---
+        # Mỗi worker đã nhận sentinel và thoát vòng lặp; chờ thread kết thúc để chắc chắn driver được quit
+        for thread in threads:
+             thread.join(timeout=60) # Chờ tối đa 60s cho mỗi luồng kết thúc
+             if thread.is_alive():
+                  logging.warning(f"Thread {thread.name} did not finish cleanly.")
+
+        logging.info("All worker threads have completed.")
+        driver_pool.close()
+        profile_manager.cleanup_all()
 
     # --- Final Save ---
-    # Lưu ý: Không còn lưu trung gian trong phiên bản đa luồng này
-    logging.info("Saving final results...")
-    if results_list:
-        try:
-             # results_list giờ đã chứa tất cả dữ liệu từ các luồng
-             final_df = pd.DataFrame(results_list, columns=OUTPUT_COLUMNS) 
-             final_df.drop_duplicates(subset=['title', 'content', 'type'], inplace=True) 
-             final_df.to_csv(output_file, index=False, encoding='utf-8-sig')
-             logging.info(f"\n===== SCRAPING FINISHED (Multithreaded) =====")
-             logging.info(f"Extracted {len(final_df)} unique reviews.")
-             logging.info(f"Final data saved to '{output_file}'")
-        except Exception as e:
-            logging.error(f"Error saving final results to '{output_file}': {e}", exc_info=True)
+    # Kết quả đã được ghi dần; chỉ cần đợi writer ghi nốt phần còn lại và fsync
+    logging.info("Flushing remaining results...")
+    rows_written = result_writer.close()
+    logging.info(f"\n===== SCRAPING FINISHED (Multithreaded) =====")
+    if result_writer.error is not None:
+        logging.error(f"Results could not be fully saved to '{output_file}'.")
+    elif rows_written:
+        logging.info(f"Extracted {rows_written} new unique reviews ({result_writer.duplicates_dropped} duplicates dropped, "
+                     f"{len(deduplicator)} unique reviews seen across runs).")
+        logging.info(f"Final data saved to '{output_file}'")
     else:
-        logging.info("\n===== SCRAPING FINISHED (Multithreaded) =====")
         logging.warning("No reviews were collected by any thread.")
-        # Tạo file rỗng nếu chưa có
-        if not os.path.exists(output_file):
-            try:
-                 empty_df = pd.DataFrame(columns=OUTPUT_COLUMNS) 
-                 empty_df.to_csv(output_file, index=False, encoding='utf-8-sig')
-                 logging.info(f"Output file '{output_file}' created with headers.")
-            except Exception as e:
-                 logging.error(f"Could not write empty header to {output_file}: {e}")
+        if output_format == FORMAT_CSV:
+            logging.info(f"Output file '{output_file}' created with headers.")
+    deduplicator.close()
+    if snapshots is not None:
+        logging.info(f"Snapshot archive '{snapshot_dir}': {snapshots.stats()}")
+        snapshots.close()
+    if marks is not None:
+        logging.info(f"High-water marks stored for {len(marks)} products in '{marks_file}'.")
+        marks.close()
+    logging.info(f"Frontier state: {frontier.summary()}")
+    frontier.close()
+
+    # --- Số liệu theo giai đoạn ---
+    try:
+        summary = METRICS.export(METRICS_PROM_FILE, METRICS_JSON_FILE)
+        logging.info(f"Throughput: {summary['reviews_per_second']} reviews/s, "
+                     f"{summary['webdriver_commands_per_review']} WebDriver commands/review.")
+        for phase, stats in summary["phases"].items():
+            logging.info(f"  {phase}: {stats['total_seconds']}s total over {stats['count']} calls "
+                         f"(p50 {stats['p50']}s, p95 {stats['p95']}s)")
+        logging.info(f"Metrics written to '{METRICS_PROM_FILE}' and '{METRICS_JSON_FILE}'.")
+    except OSError as e:
+        logging.error(f"Could not write metrics: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multithreaded Tiki review scraper.")
+    parser.add_argument("--engine", choices=FETCH_ENGINES, default=FETCH_ENGINE,
+                        help="'http' fetches reviews through the JSON API and falls back to Selenium per URL; "
+                             "'async' crawls the whole URL file concurrently with asyncio.")
+    parser.add_argument("--api-base-url", default=API_BASE_URL,
+                        help="Base URL of the reviews API (point it at a local stand-in server for tests).")
+    parser.add_argument("--lean", action="store_true", default=LEAN_MODE,
+                        help="Block images, fonts, media and third-party hosts and use eager page loads.")
+    parser.add_argument("--no-resolve-trackers", dest="resolve_trackers", action="store_false",
+                        default=RESOLVE_TRACKING_URLS,
+                        help="Drop tracking URLs instead of resolving their redirects over HTTP.")
+    parser.add_argument("--json-logs", action="store_true",
+                        help=f"Also write JSON-lines logs (url, page, worker, elapsed) to '{LOG_JSON_FILE}'.")
+    parser.add_argument("--capture-snapshots", action="store_true", default=CAPTURE_SNAPSHOTS,
+                        help=f"Archive each review page's HTML in '{SNAPSHOT_DIR}' for offline re-extraction.")
+    parser.add_argument("--parser", choices=PARSER_CHOICES, default=PARSER_BACKEND,
+                        help="How Selenium pages are parsed: 'js' in the browser, or the widget HTML in-process "
+                             "with lxml, selectolax or html.parser.")
+    parser.add_argument("--incremental", action="store_true", default=INCREMENTAL,
+                        help="Only fetch reviews newer than the previous run (newest first, stop at the first known review).")
+    parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                        help="'parquet' writes a type-partitioned, zstd-compressed Parquet dataset "
+                             f"('{parquet_dir_for(OUTPUT_FILE)}') instead of the CSV; needs pyarrow.")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore the saved crawl frontier and seen-set and start over instead of resuming.")
+    args = parser.parse_args()
+    configure_logging(LOG_FILE, json_log_file=LOG_JSON_FILE if args.json_logs else None)
+
     # Hiển thị thông tin về đường dẫn file
     logging.info(f"Data directory: {DATA_DIR}")
     logging.info(f"Logs directory: {LOGS_DIR}")
@@ -368,6 +819,9 @@ if __name__ == "__main__":
     logging.info(f"Log file: {LOG_FILE}")
     
     start_time = time.time()
-    process_urls_and_save_multithreaded()
+    process_urls_and_save_multithreaded(engine=args.engine, api_base_url=args.api_base_url, lean=args.lean,
+                                        fresh=args.fresh, resolve_trackers=args.resolve_trackers,
+                                        capture_snapshots=args.capture_snapshots, parser_backend=args.parser,
+                                        incremental=args.incremental, output_format=args.output_format)
     end_time = time.time()
     logging.info(f"Total execution time: {end_time - start_time:.2f} seconds")
\ No newline at end of file
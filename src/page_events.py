@@ -0,0 +1,161 @@
+# page_events.py
+"""
+Mở rộng "Xem thêm" và chuyển trang review không dùng `time.sleep`.
+
+Mỗi thao tác là một `execute_async_script`: script tự click rồi dùng
+MutationObserver để báo về ngay khi danh sách review thay đổi, hoặc khi hết
+thời gian chờ tối đa (có thể cấu hình). Không còn chờ cố định giữa các bước.
+"""
+import logging
+from typing import Any, Dict
+
+from tiki_selectors import (
+    REVIEWS_SECTION_ID,
+    REVIEW_CONTAINER_CSS,
+    REVIEW_CONTENT_CSS,
+    SHOW_MORE_CONTENT_CSS,
+    NEXT_PAGE_BUTTON_CSS,
+    REVIEW_SORT_OPTION_CSS,
+    REVIEW_SORT_NEWEST_LABEL,
+)
+
+# --- Constants ---
+MAX_EXPAND_WAIT = 3  # Giây tối đa chờ nội dung review mở rộng sau khi click "Xem thêm"
+MAX_PAGE_TRANSITION_WAIT = 10  # Giây tối đa chờ danh sách review đổi sang trang mới
+SCRIPT_TIMEOUT_MARGIN = 5  # Script timeout của driver phải lớn hơn thời gian chờ trong JS
+
+# Hàm dùng chung trong các script: "chữ ký" của danh sách review hiện tại
+_SIGNATURE_JS = """
+const signatureOf = (containerCss) => {
+    const items = document.querySelectorAll(containerCss);
+    if (!items.length) return "";
+    const first = (items[0].textContent || "").slice(0, 200);
+    const last = (items[items.length - 1].textContent || "").slice(0, 200);
+    return items.length + "|" + first + "|" + last;
+};
+"""
+
+# arguments: [content_css, show_more_css, timeout_ms, callback]
+EXPAND_SHOW_MORE_JS = """
+const [contentCss, showMoreCss, timeoutMs, done] = arguments;
+const selector = `${contentCss} ${showMoreCss}`;
+const buttons = Array.from(document.querySelectorAll(selector)).filter((b) => b.offsetParent !== null);
+if (!buttons.length) { done({clicked: 0, settled: true}); return; }
+const labels = buttons.map((b) => b.textContent);
+buttons.forEach((b) => { try { b.click(); } catch (e) {} });
+// Nút đã mở rộng xong khi bị gỡ khỏi DOM hoặc đổi nhãn (ví dụ "Xem thêm" -> "Thu gọn")
+const remaining = () => buttons.filter((b, i) => b.isConnected && b.textContent === labels[i]).length;
+if (remaining() === 0) { done({clicked: buttons.length, settled: true}); return; }
+let finished = false;
+const finish = (settled) => {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    done({clicked: buttons.length, settled: settled});
+};
+const observer = new MutationObserver(() => { if (remaining() === 0) finish(true); });
+observer.observe(document.body, {childList: true, subtree: true, characterData: true, attributes: true});
+const timer = setTimeout(() => finish(false), timeoutMs);
+"""
+
+# Hàm dùng chung: click `target` rồi báo về khi danh sách review trong `section` đổi
+_CLICK_AND_WAIT_JS = """
+const clickAndWait = (section, containerCss, target, timeoutMs, done) => {
+    const before = signatureOf(containerCss);
+    let finished = false;
+    const finish = (changed) => {
+        if (finished) return;
+        finished = true;
+        observer.disconnect();
+        clearTimeout(timer);
+        done({clicked: true, changed: changed});
+    };
+    const check = () => {
+        const now = signatureOf(containerCss);
+        if (now && now !== before) finish(true);
+    };
+    const observer = new MutationObserver(check);
+    observer.observe(section, {childList: true, subtree: true, characterData: true});
+    const timer = setTimeout(() => finish(false), timeoutMs);
+    target.scrollIntoView({block: "center", inline: "nearest"});
+    target.click();
+    check();
+};
+"""
+
+# arguments: [section_id, container_css, next_css, timeout_ms, callback]
+CLICK_NEXT_AND_WAIT_JS = _SIGNATURE_JS + _CLICK_AND_WAIT_JS + """
+const [sectionId, containerCss, nextCss, timeoutMs, done] = arguments;
+const section = document.getElementById(sectionId) || document.body;
+const next = section.querySelector(nextCss) || document.querySelector(nextCss);
+if (!next) { done({clicked: false, changed: false}); return; }
+clickAndWait(section, containerCss, next, timeoutMs, done);
+"""
+
+# arguments: [section_id, container_css, option_css, label, timeout_ms, callback]
+SELECT_OPTION_AND_WAIT_JS = _SIGNATURE_JS + _CLICK_AND_WAIT_JS + """
+const [sectionId, containerCss, optionCss, label, timeoutMs, done] = arguments;
+const section = document.getElementById(sectionId) || document.body;
+const option = Array.from(section.querySelectorAll(optionCss))
+    .find((el) => (el.textContent || "").trim() === label);
+if (!option) { done({clicked: false, changed: false}); return; }
+clickAndWait(section, containerCss, option, timeoutMs, done);
+"""
+
+
+def _ensure_script_timeout(driver: Any, wait_seconds: float):
+    """Raises the driver's async script timeout once so it never cuts our bounded waits short."""
+    needed = wait_seconds + SCRIPT_TIMEOUT_MARGIN
+    if getattr(driver, "page_events_script_timeout", 0) < needed:
+        driver.set_script_timeout(needed)
+        driver.page_events_script_timeout = needed
+
+
+def expand_all_show_more(driver: Any, content_css: str = REVIEW_CONTENT_CSS,
+                         show_more_css: str = SHOW_MORE_CONTENT_CSS, max_wait: float = MAX_EXPAND_WAIT) -> int:
+    """Clicks every visible 'Xem thêm' button in one script and waits until the contents expand."""
+    try:
+        _ensure_script_timeout(driver, max_wait)
+        result: Dict[str, Any] = driver.execute_async_script(
+            EXPAND_SHOW_MORE_JS, content_css, show_more_css, int(max_wait * 1000)) or {}
+    except Exception as e:
+        logging.warning(f"Expand 'Xem thêm' error: {e}")
+        return 0
+    clicked = int(result.get("clicked") or 0)
+    if clicked and not result.get("settled"):
+        logging.debug(f"'Xem thêm' expansion did not settle within {max_wait}s ({clicked} buttons clicked).")
+    elif clicked:
+        logging.debug(f"Expanded {clicked} 'Xem thêm' buttons.")
+    return clicked
+
+
+def click_next_and_wait(driver: Any, section_id: str = REVIEWS_SECTION_ID,
+                        container_css: str = REVIEW_CONTAINER_CSS, next_css: str = NEXT_PAGE_BUTTON_CSS,
+                        max_wait: float = MAX_PAGE_TRANSITION_WAIT) -> Dict[str, bool]:
+    """Clicks the next-page button and returns as soon as the review list changes.
+
+    Returns {"clicked": bool, "changed": bool}; clicked=False means there is no next page.
+    """
+    _ensure_script_timeout(driver, max_wait)
+    result = driver.execute_async_script(
+        CLICK_NEXT_AND_WAIT_JS, section_id, container_css, next_css, int(max_wait * 1000)) or {}
+    return {"clicked": bool(result.get("clicked")), "changed": bool(result.get("changed"))}
+
+
+def sort_reviews_newest_first(driver: Any, section_id: str = REVIEWS_SECTION_ID,
+                              container_css: str = REVIEW_CONTAINER_CSS, option_css: str = REVIEW_SORT_OPTION_CSS,
+                              label: str = REVIEW_SORT_NEWEST_LABEL,
+                              max_wait: float = MAX_PAGE_TRANSITION_WAIT) -> bool:
+    """Clicks the 'Mới nhất' option and waits for the list to re-render; False if there is no such option."""
+    try:
+        _ensure_script_timeout(driver, max_wait)
+        result = driver.execute_async_script(
+            SELECT_OPTION_AND_WAIT_JS, section_id, container_css, option_css, label, int(max_wait * 1000)) or {}
+    except Exception as e:
+        logging.warning(f"Sort reviews by '{label}' error: {e}")
+        return False
+    if result.get("clicked") and not result.get("changed"):
+        # Danh sách không đổi: đã được sắp sẵn, hoặc thứ tự mới nhất trùng thứ tự mặc định
+        logging.debug(f"Review list unchanged after selecting '{label}'.")
+    return bool(result.get("clicked"))
@@ -0,0 +1,116 @@
+# page_tasks.py
+"""
+Chia các sản phẩm nhiều trang review thành các task theo khoảng trang.
+
+Với engine HTTP, mỗi trang review được truy cập trực tiếp qua tham số `page` của
+API, nên một sản phẩm bán chạy (hàng trăm trang) được tách thành nhiều
+`PageRangeTask` mà worker nào cũng nhận được. `PageMerger` gom kết quả các khoảng
+trang và trả ra theo đúng thứ tự trang, nên checkpoint của frontier vẫn là "mọi
+trang tới N đã xong".
+
+Khoảng trang lỗi được đưa lại vào hàng đợi (chỉ các trang còn thiếu) tối đa
+`PAGE_RANGE_MAX_ATTEMPTS` lần. Nếu vẫn lỗi, các trang liền mạch trước chỗ hổng vẫn
+được giữ và sản phẩm được báo là làm dở (partial) để lần chạy sau tiếp tục từ đó.
+"""
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from review_records import ReviewRecord
+
+# --- Constants ---
+PAGE_SPLIT_THRESHOLD = 10  # Chỉ tách sản phẩm có từ số trang này trở lên
+PAGES_PER_TASK = 5  # Số trang trong mỗi task khoảng trang
+PAGE_RANGE_MAX_ATTEMPTS = 3  # Số lần thử một khoảng trang (kể cả lần đầu) trước khi bỏ
+
+PageRows = List[ReviewRecord]
+
+
+def split_page_range(first_page: int, last_page: int, pages_per_task: int = PAGES_PER_TASK) -> List[Tuple[int, int]]:
+    """Splits [first_page, last_page] into consecutive inclusive ranges of at most `pages_per_task` pages."""
+    step = max(1, pages_per_task)
+    return [(start, min(start + step - 1, last_page)) for start in range(first_page, last_page + 1, step)]
+
+
+class PageMerger:
+    """Reassembles one product's pages, fetched out of order by several workers, in page order."""
+
+    def __init__(self, url: str, first_page: int, range_count: int,
+                 on_emit: Callable[[int, PageRows], None],
+                 on_finish: Callable[[Optional[str], int], None],
+                 requeue: Optional[Callable[[int, int, int], None]] = None,
+                 max_attempts: int = PAGE_RANGE_MAX_ATTEMPTS):
+        self.url = url
+        self.first_page = first_page
+        self.next_page = first_page
+        self.on_emit = on_emit # Nhận (trang, các dòng) theo đúng thứ tự trang
+        self.on_finish = on_finish # Nhận (None hoặc thông báo lỗi, trang cuối đã trả ra liền mạch)
+        self.requeue = requeue # Nhận (trang đầu, trang cuối, lần thử) của khoảng trang cần chạy lại
+        self.max_attempts = max_attempts
+        self._remaining_ranges = range_count
+        self._pending: Dict[int, PageRows] = {}
+        self._error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def add(self, page: int, rows: PageRows):
+        """Accepts one fetched page and emits every page that is now in order."""
+        with self._lock:
+            self._pending[page] = rows
+            while self.next_page in self._pending:
+                self.on_emit(self.next_page, self._pending.pop(self.next_page))
+                self.next_page += 1
+
+    def range_failed(self, first_page: int, last_page: int, error: str, attempt: int = 1) -> bool:
+        """Handles a failed range: requeues its missing pages while attempts remain, else gives it up.
+
+        Returns True when the range was requeued (it is not finished yet).
+        """
+        with self._lock:
+            missing = next((page for page in range(max(first_page, self.next_page), last_page + 1)
+                            if page not in self._pending), None)
+        if missing is None:
+            # Lỗi xảy ra sau trang cuối của khoảng: mọi trang đều đã có
+            self.range_done()
+            return False
+        if self.requeue is not None and attempt < self.max_attempts:
+            self.requeue(missing, last_page, attempt + 1)
+            return True
+        self.range_done(f"pages {missing}-{last_page} failed after {attempt} attempts: {error}")
+        return False
+
+    def range_done(self, error: Optional[str] = None):
+        """Marks one range finished; the last one flushes what is left and reports the outcome."""
+        with self._lock:
+            if error is not None and self._error is None:
+                self._error = error
+            self._remaining_ranges -= 1
+            if self._remaining_ranges > 0:
+                return
+            if self._error is None:
+                # Khoảng trang có thể kết thúc sớm (API báo thừa trang): trả nốt các trang còn lại theo thứ tự
+                for page in sorted(self._pending):
+                    self.on_emit(page, self._pending[page])
+                    self.next_page = page + 1
+            # Khi có lỗi, các trang sau chỗ hổng bị bỏ để checkpoint không nhảy qua trang thiếu;
+            # lần chạy sau sẽ tiếp tục từ trang đầu tiên còn thiếu
+            self._pending.clear()
+            error = self._error
+            saved_through = self.next_page - 1
+        self.on_finish(error, saved_through)
+
+
+class PageRangeTask:
+    """A slice of one product's review pages that any worker can take."""
+
+    __slots__ = ("url", "detail_type", "first_page", "last_page", "merger", "attempt")
+
+    def __init__(self, url: str, detail_type: str, first_page: int, last_page: int, merger: PageMerger,
+                 attempt: int = 1):
+        self.url = url
+        self.detail_type = detail_type
+        self.first_page = first_page
+        self.last_page = last_page
+        self.merger = merger
+        self.attempt = attempt # Lần thử thứ mấy của khoảng trang này
+
+    def __repr__(self) -> str:
+        return f"PageRangeTask({self.url!r}, pages {self.first_page}-{self.last_page}, attempt {self.attempt})"
@@ -0,0 +1,195 @@
+# profile_manager.py
+"""
+Quản lý profile Chrome riêng cho từng driver.
+
+Chrome khóa thư mục `--user-data-dir`, nên nhiều driver dùng chung một profile sẽ
+tranh chấp khóa. Ở đây giữ một profile mẫu (cookies, trạng thái đồng ý...) và tạo
+cho mỗi driver một bản sao riêng, rẻ nhất có thể:
+- Đặt trong tmpfs (`/dev/shm`) nếu có và đủ chỗ.
+- Dùng reflink (copy-on-write) khi filesystem hỗ trợ, nếu không thì copy thường.
+- Bỏ qua cache và file khóa của profile mẫu (chiếm phần lớn dung lượng nhưng không cần).
+- tmpfs đầy thì chuyển sang thư mục tạm trên đĩa; vẫn không sao chép được thì báo
+  lỗi (`ProfileCloneError`) chứ không bao giờ cho driver dùng chung profile mẫu.
+Các bản sao được xóa khi driver thoát, khi chương trình kết thúc, và bản sao cũ
+của các lần chạy bị crash được dọn khi khởi tạo.
+"""
+import atexit
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional, Set
+
+try:
+    import fcntl  # Chỉ có trên POSIX, dùng cho reflink
+except ImportError:
+    fcntl = None
+
+# --- Constants ---
+PROFILE_COPY_PREFIX = "tiki_chrome_profile_"
+TMPFS_CANDIDATES = ("/dev/shm",)
+TMPFS_HEADROOM = 4  # Chỉ dùng tmpfs khi còn trống >= 4 lần kích thước profile mẫu
+STALE_PROFILE_SECONDS = 12 * 60 * 60  # Dùng khi không kiểm tra được PID (Windows)
+CLONE_ATTEMPTS = 2  # Số lần thử sao chép profile trước khi báo lỗi
+FICLONE = 0x40049409  # ioctl reflink của Linux (btrfs, xfs, ...)
+
+# Thư mục/file không cần sao chép: cache lớn và khóa singleton của Chrome
+IGNORED_PROFILE_ENTRIES = {
+    "Cache", "Code Cache", "GPUCache", "GrShaderCache", "ShaderCache", "GraphiteDawnCache",
+    "DawnGraphiteCache", "DawnWebGPUCache", "CacheStorage", "ScriptCache", "Crashpad",
+    "SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile",
+}
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if d not in IGNORED_PROFILE_ENTRIES]
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _pid_alive(pid: int) -> Optional[bool]:
+    """Returns whether a process exists, or None when it cannot be checked safely."""
+    if os.name != "posix":
+        return None # os.kill trên Windows sẽ kết thúc process, không dùng để kiểm tra
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return None
+    return True
+
+
+class ProfileCloneError(Exception):
+    """Raised when no private copy of the template profile could be created."""
+
+
+class ProfileManager:
+    """Hands out private, disposable copies of a template Chrome profile."""
+
+    def __init__(self, template_dir: str, root_dir: Optional[str] = None):
+        self.template_dir = template_dir
+        self.root_dir = root_dir or self._pick_root_dir()
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active: Set[str] = set()
+        self._reflink_supported = fcntl is not None
+        self.cleanup_stale()
+        atexit.register(self.cleanup_all)
+        logging.info(f"Chrome profile copies will be created under {self.root_dir}")
+
+    def _pick_root_dir(self) -> str:
+        template_size = _directory_size(self.template_dir) if os.path.isdir(self.template_dir) else 0
+        for candidate in TMPFS_CANDIDATES:
+            try:
+                if os.path.isdir(candidate) and os.access(candidate, os.W_OK):
+                    if shutil.disk_usage(candidate).free >= template_size * TMPFS_HEADROOM:
+                        return candidate
+            except OSError:
+                continue
+        return tempfile.gettempdir()
+
+    # --- Copy ---
+    def _ignore(self, directory: str, names) -> Set[str]:
+        return {name for name in names if name in IGNORED_PROFILE_ENTRIES}
+
+    def _clone_file(self, src: str, dst: str):
+        """Copies one file, using a copy-on-write reflink when the filesystem allows it."""
+        if self._reflink_supported:
+            try:
+                with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                    fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+                shutil.copystat(src, dst)
+                return dst
+            except OSError:
+                self._reflink_supported = False # Filesystem không hỗ trợ, dùng copy thường từ giờ
+        return shutil.copy2(src, dst)
+
+    def acquire(self) -> Optional[str]:
+        """Creates a private profile copy and returns its path (None if there is no template).
+
+        Raises ProfileCloneError when the copy keeps failing; callers must not fall back to the
+        shared template, which would bring back Chrome's profile-lock contention.
+        """
+        if not os.path.isdir(self.template_dir):
+            return None
+        last_error: Optional[BaseException] = None
+        for attempt in range(1, CLONE_ATTEMPTS + 1):
+            name = f"{PROFILE_COPY_PREFIX}{os.getpid()}_{next(self._counter)}"
+            path = os.path.join(self.root_dir, name)
+            started = time.perf_counter()
+            try:
+                shutil.copytree(self.template_dir, path, ignore=self._ignore,
+                                copy_function=self._clone_file, ignore_dangling_symlinks=True)
+            except (OSError, shutil.Error) as e:
+                last_error = e
+                logging.warning(f"Could not clone Chrome profile into {path} (attempt {attempt}/{CLONE_ATTEMPTS}): {e}")
+                shutil.rmtree(path, ignore_errors=True)
+                disk_dir = tempfile.gettempdir()
+                if self.root_dir != disk_dir:
+                    # tmpfs đầy hoặc lỗi: chuyển hẳn các bản sao sau sang thư mục tạm trên đĩa
+                    logging.warning(f"Moving Chrome profile copies from {self.root_dir} to {disk_dir}")
+                    self.root_dir = disk_dir
+                continue
+            with self._lock:
+                self._active.add(path)
+            logging.debug(f"Cloned Chrome profile to {path} in {time.perf_counter() - started:.2f}s")
+            return path
+        raise ProfileCloneError(f"Could not clone Chrome profile '{self.template_dir}': {last_error}")
+
+    def release(self, path: Optional[str]):
+        """Deletes a profile copy handed out by acquire()."""
+        if not path:
+            return
+        with self._lock:
+            self._active.discard(path)
+        shutil.rmtree(path, ignore_errors=True)
+
+    # --- Cleanup ---
+    def cleanup_all(self):
+        """Deletes every copy still owned by this process."""
+        with self._lock:
+            paths = list(self._active)
+            self._active.clear()
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def cleanup_stale(self):
+        """Deletes copies left behind by earlier runs that did not exit cleanly."""
+        try:
+            entries = os.listdir(self.root_dir)
+        except OSError:
+            return
+        removed = 0
+        for name in entries:
+            if not name.startswith(PROFILE_COPY_PREFIX):
+                continue
+            path = os.path.join(self.root_dir, name)
+            try:
+                pid = int(name[len(PROFILE_COPY_PREFIX):].split("_", 1)[0])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            alive = _pid_alive(pid)
+            if alive is None:
+                try:
+                    alive = time.time() - os.path.getmtime(path) < STALE_PROFILE_SECONDS
+                except OSError:
+                    continue
+            if not alive:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            logging.info(f"Removed {removed} stale Chrome profile copies from {self.root_dir}")
@@ -0,0 +1,187 @@
+# result_writer.py
+"""
+Ghi kết quả dạng streaming bằng một luồng writer riêng.
+
+Worker chỉ đưa các dòng review vào một hàng đợi có giới hạn (không cần lock toàn
+cục). Luồng writer gom theo lô, ghi nối vào file CSV và fsync định kỳ, nên bộ
+nhớ không tăng theo độ lớn của crawl và crash giữa chừng không làm mất dữ liệu
+đã ghi. Nếu có `ReviewDeduplicator`, dòng trùng bị loại ngay trong `submit()`, còn
+digest của dòng mới chỉ được lưu vào seen-set khi dòng đã được ghi và sync.
+
+Dòng nằm trong hàng đợi chưa phải là đã lưu: callback `on_durable` của mỗi lô (ví
+dụ checkpoint của frontier) chỉ được gọi trên luồng writer sau khi lô đó đã được
+ghi và fsync. Callback được gọi theo đúng thứ tự submit.
+"""
+import csv
+import logging
+import os
+import threading
+import time
+from functools import partial
+from queue import Queue, Empty
+from typing import Callable, Dict, Iterable, List, Optional
+
+from review_dedup import ReviewDeduplicator
+
+# --- Constants ---
+WRITER_QUEUE_SIZE = 256  # Số lô (mỗi lô là các review của một URL) tối đa chờ ghi
+WRITER_BATCH_ROWS = 500  # Ghi xuống file khi gom đủ số dòng này
+WRITER_FSYNC_INTERVAL = 5.0  # Giây giữa hai lần fsync
+
+_STOP = object()
+
+
+class StreamingResultWriter(threading.Thread):
+    """Background thread that appends review rows to a CSV file in batches."""
+
+    def __init__(self, output_file: str, columns: List[str], append: bool = False,
+                 queue_size: int = WRITER_QUEUE_SIZE, batch_rows: int = WRITER_BATCH_ROWS,
+                 fsync_interval: float = WRITER_FSYNC_INTERVAL,
+                 deduplicator: Optional[ReviewDeduplicator] = None):
+        super().__init__(name="ResultWriter", daemon=True)
+        self.output_file = output_file
+        self.columns = columns
+        self.append = append
+        self.batch_rows = batch_rows
+        self.fsync_interval = fsync_interval
+        self._queue: Queue = Queue(maxsize=queue_size)
+        self.deduplicator = deduplicator
+        self.rows_written = 0
+        self.error: Optional[BaseException] = None
+
+    # --- API cho worker ---
+    def submit(self, rows: Iterable[Dict[str, str]], on_durable: Optional[Callable[[], None]] = None):
+        """Hands a batch of rows to the writer; blocks only when the queue is full (backpressure).
+
+        `on_durable` is called on the writer thread once the batch is written and synced to disk
+        (also when every row was a duplicate); it is never called if the writer fails first.
+        """
+        callbacks = []
+        if self.deduplicator is not None:
+            rows, digests = self.deduplicator.claim(rows)
+            if digests:
+                # Digest chỉ được lưu vào seen-set khi các dòng đã nằm trên đĩa
+                callbacks.append(partial(self.deduplicator.commit, digests))
+        else:
+            rows = list(rows)
+        if on_durable is not None:
+            callbacks.append(on_durable)
+        if rows or callbacks:
+            self._queue.put((rows, callbacks))
+
+    def when_durable(self, callback: Callable[[], None]):
+        """Calls `callback` on the writer thread once every batch submitted before it is on disk."""
+        self.submit((), on_durable=callback)
+
+    def close(self, timeout: Optional[float] = None) -> int:
+        """Flushes everything still queued, stops the thread and returns the number of rows written."""
+        self._queue.put(_STOP)
+        self.join(timeout)
+        if self.error is not None:
+            logging.error(f"Result writer failed: {self.error}")
+        return self.rows_written
+
+    @property
+    def duplicates_dropped(self) -> int:
+        return self.deduplicator.duplicates_dropped if self.deduplicator is not None else 0
+
+    # --- Đích ghi (lớp con có thể thay bằng định dạng khác) ---
+    _WRITE_ERRORS = (OSError,)
+
+    def _open_sink(self):
+        exists = os.path.exists(self.output_file) and os.path.getsize(self.output_file) > 0
+        if self.append and exists:
+            self._handle = open(self.output_file, "a", newline="", encoding="utf-8")
+            write_header = False
+        else:
+            self._handle = open(self.output_file, "w", newline="", encoding="utf-8-sig")
+            write_header = True
+        self._csv = csv.DictWriter(self._handle, fieldnames=self.columns, extrasaction="ignore",
+                                   lineterminator=os.linesep)
+        if write_header:
+            self._csv.writeheader()
+
+    def _write_rows(self, rows: List[Dict[str, str]]):
+        self._csv.writerows(rows)
+        self._handle.flush()
+
+    def _sync(self) -> bool:
+        """Makes the rows written so far durable; returns True when they all are."""
+        try:
+            os.fsync(self._handle.fileno())
+        except OSError as e:
+            logging.warning(f"fsync failed for {self.output_file}: {e}")
+            return False
+        return True
+
+    def _close_sink(self):
+        self._handle.close()
+
+    # --- Luồng writer ---
+    def run(self):
+        try:
+            self._open_sink()
+        except self._WRITE_ERRORS as e:
+            self.error = e
+            self._drain()
+            return
+        unsynced: List[Callable[[], None]] = [] # Callback của các lô đã ghi nhưng chưa sync
+        closed = False
+        try:
+            buffer: List[Dict[str, str]] = []
+            buffered: List[Callable[[], None]] = [] # Callback của các lô còn trong buffer
+            last_fsync = time.monotonic()
+            stopping = False
+            while not stopping:
+                try:
+                    item = self._queue.get(timeout=self.fsync_interval)
+                except Empty:
+                    item = None
+                if item is _STOP:
+                    stopping = True
+                elif item is not None:
+                    rows, callbacks = item
+                    buffer.extend(rows)
+                    buffered.extend(callbacks)
+                if (buffer or buffered) and (stopping or item is None or len(buffer) >= self.batch_rows):
+                    if buffer:
+                        try:
+                            self._write_rows(buffer)
+                        except self._WRITE_ERRORS as e:
+                            self.error = e
+                            self._drain(stopped=stopping)
+                            return
+                        self.rows_written += len(buffer)
+                        logging.debug(f"Result writer flushed {len(buffer)} rows (total {self.rows_written}).")
+                        buffer = []
+                    unsynced.extend(buffered)
+                    buffered = []
+                if stopping or time.monotonic() - last_fsync >= self.fsync_interval:
+                    if self._sync():
+                        self._run_callbacks(unsynced)
+                        unsynced = []
+                    last_fsync = time.monotonic()
+        finally:
+            try:
+                self._close_sink()
+                closed = True
+            except self._WRITE_ERRORS as e:
+                self.error = self.error or e
+                logging.error(f"Result writer could not close '{self.output_file}': {e}")
+        if closed and self.error is None:
+            self._run_callbacks(unsynced) # Đóng file cũng là sync cuối cùng
+
+    def _run_callbacks(self, callbacks: List[Callable[[], None]]):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Result writer callback failed: {e}", exc_info=True)
+
+    def _drain(self, stopped: bool = False):
+        """Keeps consuming the queue after a fatal error so workers never block on submit()."""
+        logging.error(f"Result writer stopped writing to '{self.output_file}': {self.error}")
+        if stopped:
+            return # close() đã gửi tín hiệu dừng, hàng đợi không còn gì
+        while self._queue.get() is not _STOP:
+            pass
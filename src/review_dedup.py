@@ -0,0 +1,220 @@
+# review_dedup.py
+"""
+Khử trùng lặp review dạng streaming với tập "đã thấy" lưu bền giữa các lần chạy.
+
+Mỗi dòng được chuẩn hoá (Unicode NFC, gộp khoảng trắng) rồi băm (title, content,
+type) thành digest 16 byte ngay khi được tạo ra. Tập đã thấy gồm:
+  - file digest đã sắp xếp, độ rộng cố định (`<output>.seen`), tra cứu bằng tìm
+    kiếm nhị phân trên mmap nên không phải nạp vào RAM;
+  - file `.pending` ghi nối các digest mới của lần chạy hiện tại (chịu được crash),
+    được trộn vào file đã sắp xếp khi `close()`.
+Dòng trùng bị loại trước khi tới writer. Digest của dòng mới chỉ được "giữ chỗ"
+trong bộ nhớ (`claim()`) cho tới khi writer đã ghi và sync các dòng đó, rồi mới
+được ghi vào `.pending` (`commit()`): crash giữa chừng không làm review chưa kịp
+ghi bị coi là đã thấy ở các lần chạy sau.
+"""
+import csv
+import hashlib
+import heapq
+import logging
+import mmap
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# --- Constants ---
+DIGEST_SIZE = 16  # Byte cho mỗi digest (blake2b-128)
+SEEN_SUFFIX = ".seen"
+PENDING_SUFFIX = ".pending"
+MERGE_CHUNK_DIGESTS = 65536  # Số digest đọc mỗi lần khi trộn file
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(value) -> str:
+    """Normalizes one field so cosmetic differences (Unicode form, spacing) do not defeat dedup."""
+    if value is None:
+        return ""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", str(value))).strip()
+
+
+def review_digest(title, content, review_type) -> bytes:
+    """Returns a compact 16-byte digest of one normalized (title, content, type) row."""
+    key = "\x1f".join((normalize_text(title), normalize_text(content), normalize_text(review_type)))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+def row_digest(row: Dict[str, str]) -> bytes:
+    return review_digest(row.get("title"), row.get("content"), row.get("type"))
+
+
+class ReviewDeduplicator:
+    """Thread-safe persistent seen-set of review digests."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pending_path = path + PENDING_SUFFIX
+        self._lock = threading.Lock()
+        self._sorted_handle = None
+        self._sorted_map: Optional[mmap.mmap] = None
+        self._sorted_count = 0
+        self._new: Set[bytes] = set() # Digest đã lưu bền (trong .pending)
+        self._claimed: Set[bytes] = set() # Digest của dòng đang chờ writer ghi xuống đĩa
+        self.duplicates_dropped = 0
+        self.rows_accepted = 0
+        self._open_sorted()
+        self._load_pending()
+        self._pending = open(self.pending_path, "ab")
+
+    # --- File digest đã sắp xếp ---
+    def _open_sorted(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < DIGEST_SIZE:
+            return
+        self._sorted_handle = open(self.path, "rb")
+        self._sorted_map = mmap.mmap(self._sorted_handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._sorted_count = len(self._sorted_map) // DIGEST_SIZE
+
+    def _close_sorted(self):
+        if self._sorted_map is not None:
+            self._sorted_map.close()
+            self._sorted_handle.close()
+        self._sorted_map = self._sorted_handle = None
+        self._sorted_count = 0
+
+    def _load_pending(self):
+        """Reloads digests accepted by an interrupted run (a torn last digest is ignored)."""
+        if not os.path.exists(self.pending_path):
+            return
+        with open(self.pending_path, "rb") as handle:
+            data = handle.read()
+        usable = len(data) - len(data) % DIGEST_SIZE
+        self._new.update(data[pos:pos + DIGEST_SIZE] for pos in range(0, usable, DIGEST_SIZE))
+        if usable != len(data):
+            with open(self.pending_path, "r+b") as handle:
+                handle.truncate(usable)
+
+    def _in_sorted(self, digest: bytes) -> bool:
+        lo, hi = 0, self._sorted_count
+        data = self._sorted_map
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = data[mid * DIGEST_SIZE:(mid + 1) * DIGEST_SIZE]
+            if probe < digest:
+                lo = mid + 1
+            elif probe > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+    # --- API ---
+    def __len__(self) -> int:
+        return self._sorted_count + len(self._new) + len(self._claimed)
+
+    def seen(self, digest: bytes) -> bool:
+        return (digest in self._new or digest in self._claimed
+                or (self._sorted_count > 0 and self._in_sorted(digest)))
+
+    def claim(self, rows: Iterable[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[bytes]]:
+        """Returns (rows not seen before, their digests); the digests count as seen in this run only until
+        `commit()` persists them once the rows are on disk."""
+        fresh_rows = []
+        digests = []
+        with self._lock:
+            for row in rows:
+                digest = row_digest(row)
+                if self.seen(digest):
+                    self.duplicates_dropped += 1
+                    continue
+                self._claimed.add(digest)
+                digests.append(digest)
+                fresh_rows.append(row)
+            self.rows_accepted += len(fresh_rows)
+        return fresh_rows, digests
+
+    def commit(self, digests: Iterable[bytes]):
+        """Persists claimed digests whose rows the writer has made durable."""
+        with self._lock:
+            for digest in digests:
+                self._claimed.discard(digest)
+                if digest not in self._new:
+                    self._new.add(digest)
+                    self._pending.write(digest)
+            self._pending.flush()
+
+    def filter(self, rows: Iterable[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Returns only rows not seen before and persists them as seen at once (rows written synchronously)."""
+        fresh_rows, digests = self.claim(rows)
+        self.commit(digests)
+        return fresh_rows
+
+    def seed_from_csv(self, csv_file: str, encoding: str = "utf-8-sig") -> int:
+        """Marks every row of an existing output CSV as seen; returns the number of rows read."""
+        with open(csv_file, newline="", encoding=encoding) as handle:
+            return self.seed_from_rows(csv.DictReader(handle))
+
+    def seed_from_rows(self, rows: Iterable[Dict[str, str]]) -> int:
+        """Marks every row of existing output as seen; returns the number of rows read."""
+        count = 0
+        for row in rows:
+            digest = row_digest(row)
+            with self._lock:
+                if not self.seen(digest):
+                    self._new.add(digest)
+                    self._pending.write(digest)
+            count += 1
+        with self._lock:
+            self._pending.flush()
+        return count
+
+    def reset(self):
+        """Forgets every digest (used when the output file is started over)."""
+        with self._lock:
+            self._close_sorted()
+            self._new.clear()
+            self._claimed.clear()
+            self._pending.close()
+            for path in (self.path, self.pending_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._pending = open(self.pending_path, "ab")
+
+    def close(self):
+        """Merges this run's persisted digests into the sorted file and removes the pending log."""
+        with self._lock:
+            self._pending.close()
+            if self._claimed:
+                # Các dòng này chưa từng được ghi xuống đĩa (writer lỗi): không coi là đã thấy
+                logging.warning(f"Dropping {len(self._claimed)} digests whose rows were never written.")
+                self._claimed.clear()
+            if self._new:
+                temp_path = self.path + ".tmp"
+                with open(temp_path, "wb") as out:
+                    for digest in heapq.merge(self._iter_sorted(), sorted(self._new)):
+                        out.write(digest)
+                    out.flush()
+                    os.fsync(out.fileno())
+                self._close_sorted()
+                os.replace(temp_path, self.path)
+                logging.info(f"Seen-set '{self.path}' now holds {os.path.getsize(self.path) // DIGEST_SIZE} digests.")
+            self._close_sorted()
+            self._new.clear()
+            if os.path.exists(self.pending_path):
+                os.remove(self.pending_path)
+
+    def _iter_sorted(self) -> Iterator[bytes]:
+        data = self._sorted_map
+        if data is None:
+            return
+        step = MERGE_CHUNK_DIGESTS * DIGEST_SIZE
+        for start in range(0, self._sorted_count * DIGEST_SIZE, step):
+            chunk = data[start:start + step]
+            for pos in range(0, len(chunk), DIGEST_SIZE):
+                yield chunk[pos:pos + DIGEST_SIZE]
+
+
+def seen_set_path_for(output_file: str) -> str:
+    """Default seen-set location next to an output CSV (`raw_data.csv` -> `raw_data.seen`)."""
+    return os.path.splitext(output_file)[0] + SEEN_SUFFIX
@@ -0,0 +1,465 @@
+# review_extraction.py
+"""
+Trích xuất toàn bộ review trên trang bằng một lần `execute_script`.
+
+Cách cũ gọi `find_element` + `.text` cho từng review, mỗi lệnh là một HTTP round
+trip tới chromedriver. Ở đây một script duy nhất trả về mảng JSON các review.
+Module cũng đếm số lệnh WebDriver mà mỗi driver đã gửi để đo được mức tiết kiệm.
+
+`extract_reviews_from_html` làm cùng việc trên HTML (HTML đã lưu, hoặc outerHTML
+của widget review lấy bằng một lệnh duy nhất) với cùng các selector `REVIEW_*_CSS`.
+Có ba backend: selectolax (nhanh nhất, tuỳ chọn), lxml + cssselect (mặc định) và
+`html.parser` của thư viện chuẩn (luôn có, dùng khi thiếu hai thư viện kia).
+"""
+import logging
+import threading
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, Union
+
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:  # lxml/cssselect có trong REQUIRED_PACKAGES, nhưng parser chuẩn vẫn chạy được khi thiếu
+    lxml = None
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:  # selectolax là tuỳ chọn
+    SelectolaxParser = None
+
+from tiki_selectors import (
+    REVIEWS_SECTION_ID,
+    REVIEW_CONTAINER_CSS,
+    REVIEW_TITLE_CSS,
+    REVIEW_CONTENT_CSS,
+    REVIEW_FIELD_CLASS_PREFIX,
+)
+from review_records import ReviewRecord
+
+# arguments: [container_css, title_css, content_css, field_class_prefix, with_extra]
+EXTRACT_REVIEWS_JS = """
+const [containerCss, titleCss, contentCss, fieldPrefix, withExtra] = arguments;
+const textOf = (el) => (el ? (el.innerText || el.textContent || "").trim() : null);
+return Array.from(document.querySelectorAll(containerCss)).map((container) => {
+    const review = {
+        title: textOf(container.querySelector(titleCss)),
+        content: textOf(container.querySelector(contentCss)),
+        extra: {},
+    };
+    if (!withExtra) return review; // Không quét các trường phụ khi không cần ghi chúng
+    container.querySelectorAll(`[class*="${fieldPrefix}"]`).forEach((el) => {
+        const cls = Array.from(el.classList).find((c) => c.startsWith(fieldPrefix));
+        if (!cls || el.matches(titleCss) || el.matches(contentCss) || el.closest(contentCss)) return;
+        if (el.querySelector(`[class*="${fieldPrefix}"]`)) return; // Chỉ lấy phần tử lá
+        const name = cls.slice(fieldPrefix.length).replace(/-/g, "_");
+        const value = textOf(el);
+        if (name && value && !(name in review.extra)) review.extra[name] = value;
+    });
+    return review;
+});
+"""
+
+# arguments: [section_id]; cả trang nếu không tìm thấy widget review
+CAPTURE_WIDGET_JS = """
+const widget = document.getElementById(arguments[0]);
+return (widget || document.documentElement).outerHTML;
+"""
+
+PARSER_SELECTOLAX = "selectolax"
+PARSER_LXML = "lxml"
+PARSER_STDLIB = "html.parser"
+
+
+class CommandCounter:
+    """Thread-safe count of WebDriver commands sent by one driver."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+
+def instrument_driver(driver: Any) -> CommandCounter:
+    """Wraps driver.execute so every WebDriver command (including WebElement calls) is counted."""
+    counter = getattr(driver, "command_counter", None)
+    if counter is not None:
+        return counter
+    counter = CommandCounter()
+    original_execute = driver.execute
+
+    def counting_execute(driver_command, params=None):
+        counter.increment()
+        return original_execute(driver_command, params)
+
+    driver.execute = counting_execute
+    driver.command_counter = counter
+    return counter
+
+
+def commands_issued(driver: Any) -> int:
+    """Returns the number of WebDriver commands sent so far (0 if the driver is not instrumented)."""
+    counter = getattr(driver, "command_counter", None)
+    return counter.count if counter is not None else 0
+
+
+def extract_reviews_batched(driver: Any, container_css: str = REVIEW_CONTAINER_CSS,
+                            title_css: str = REVIEW_TITLE_CSS, content_css: str = REVIEW_CONTENT_CSS,
+                            include_extra: bool = False) -> List[ReviewRecord]:
+    """Extracts every review on the current page with a single execute_script call.
+
+    The other review-comment__* fields are only collected (into `extra`) with `include_extra`.
+    """
+    try:
+        raw_reviews = driver.execute_script(EXTRACT_REVIEWS_JS, container_css, title_css,
+                                            content_css, REVIEW_FIELD_CLASS_PREFIX, include_extra) or []
+    except Exception as e:
+        logging.error(f"Extract reviews error: {e}", exc_info=False)
+        return []
+    return rows_from_raw_reviews(raw_reviews, include_extra)
+
+
+def capture_widget_html(driver: Any, section_id: str = REVIEWS_SECTION_ID) -> Optional[str]:
+    """Returns the review widget's outerHTML (one WebDriver command), or None on error."""
+    try:
+        return driver.execute_script(CAPTURE_WIDGET_JS, section_id)
+    except Exception as e:
+        logging.warning(f"Could not capture review widget HTML: {e}")
+        return None
+
+
+def rows_from_raw_reviews(raw_reviews: List[Dict[str, Any]], include_extra: bool = False) -> List[ReviewRecord]:
+    """Turns raw {title, content, extra} records into output rows ("N/A" for missing fields)."""
+    reviews_on_page = []
+    for raw in raw_reviews:
+        title = raw.get("title")
+        content = raw.get("content")
+        extra = raw.get("extra") if include_extra else None
+        reviews_on_page.append(ReviewRecord("N/A" if title is None else title, "N/A" if content is None else content,
+                                            extra=dict(extra) if extra else None))
+    return reviews_on_page
+
+
+# --- Trích xuất từ HTML: backend html.parser (thư viện chuẩn) ---
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+              "source", "track", "wbr"}
+_BLOCK_TAGS = {"address", "article", "aside", "blockquote", "div", "dl", "dd", "dt", "footer", "form",
+               "h1", "h2", "h3", "h4", "h5", "h6", "header", "li", "main", "nav", "ol", "p", "pre",
+               "section", "table", "tr", "ul"}
+_SKIPPED_TAGS = {"script", "style", "template", "noscript"}
+
+SimpleSelector = Tuple[Optional[str], FrozenSet[str]]
+
+
+def compile_simple_selector(css: str) -> SimpleSelector:
+    """Parses a `tag.class1.class2` selector (the only form the REVIEW_*_CSS selectors use)."""
+    if not css or any(char in css for char in " >+~[:#*,"):
+        raise ValueError(f"Only 'tag.class' selectors are supported offline, got {css!r}")
+    tag, *classes = css.split(".")
+    return (tag.lower() or None), frozenset(classes)
+
+
+class _Node:
+    __slots__ = ("tag", "class_attr", "classes", "parent", "children")
+
+    def __init__(self, tag: str, class_attr: str, parent: Optional["_Node"]):
+        self.tag = tag
+        self.class_attr = class_attr
+        self.classes = frozenset(class_attr.split())
+        self.parent = parent
+        self.children: List[Union["_Node", str]] = []
+
+    def matches(self, selector: SimpleSelector) -> bool:
+        tag, classes = selector
+        return (tag is None or self.tag == tag) and classes <= self.classes
+
+    def descendants(self):
+        for child in self.children:
+            if isinstance(child, _Node):
+                yield child
+                yield from child.descendants()
+
+    def first(self, selector: SimpleSelector) -> Optional["_Node"]:
+        return next((node for node in self.descendants() if node.matches(selector)), None)
+
+    def text(self) -> str:
+        """Approximates `innerText`: block boundaries and <br> become line breaks, spaces collapse."""
+        parts: List[str] = []
+        self._collect_text(parts)
+        return _normalize_inner_text("".join(parts))
+
+    def _collect_text(self, parts: List[str]):
+        if self.tag == "br":
+            parts.append("\n")
+            return
+        block = self.tag in _BLOCK_TAGS
+        if block:
+            parts.append("\n")
+        for child in self.children:
+            if isinstance(child, str):
+                parts.append(child)
+            else:
+                child._collect_text(parts)
+        if block:
+            parts.append("\n")
+
+
+class _TreeBuilder(HTMLParser):
+    """Builds a minimal element tree (tag, classes, text) tolerant of unclosed tags."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("#document", "", None)
+        self._current = self.root
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_depth or tag in _SKIPPED_TAGS:
+            if tag not in _VOID_TAGS:
+                self._skip_depth += 1
+            return
+        node = _Node(tag, dict(attrs).get("class") or "", self._current)
+        self._current.children.append(node)
+        if tag not in _VOID_TAGS:
+            self._current = node
+
+    def handle_startendtag(self, tag, attrs):
+        if not self._skip_depth and tag not in _SKIPPED_TAGS:
+            self._current.children.append(_Node(tag, dict(attrs).get("class") or "", self._current))
+
+    def handle_endtag(self, tag):
+        if self._skip_depth:
+            self._skip_depth -= 1
+            return
+        node = self._current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self._current = node.parent # Đóng luôn các thẻ con bị bỏ quên thẻ đóng
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._current.children.append(data)
+
+
+def _extract_raw_stdlib(html: str, container_css: str = REVIEW_CONTAINER_CSS,
+                       title_css: str = REVIEW_TITLE_CSS,
+                       content_css: str = REVIEW_CONTENT_CSS, with_extra: bool = True) -> List[Dict[str, Any]]:
+    """Offline counterpart of EXTRACT_REVIEWS_JS on html.parser: the same {title, content, extra} records."""
+    container_sel = compile_simple_selector(container_css)
+    title_sel = compile_simple_selector(title_css)
+    content_sel = compile_simple_selector(content_css)
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+
+    raw_reviews = []
+    for container in builder.root.descendants():
+        if not container.matches(container_sel):
+            continue
+        title = container.first(title_sel)
+        content = container.first(content_sel)
+        review: Dict[str, Any] = {
+            "title": title.text() if title is not None else None,
+            "content": content.text() if content is not None else None,
+            "extra": {},
+        }
+        if not with_extra:
+            raw_reviews.append(review)
+            continue
+        for node in container.descendants():
+            field_class = next((c for c in node.classes if c.startswith(REVIEW_FIELD_CLASS_PREFIX)), None)
+            if field_class is None or node.matches(title_sel) or _inside(node, content_sel):
+                continue
+            if any(REVIEW_FIELD_CLASS_PREFIX in child.class_attr for child in node.descendants()):
+                continue # Chỉ lấy phần tử lá
+            name = field_class[len(REVIEW_FIELD_CLASS_PREFIX):].replace("-", "_")
+            value = node.text()
+            if name and value and name not in review["extra"]:
+                review["extra"][name] = value
+        raw_reviews.append(review)
+    return raw_reviews
+
+
+def _inside(node: Optional[_Node], selector: SimpleSelector) -> bool:
+    while node is not None:
+        if node.matches(selector):
+            return True
+        node = node.parent
+    return False
+
+
+def _normalize_inner_text(text: str) -> str:
+    lines = (" ".join(line.split()) for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+# --- Backend lxml + cssselect ---
+@lru_cache(maxsize=None)
+def _compiled_css(css: str) -> "CSSSelector":
+    return CSSSelector(css)
+
+
+def _lxml_text(element: Any) -> str:
+    parts: List[str] = []
+
+    def collect(node: Any):
+        tag = node.tag if isinstance(node.tag, str) else ""
+        if tag in _SKIPPED_TAGS or not tag: # Bỏ script/style và comment
+            return
+        if tag == "br":
+            parts.append("\n")
+            return
+        block = tag in _BLOCK_TAGS
+        if block:
+            parts.append("\n")
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            collect(child)
+            if child.tail:
+                parts.append(child.tail)
+        if block:
+            parts.append("\n")
+
+    collect(element)
+    return _normalize_inner_text("".join(parts))
+
+
+def _extract_raw_lxml(html: str, container_css: str = REVIEW_CONTAINER_CSS, title_css: str = REVIEW_TITLE_CSS,
+                      content_css: str = REVIEW_CONTENT_CSS, with_extra: bool = True) -> List[Dict[str, Any]]:
+    document = lxml.html.fromstring(html)
+    title_sel, content_sel = _compiled_css(title_css), _compiled_css(content_css)
+    field_xpath = f'.//*[contains(@class, "{REVIEW_FIELD_CLASS_PREFIX}")]'
+    raw_reviews = []
+    for container in _compiled_css(container_css)(document):
+        titles, contents = title_sel(container), content_sel(container)
+        review: Dict[str, Any] = {
+            "title": _lxml_text(titles[0]) if titles else None,
+            "content": _lxml_text(contents[0]) if contents else None,
+            "extra": {},
+        }
+        if not with_extra:
+            raw_reviews.append(review)
+            continue
+        fields = container.xpath(field_xpath)
+        skipped = set(titles) | {node for content in contents for node in content.iter()}
+        skipped |= {ancestor for node in fields for ancestor in node.iterancestors()} # Chỉ lấy phần tử lá
+        for node in fields:
+            field_class = next((c for c in (node.get("class") or "").split()
+                                if c.startswith(REVIEW_FIELD_CLASS_PREFIX)), None)
+            if field_class is None or node in skipped:
+                continue
+            name = field_class[len(REVIEW_FIELD_CLASS_PREFIX):].replace("-", "_")
+            value = _lxml_text(node)
+            if name and value and name not in review["extra"]:
+                review["extra"][name] = value
+        raw_reviews.append(review)
+    return raw_reviews
+
+
+# --- Backend selectolax (tuỳ chọn) ---
+def _selectolax_text(element: Any) -> str:
+    parts: List[str] = []
+
+    def collect(node: Any):
+        tag = node.tag
+        if tag == "-text":
+            parts.append(node.text_content or "")
+            return
+        if tag.startswith("-") or tag in _SKIPPED_TAGS: # Bỏ comment, script/style
+            return
+        if tag == "br":
+            parts.append("\n")
+            return
+        block = tag in _BLOCK_TAGS
+        if block:
+            parts.append("\n")
+        for child in node.iter(include_text=True):
+            collect(child)
+        if block:
+            parts.append("\n")
+
+    collect(element)
+    return _normalize_inner_text("".join(parts))
+
+
+def _extract_raw_selectolax(html: str, container_css: str = REVIEW_CONTAINER_CSS,
+                            title_css: str = REVIEW_TITLE_CSS,
+                            content_css: str = REVIEW_CONTENT_CSS, with_extra: bool = True) -> List[Dict[str, Any]]:
+    tree = SelectolaxParser(html)
+    field_css = f'[class*="{REVIEW_FIELD_CLASS_PREFIX}"]'
+    raw_reviews = []
+    for container in tree.css(container_css):
+        title = container.css_first(title_css)
+        content = container.css_first(content_css)
+        review: Dict[str, Any] = {
+            "title": _selectolax_text(title) if title is not None else None,
+            "content": _selectolax_text(content) if content is not None else None,
+            "extra": {},
+        }
+        if not with_extra:
+            raw_reviews.append(review)
+            continue
+        for node in container.css(field_css):
+            field_class = next((c for c in (node.attributes.get("class") or "").split()
+                                if c.startswith(REVIEW_FIELD_CLASS_PREFIX)), None)
+            if field_class is None or node.css_matches(title_css) or _selectolax_inside(node, content_css, container):
+                continue
+            if len(node.css(field_css)) > 1:
+                continue # Chỉ lấy phần tử lá (css() của lexbor tính cả chính nút đó)
+            name = field_class[len(REVIEW_FIELD_CLASS_PREFIX):].replace("-", "_")
+            value = _selectolax_text(node)
+            if name and value and name not in review["extra"]:
+                review["extra"][name] = value
+        raw_reviews.append(review)
+    return raw_reviews
+
+
+def _selectolax_inside(node: Any, css: str, container: Any) -> bool:
+    while node is not None and node.mem_id != container.mem_id:
+        if node.css_matches(css):
+            return True
+        node = node.parent
+    return False
+
+
+# --- Chọn backend ---
+_PARSER_BACKENDS: Dict[str, Tuple[Callable[..., List[Dict[str, Any]]], bool]] = {
+    PARSER_SELECTOLAX: (_extract_raw_selectolax, SelectolaxParser is not None),
+    PARSER_LXML: (_extract_raw_lxml, lxml is not None),
+    PARSER_STDLIB: (_extract_raw_stdlib, True),
+}
+PARSER_BACKENDS = tuple(_PARSER_BACKENDS)
+
+
+def available_parser_backends() -> List[str]:
+    return [name for name, (_, available) in _PARSER_BACKENDS.items() if available]
+
+
+def default_parser_backend() -> str:
+    """The fastest installed backend: selectolax, then lxml, then html.parser."""
+    return available_parser_backends()[0]
+
+
+def extract_raw_reviews_from_html(html: str, backend: Optional[str] = None,
+                                  with_extra: bool = True) -> List[Dict[str, Any]]:
+    """Offline counterpart of EXTRACT_REVIEWS_JS: the same {title, content, extra} records from HTML.
+
+    `with_extra=False` skips collecting the other review-comment__* fields (faster when they are not written).
+    """
+    name = backend or default_parser_backend()
+    if name not in _PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend '{name}'. Expected one of {PARSER_BACKENDS}.")
+    parse, available = _PARSER_BACKENDS[name]
+    if not available:
+        raise ValueError(f"Parser backend '{name}' is not installed (available: {available_parser_backends()}).")
+    return parse(html, with_extra=with_extra)
+
+
+def extract_reviews_from_html(html: str, include_extra: bool = False,
+                              backend: Optional[str] = None) -> List[ReviewRecord]:
+    """Extracts review rows from page or widget HTML, like extract_reviews_batched does live."""
+    return rows_from_raw_reviews(extract_raw_reviews_from_html(html, backend, with_extra=include_extra), include_extra)
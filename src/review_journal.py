@@ -0,0 +1,247 @@
+# review_journal.py
+"""
+Journal append-only cho review đã thu thập (thay cho các file `raw_data_temp_{n}.csv`).
+
+Mỗi URL xử lý xong được ghi thành một bản ghi vào một segment duy nhất
+(`<name>.journal`), chỉ chứa các review mới của URL đó, kèm một index nhỏ
+(`<name>.journal.idx`, mỗi bản ghi 16 byte: offset, độ dài, số review). Bản ghi có
+CRC32; khi mở lại sau crash, phần đuôi ghi dở bị cắt bỏ. Cuối cùng `compact()`
+gộp journal thành file CSV (rồi `reset()` xoá journal khi lượt chạy đã xong), còn
+`tail()` cho phép theo dõi tiến độ khi đang chạy.
+
+Theo dõi tiến độ:  python review_journal.py data/raw_data.journal --follow
+"""
+import argparse
+import csv
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# --- Constants ---
+JOURNAL_SUFFIX = ".journal"
+INDEX_SUFFIX = ".idx"
+RECORD_MAGIC = b"RJ01"
+RECORD_HEADER = struct.Struct("<4sII")  # magic, độ dài payload, crc32 của payload
+INDEX_ENTRY = struct.Struct("<QII")  # offset trong segment, độ dài cả bản ghi, số review
+TAIL_POLL_INTERVAL = 1.0  # Giây giữa hai lần kiểm tra index khi tail --follow
+
+JournalRecord = Tuple[str, List[Dict[str, str]]]
+
+
+class JournalCorruptError(Exception):
+    """Raised when an indexed journal record fails its integrity check."""
+
+
+def _encode_record(url: str, rows: List[Dict[str, str]]) -> bytes:
+    payload = json.dumps({"url": url, "rows": [dict(row) for row in rows]}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return RECORD_HEADER.pack(RECORD_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_payload(header: bytes, payload: bytes) -> Optional[JournalRecord]:
+    """Returns (url, rows) if the header matches the payload, else None."""
+    magic, length, crc = RECORD_HEADER.unpack(header)
+    if magic != RECORD_MAGIC or length != len(payload) or zlib.crc32(payload) != crc:
+        return None
+    try:
+        record = json.loads(payload.decode("utf-8"))
+    except ValueError:
+        return None
+    return record["url"], record["rows"]
+
+
+class ReviewJournal:
+    """Append-only, crash-safe store of per-URL review batches."""
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._entries: List[Tuple[int, int, int]] = []
+        self._recover()
+        self._segment = open(self.path, "ab")
+        self._index = open(self.index_path, "ab")
+
+    # --- Khôi phục sau crash ---
+    def _recover(self):
+        """Loads the index, re-indexes complete records written after it and truncates any torn tail."""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as handle:
+                data = handle.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            self._entries = [INDEX_ENTRY.unpack_from(data, pos) for pos in range(0, usable, INDEX_ENTRY.size)]
+        segment_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        # Bỏ các entry trỏ ra ngoài segment (segment bị mất đuôi nhưng index thì không)
+        while self._entries and self._entries[-1][0] + self._entries[-1][1] > segment_size:
+            self._entries.pop()
+
+        end = self._entries[-1][0] + self._entries[-1][1] if self._entries else 0
+        if end < segment_size:
+            with open(self.path, "rb") as handle:
+                handle.seek(end)
+                while True:
+                    header = handle.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+                    length = RECORD_HEADER.unpack(header)[1]
+                    payload = handle.read(length)
+                    record = _decode_payload(header, payload)
+                    if record is None:
+                        break
+                    self._entries.append((end, RECORD_HEADER.size + length, len(record[1])))
+                    end += RECORD_HEADER.size + length
+            with open(self.path, "r+b") as handle:
+                handle.truncate(end)
+
+        with open(self.index_path, "wb") as handle:
+            for entry in self._entries:
+                handle.write(INDEX_ENTRY.pack(*entry))
+
+    # --- Ghi ---
+    def append(self, url: str, rows: List[Dict[str, str]]) -> int:
+        """Appends one URL's rows (may be empty) and returns the record number."""
+        record = _encode_record(url, rows)
+        with self._lock:
+            offset = self._segment.tell()
+            self._segment.write(record)
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            # Index chỉ được ghi sau khi bản ghi đã nằm trọn trên đĩa
+            entry = (offset, len(record), len(rows))
+            self._index.write(INDEX_ENTRY.pack(*entry))
+            self._index.flush()
+            self._entries.append(entry)
+            return len(self._entries) - 1
+
+    def reset(self):
+        """Drops every record (once the journal has been compacted, or for a fresh run)."""
+        with self._lock:
+            self._segment.close()
+            self._index.close()
+            # Segment trước, index sau: crash ở giữa chỉ để lại index trỏ ra ngoài segment (bị bỏ khi mở lại)
+            for path in (self.path, self.index_path):
+                open(path, "wb").close()
+            self._entries = []
+            self._segment = open(self.path, "ab")
+            self._index = open(self.index_path, "ab")
+
+    def close(self):
+        with self._lock:
+            self._segment.close()
+            self._index.close()
+
+    # --- Đọc ---
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def review_count(self) -> int:
+        return sum(entry[2] for entry in self._entries)
+
+    def records(self, start: int = 0) -> Iterator[JournalRecord]:
+        """Yields (url, rows) for every indexed record from `start` on."""
+        return _read_records(self.path, self._entries[start:])
+
+    def processed_urls(self) -> Set[str]:
+        return {url for url, _ in self.records()}
+
+    def compact(self, output_file: str, columns: Optional[List[str]] = None, encoding: str = "utf-8") -> int:
+        """Writes every journaled row to `output_file` as CSV (atomically) and returns the row count."""
+        if columns is None:
+            columns = []
+            for _, rows in self.records():
+                for row in rows:
+                    columns.extend(key for key in row if key not in columns)
+        temp_file = output_file + ".tmp"
+        written = 0
+        with open(temp_file, "w", newline="", encoding=encoding) as handle:
+            writer = csv.DictWriter(handle, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            for _, rows in self.records():
+                writer.writerows(rows)
+                written += len(rows)
+        os.replace(temp_file, output_file)
+        return written
+
+
+def _read_records(path: str, entries: List[Tuple[int, int, int]]) -> Iterator[JournalRecord]:
+    with open(path, "rb") as handle:
+        for offset, length, _ in entries:
+            handle.seek(offset)
+            data = handle.read(length)
+            record = _decode_payload(data[:RECORD_HEADER.size], data[RECORD_HEADER.size:])
+            if record is None:
+                raise JournalCorruptError(f"Record at offset {offset} in '{path}' is corrupt.")
+            yield record
+
+
+def tail(path: str, follow: bool = False, poll_interval: float = TAIL_POLL_INTERVAL) -> Iterator[JournalRecord]:
+    """Yields journal records as they are indexed, without opening the journal for writing.
+
+    With `follow`, keeps polling the index for new records until interrupted; when the journal is
+    `reset()` (its last read record is gone), following starts again from the first record.
+    """
+    index_path = path + INDEX_SUFFIX
+    position = 0
+    last_seen: Optional[Tuple[bytes, bytes]] = None # (entry index, header bản ghi) của bản ghi cuối đã đọc
+    while True:
+        entries = []
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as handle:
+                if position and _last_record_id(path, handle, position) != last_seen:
+                    # Journal đã được reset() (sau một lượt chạy xong): đọc lại từ đầu
+                    position = 0
+                handle.seek(position)
+                data = handle.read()
+                usable = len(data) - len(data) % INDEX_ENTRY.size
+                entries = [INDEX_ENTRY.unpack_from(data, pos) for pos in range(0, usable, INDEX_ENTRY.size)]
+                position += usable
+                if entries:
+                    last_seen = _last_record_id(path, handle, position)
+        if entries:
+            yield from _read_records(path, entries)
+        elif not follow:
+            return
+        else:
+            time.sleep(poll_interval)
+
+
+def _last_record_id(path: str, index_handle, position: int) -> Optional[Tuple[bytes, bytes]]:
+    """Index entry and record header (with its CRC) just before `position`, or None if they are gone."""
+    if position < INDEX_ENTRY.size:
+        return None
+    index_handle.seek(position - INDEX_ENTRY.size)
+    entry = index_handle.read(INDEX_ENTRY.size)
+    if len(entry) < INDEX_ENTRY.size:
+        return None
+    try:
+        with open(path, "rb") as segment:
+            segment.seek(INDEX_ENTRY.unpack(entry)[0])
+            return entry, segment.read(RECORD_HEADER.size)
+    except OSError:
+        return None
+
+
+def journal_path_for(output_file: str) -> str:
+    """Default journal location next to an output CSV (`raw_data.csv` -> `raw_data.journal`)."""
+    return os.path.splitext(output_file)[0] + JOURNAL_SUFFIX
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show progress recorded in a review journal.")
+    parser.add_argument("journal", help="Path to the .journal segment.")
+    parser.add_argument("--follow", action="store_true", help="Keep printing new records as they are written.")
+    args = parser.parse_args()
+
+    total_urls = total_reviews = 0
+    try:
+        for url, rows in tail(args.journal, follow=args.follow):
+            total_urls += 1
+            total_reviews += len(rows)
+            print(f"[{total_urls}] {len(rows):5d} reviews (total {total_reviews}): {url}")
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,136 @@
+# review_records.py
+"""
+Bản ghi review gọn nhẹ cho dữ liệu đang xử lý (thay cho dict 3 khoá mỗi review).
+
+  - `ReviewRecord`: đối tượng `__slots__` (title, content, type, extra) khoảng
+    64 byte thay vì khoảng 180 byte của một dict. Vẫn đọc/ghi được như dict
+    (`row["title"]`, `row.get(...)`, `dict(row)`), nên writer CSV/Parquet, bộ khử
+    trùng lặp và journal dùng được mà không phải đổi.
+  - `ReviewColumns`: bộ đệm theo cột cho nhiều review cùng lúc. title/content là
+    list tham chiếu tới chính các chuỗi đã trích xuất (không sao chép), còn type được
+    mã hoá thành mã số nguyên 4 byte trong một `array`.
+
+Kết quả không đi qua DataFrame: các bản ghi được đưa thẳng cho writer CSV/Parquet
+(result_writer.py, columnar_writer.py) theo từng trang.
+
+Bộ nhớ cho mỗi review trong `ReviewColumns` chỉ còn khoảng 20 byte ngoài bản thân
+các chuỗi, nên crawl hàng triệu review vẫn nằm gọn trong RAM.
+"""
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# --- Constants ---
+CORE_FIELDS = ("title", "content", "type")
+TYPE_CODE_TYPECODE = "i"  # int 4 byte cho mã type
+
+_MISSING = object()
+
+
+class ReviewRecord:
+    """One scraped review; behaves like the `{title, content, type, ...}` dict it replaces."""
+
+    __slots__ = ("title", "content", "type", "extra")
+
+    def __init__(self, title: str, content: str, type: Optional[str] = None,
+                 extra: Optional[Dict[str, str]] = None):
+        self.title = title
+        self.content = content
+        self.type = type
+        self.extra = extra or None # Trường phụ (author, date, ...) chỉ có khi trích xuất kèm extra
+
+    # --- Giao diện kiểu dict ---
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in CORE_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extra.get(key, default) if self.extra else default
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        if key in CORE_FIELDS:
+            setattr(self, key, value)
+        elif self.extra is None:
+            self.extra = {key: value}
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self) -> List[str]:
+        names = ["title", "content"] if self.type is None else ["title", "content", "type"]
+        if self.extra:
+            names.extend(name for name in self.extra if name not in CORE_FIELDS)
+        return names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: self[name] for name in self.keys()}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ReviewRecord):
+            other = other.to_dict()
+        return isinstance(other, dict) and self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"ReviewRecord({self.to_dict()!r})"
+
+
+class ReviewColumns:
+    """Column-wise buffer of reviews with `type` stored as interned integer codes."""
+
+    __slots__ = ("titles", "contents", "type_codes", "type_labels", "_codes_by_label")
+
+    def __init__(self, records: Iterable[Any] = ()):
+        self.titles: List[str] = []
+        self.contents: List[str] = []
+        self.type_codes = array(TYPE_CODE_TYPECODE)
+        self.type_labels: List[str] = [] # Mã -> nhãn type
+        self._codes_by_label: Dict[str, int] = {}
+        self.extend(records)
+
+    def type_code(self, label: Optional[str]) -> int:
+        """Returns the code of a `type` label, assigning the next code to a new one."""
+        label = "N/A" if label is None else label
+        code = self._codes_by_label.get(label)
+        if code is None:
+            code = self._codes_by_label[label] = len(self.type_labels)
+            self.type_labels.append(label)
+        return code
+
+    def append(self, record: Any):
+        """Adds one ReviewRecord (or row dict); extra fields are not kept."""
+        self.titles.append(record.get("title"))
+        self.contents.append(record.get("content"))
+        self.type_codes.append(self.type_code(record.get("type")))
+
+    def extend(self, records: Iterable[Any]):
+        for record in records:
+            self.append(record)
+
+    def clear(self):
+        self.titles.clear()
+        self.contents.clear()
+        del self.type_codes[:]
+        self.type_labels.clear()
+        self._codes_by_label.clear()
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def __iter__(self) -> Iterator[ReviewRecord]:
+        labels = self.type_labels
+        for title, content, code in zip(self.titles, self.contents, self.type_codes):
+            yield ReviewRecord(title, content, labels[code])
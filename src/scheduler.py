@@ -0,0 +1,113 @@
+# scheduler.py
+"""
+Bộ lập lịch work-stealing cho các luồng worker (thay cho `url_queue`).
+
+- Mỗi worker có một deque riêng. Task ban đầu được sắp theo chi phí ước tính
+  (số review) giảm dần rồi chia vòng tròn, nên sản phẩm lớn nhất chạy trước và
+  đuôi của lần chạy không bị một sản phẩm lớn nằm cuối CSV kéo dài.
+- Worker hết việc lấy (steal) task lớn nhất từ deque còn nhiều việc nhất.
+- `get()` chờ trên Condition, không poll; khi mọi task xong, mỗi worker nhận một
+  sentinel (`None`) để thoát.
+"""
+import threading
+from collections import deque
+from typing import Any, Deque, Iterable, List, Optional, Tuple
+
+# --- Constants ---
+DEFAULT_TASK_COST = 20.0  # Chi phí (số review) ước tính khi không có thông tin gì
+
+_STOP = object()
+
+
+class WorkStealingScheduler:
+    """Per-worker deques with cost-ordered distribution, stealing and sentinel shutdown."""
+
+    def __init__(self, worker_count: int):
+        self.worker_count = max(1, worker_count)
+        self._deques: List[Deque[Tuple[float, Any]]] = [deque() for _ in range(self.worker_count)]
+        self._queued_cost = [0.0] * self.worker_count
+        self._cond = threading.Condition()
+        self._unfinished = 0
+        self._closed = False
+        self.steals = 0
+
+    # --- Nạp task ---
+    def submit_all(self, tasks: Iterable[Tuple[Any, float]]) -> int:
+        """Distributes (task, cost) pairs, largest cost first, round-robin over the workers."""
+        ordered = sorted(tasks, key=lambda item: item[1], reverse=True)
+        with self._cond:
+            for position, (task, cost) in enumerate(ordered):
+                self._push(position % self.worker_count, task, cost, front=False)
+            if self._unfinished == 0:
+                self._closed = True # Không có việc: worker nhận sentinel ngay
+            self._cond.notify_all()
+        return len(ordered)
+
+    def submit(self, task: Any, cost: float, worker_id: Optional[int] = None, front: bool = True):
+        """Adds one task, by default at the front of the submitting worker's deque (others may steal it)."""
+        with self._cond:
+            if worker_id is None:
+                worker_id = min(range(self.worker_count), key=lambda i: self._queued_cost[i])
+            self._push(worker_id, task, cost, front=front)
+            self._cond.notify_all()
+
+    def _push(self, worker_id: int, task: Any, cost: float, front: bool):
+        if front:
+            self._deques[worker_id].appendleft((cost, task))
+        else:
+            self._deques[worker_id].append((cost, task))
+        self._queued_cost[worker_id] += cost
+        self._unfinished += 1
+
+    # --- API cho worker ---
+    def get(self, worker_id: int) -> Optional[Any]:
+        """Blocks until a task is available; returns None once every task is finished (sentinel)."""
+        with self._cond:
+            while True:
+                item = self._take(worker_id)
+                if item is _STOP:
+                    return None
+                if item is not None:
+                    return item
+                self._cond.wait()
+
+    def task_done(self):
+        """Marks one task finished; the last one wakes every worker up with the sentinel."""
+        with self._cond:
+            self._unfinished -= 1
+            if self._unfinished <= 0:
+                self._closed = True
+                self._cond.notify_all()
+
+    def join(self):
+        """Blocks until every submitted task (including ones added while running) is finished."""
+        with self._cond:
+            while self._unfinished > 0:
+                self._cond.wait()
+
+    def close(self):
+        """Releases every waiting worker even if tasks remain (used on abort)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _take(self, worker_id: int) -> Any:
+        own = self._deques[worker_id]
+        if own:
+            cost, task = own.popleft()
+            self._queued_cost[worker_id] -= cost
+            return task
+        victim = max(range(self.worker_count), key=lambda i: self._queued_cost[i] if self._deques[i] else -1.0)
+        if self._deques[victim]:
+            # Lấy task lớn nhất của worker còn nhiều việc nhất để rút ngắn phần đuôi
+            cost, task = self._deques[victim].popleft()
+            self._queued_cost[victim] -= cost
+            self.steals += 1
+            return task
+        if self._closed:
+            return _STOP
+        return None
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(len(tasks) for tasks in self._deques)
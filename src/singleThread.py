@@ -3,14 +3,21 @@
 import pandas as pd
 import time
 import os
+import argparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
+from review_extraction import extract_reviews_batched, instrument_driver, commands_issued
+from page_events import expand_all_show_more, click_next_and_wait
+from tiki_selectors import REVIEWS_SECTION_ID, REVIEW_CONTAINER_CSS
+from review_journal import ReviewJournal, journal_path_for
+from columnar_writer import (FORMAT_CSV, FORMAT_PARQUET, OUTPUT_FORMATS, parquet_dir_for, require_pyarrow,
+                             write_parquet_dataset)
 
 # --- Đường dẫn thư mục ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Thư mục gốc của dự án
@@ -25,6 +32,12 @@ os.makedirs(LOGS_DIR, exist_ok=True)
 # --- Constants ---
 URL_FILE = os.path.join(DATA_DIR, "url_final.csv")  # Cập nhật đường dẫn
 OUTPUT_FILE = os.path.join(DATA_DIR, "raw_data.csv")  # Cập nhật đường dẫn
+JOURNAL_FILE = journal_path_for(OUTPUT_FILE)  # Journal append-only, mỗi URL một bản ghi
+OUTPUT_FORMAT = FORMAT_CSV  # "parquet": gộp journal thành dataset Parquet chia theo type (cần pyarrow)
+OUTPUT_COLUMNS = ['title', 'content', 'type']
+PAGE_LOAD_MAX_WAIT = 15  # Giây tối đa chờ trang sản phẩm tải xong
+REVIEWS_MAX_WAIT = 5  # Giây tối đa chờ review đầu tiên xuất hiện
+PAGE_TRANSITION_MAX_WAIT = 10  # Giây tối đa chờ sang trang review tiếp theo
 
 def setup_driver():
     chrome_options = Options()
@@ -39,74 +52,50 @@ def setup_driver():
         print(f"Using Chrome profile from {chrome_data_path}")
     
     driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+    instrument_driver(driver)
     return driver
 
 def click_show_more_buttons(driver):
-    try:
-        show_more_buttons = driver.find_elements(By.XPATH, "//span[@class='show-more-content' and text()='Xem thêm']")
-        for button in show_more_buttons:
-            try:
-                driver.execute_script("arguments[0].click();", button)
-                time.sleep(0.5)
-            except Exception:
-                pass
-    except Exception as e:
-        print(f"Error clicking show more buttons: {e}")
+    # Click tất cả nút "Xem thêm" trong một script, chỉ chờ tới khi nội dung mở rộng xong
+    expand_all_show_more(driver)
 
 def extract_review_data(driver):
-    reviews = []
-    try:
-        review_containers = driver.find_elements(By.CSS_SELECTOR, "div.review-comment")
-        
-        for container in review_containers:
-            try:
-                # Extract title
-                title = "N/A"
-                try:
-                    title_element = container.find_element(By.CSS_SELECTOR, "div.review-comment__title")
-                    title = title_element.text.strip()
-                except NoSuchElementException:
-                    pass
-                
-                # Extract content
-                content = "N/A"
-                try:
-                    content_element = container.find_element(By.CSS_SELECTOR, "div.review-comment__content")
-                    content = content_element.text.strip()
-                except NoSuchElementException:
-                    pass
-                
-                reviews.append({"title": title, "content": content})
-                
-            except Exception as e:
-                print(f"Error extracting review data: {e}")
-                continue
-                
-    except Exception as e:
-        print(f"Error finding review containers: {e}")
-    
-    return reviews
+    # Lấy toàn bộ review trên trang bằng một lần execute_script
+    return extract_reviews_batched(driver)
 
 def navigate_through_reviews(driver, url):
+    # Trả về (reviews, lỗi); có lỗi thì URL không được ghi vào journal để lần chạy sau thử lại
     all_reviews = []
+    error = None
     
     try:
         driver.get(url)
-        time.sleep(3)  # Wait for page to load
+        try:
+            WebDriverWait(driver, PAGE_LOAD_MAX_WAIT).until(EC.presence_of_element_located((By.TAG_NAME, "main")))
+        except TimeoutException:
+            print("Page did not finish loading in time, continuing anyway")
         
         # Scroll to reviews section
         try:
-            reviews_section = driver.find_element(By.ID, "productReviews")
+            reviews_section = WebDriverWait(driver, PAGE_LOAD_MAX_WAIT).until(
+                EC.presence_of_element_located((By.ID, REVIEWS_SECTION_ID))
+            )
             driver.execute_script("arguments[0].scrollIntoView();", reviews_section)
-            time.sleep(2)
-        except NoSuchElementException:
+        except TimeoutException:
             print("Reviews section not found, scrolling down anyway")
             driver.execute_script("window.scrollBy(0, 800);")
-            time.sleep(2)
+        try:
+            # Chờ review đầu tiên xuất hiện thay vì sleep cố định
+            WebDriverWait(driver, REVIEWS_MAX_WAIT).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, REVIEW_CONTAINER_CSS))
+            )
+        except TimeoutException:
+            print("No reviews appeared on the page")
         
         page_num = 1
         while True:
             print(f"Processing review page {page_num}")
+            page_commands_start = commands_issued(driver)
             
             # Click on any "Show more" buttons to expand review content
             click_show_more_buttons(driver)
@@ -115,35 +104,42 @@ def navigate_through_reviews(driver, url):
             page_reviews = extract_review_data(driver)
             if page_reviews:
                 all_reviews.extend(page_reviews)
-                print(f"Extracted {len(page_reviews)} reviews from page {page_num}")
+                print(f"Extracted {len(page_reviews)} reviews from page {page_num} "
+                      f"({commands_issued(driver) - page_commands_start} WebDriver commands)")
             
-            # Find and click the next page button
+            # Find and click the next page button, then wait for the review list to change
             try:
-                next_button = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, "a.btn.next"))
-                )
-                
-                # Check if the next button is disabled
-                if next_button.get_attribute("class") and "disabled" in next_button.get_attribute("class"):
+                transition = click_next_and_wait(driver, max_wait=PAGE_TRANSITION_MAX_WAIT)
+                if not transition["clicked"]:
                     print("Reached last page")
                     break
-                
-                driver.execute_script("arguments[0].click();", next_button)
-                time.sleep(2)  # Wait for next page to load
+                if not transition["changed"]:
+                    print("Next page did not load in time, stopping")
+                    break
                 page_num += 1
-            except (TimeoutException, StaleElementReferenceException):
+            except TimeoutException:
                 print("No next button found or reached last page")
                 break
             except Exception as e:
                 print(f"Error navigating to next page: {e}")
+                error = f"next page: {e}"
                 break
     
     except Exception as e:
         print(f"Error processing URL {url}: {e}")
+        error = str(e)
     
-    return all_reviews
+    return all_reviews, error
+
+def process_urls_and_save_reviews(fresh=False, output_format=OUTPUT_FORMAT):
+    # fresh=True bỏ journal của lần chạy trước và thu thập lại mọi URL
+    if output_format == FORMAT_PARQUET:
+        try:
+            require_pyarrow()
+        except ImportError as e:
+            print(f"Error: {e}")
+            return
 
-def process_urls_and_save_reviews():
     # Check if url_final.csv exists
     if not os.path.exists(URL_FILE):
         print(f"Error: {URL_FILE} file not found")
@@ -167,25 +163,47 @@ def process_urls_and_save_reviews():
     if not url_column:
         print(f"Error: Could not find URL column in {URL_FILE}")
         return
+    # Cột detail (nếu có) thành cột type của review, dùng để chia partition khi ghi Parquet
+    detail_column = "detail" if "detail" in urls_df.columns else None
+    
+    # Journal giữ các URL đã xử lý từ lần chạy trước (nếu bị dừng giữa chừng)
+    journal = ReviewJournal(JOURNAL_FILE)
+    if fresh and len(journal):
+        print(f"Starting fresh: discarding {len(journal)} URLs recorded in {JOURNAL_FILE}")
+        journal.reset()
+    processed_urls = journal.processed_urls()
+    if processed_urls:
+        print(f"Resuming from {JOURNAL_FILE}: {len(processed_urls)} URLs already processed, "
+              f"{journal.review_count()} reviews")
     
     driver = setup_driver()
-    all_reviews = []
+    failed_urls = 0
+    finished = False
     
     try:
         # Process each URL
         for index, row in urls_df.iterrows():
             url = row[url_column]
+            if url in processed_urls:
+                continue
             print(f"\nProcessing URL {index+1}/{len(urls_df)}: {url}")
             
-            reviews = navigate_through_reviews(driver, url)
-            all_reviews.extend(reviews)
+            reviews, error = navigate_through_reviews(driver, url)
+            if error is not None:
+                # Lỗi tạm thời (timeout, mất kết nối...): không ghi journal để lần chạy sau thử lại URL này
+                failed_urls += 1
+                print(f"Failed URL {index+1}/{len(urls_df)}, will retry on the next run: {error}")
+                continue
+            if detail_column is not None:
+                detail = "N/A" if pd.isna(row[detail_column]) else str(row[detail_column])
+                for review in reviews:
+                    review.type = detail
             
-            # Save intermediate results after each URL
-            reviews_df = pd.DataFrame(all_reviews)
-            temp_output = os.path.join(DATA_DIR, f"raw_data_temp_{index+1}.csv")
-            reviews_df.to_csv(temp_output, index=False)
+            # Chỉ ghi thêm review mới của URL này vào journal (không ghi lại toàn bộ dữ liệu)
+            journal.append(url, reviews)
             
-            print(f"Processed URL {index+1}/{len(urls_df)}. Total reviews so far: {len(all_reviews)}")
+            print(f"Processed URL {index+1}/{len(urls_df)}. Total reviews so far: {journal.review_count()}")
+        finished = True
     
     except Exception as e:
         print(f"Error during processing: {e}")
@@ -194,15 +212,36 @@ def process_urls_and_save_reviews():
         driver.quit()
         
         # Save final results
-        if all_reviews:
-            reviews_df = pd.DataFrame(all_reviews)
-            reviews_df.to_csv(OUTPUT_FILE, index=False)
-            print(f"All done! Extracted {len(all_reviews)} reviews and saved to {OUTPUT_FILE}")
+        total_reviews = journal.review_count()
+        if total_reviews and output_format == FORMAT_PARQUET:
+            output_dir = parquet_dir_for(OUTPUT_FILE)
+            write_parquet_dataset((review for _, rows in journal.records() for review in rows), output_dir,
+                                  OUTPUT_COLUMNS)
+            print(f"All done! Extracted {total_reviews} reviews and saved to {output_dir}")
+        elif total_reviews:
+            journal.compact(OUTPUT_FILE)
+            print(f"All done! Extracted {total_reviews} reviews and saved to {OUTPUT_FILE}")
         else:
             print("No reviews extracted")
+        if finished and not failed_urls:
+            # Mọi URL đã xong và đã gộp vào output: xoá journal để lần chạy sau thu thập lại từ đầu
+            journal.reset()
+            print(f"Journal {JOURNAL_FILE} cleared after a complete run")
+        elif failed_urls:
+            print(f"{failed_urls} URLs failed; run again to retry them (journal kept in {JOURNAL_FILE})")
+        journal.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single-threaded Tiki review scraper.")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Discard the journal of an unfinished earlier run and start over instead of resuming.")
+    parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                        help="'parquet' compacts the journal into a type-partitioned Parquet dataset "
+                             f"('{parquet_dir_for(OUTPUT_FILE)}') instead of the CSV; needs pyarrow.")
+    args = parser.parse_args()
+
     print(f"Data directory: {DATA_DIR}")
     print(f"Input file: {URL_FILE}")
     print(f"Output file: {OUTPUT_FILE}")
-    process_urls_and_save_reviews()
\ No newline at end of file
+    print(f"Journal file: {JOURNAL_FILE} (watch with: python review_journal.py {JOURNAL_FILE} --follow)")
+    process_urls_and_save_reviews(fresh=args.fresh, output_format=args.output_format)
\ No newline at end of file
@@ -0,0 +1,210 @@
+# snapshot_archive.py
+"""
+Kho lưu HTML của từng trang review để trích xuất lại offline, không cần crawl lại.
+
+Khi bật chế độ capture, sau khi mở hết "Xem thêm" mỗi trang review, outerHTML của
+widget review (`#customer-review-widget-id`) được lưu:
+  - blob nén zlib, đặt tên theo blake2b của nội dung (`objects/ab/cdef...`), nên
+    HTML trùng nhau chỉ lưu một lần;
+  - chỉ mục SQLite `index.sqlite`: (product_id, spid, page) -> url, type, digest.
+
+Khi cần thêm trường mới hoặc selector bị đổi, chạy lại bộ trích xuất trên toàn
+bộ kho bằng tất cả CPU:
+    python snapshot_archive.py reparse data/snapshots data/raw_data_reparsed.csv
+    python snapshot_archive.py stats data/snapshots
+"""
+import argparse
+import csv
+import hashlib
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from review_extraction import PARSER_BACKENDS, extract_reviews_from_html
+from url_canonicalizer import product_key
+
+# --- Constants ---
+SNAPSHOT_COMPRESSION_LEVEL = 6  # Mức nén zlib (HTML nén được khoảng 8-10 lần)
+INDEX_FILE_NAME = "index.sqlite"
+OBJECTS_DIR_NAME = "objects"
+REPARSE_CHUNK_SIZE = 16  # Số snapshot giao cho mỗi tiến trình con một lần
+REPARSE_COLUMNS = ["title", "content", "type"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    product_id TEXT NOT NULL,
+    spid TEXT NOT NULL DEFAULT '',
+    page INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    detail TEXT,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    captured_at REAL,
+    PRIMARY KEY (product_id, spid, page)
+);
+"""
+
+
+def snapshot_digest(html: str) -> str:
+    return hashlib.blake2b(html.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SnapshotArchive:
+    """Thread-safe, content-addressed store of compressed review-page HTML indexed by product and page."""
+
+    def __init__(self, root: str, compression_level: int = SNAPSHOT_COMPRESSION_LEVEL):
+        self.root = root
+        self.compression_level = compression_level
+        self.objects_dir = os.path.join(root, OBJECTS_DIR_NAME)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, INDEX_FILE_NAME), check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    # --- Ghi ---
+    def capture(self, url: str, page: int, html: str, detail: Optional[str] = None) -> Optional[str]:
+        """Stores one page's HTML (deduplicated by content) and indexes it; returns its digest."""
+        key = product_key(url)
+        if key is None or not html:
+            return None
+        digest = snapshot_digest(html)
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as handle:
+                handle.write(zlib.compress(html.encode("utf-8"), self.compression_level))
+            os.replace(temp_path, path) # Ghi nguyên tử: blob luôn đầy đủ hoặc chưa có
+        product_id, spid = key
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshots (product_id, spid, page, url, detail, digest, size, captured_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (product_id, spid or "", page, url, detail, digest, len(html), time.time()),
+            )
+        return digest
+
+    # --- Đọc ---
+    def load(self, digest: str) -> str:
+        return load_object(self.object_path(digest))
+
+    def entries(self) -> List[Tuple[str, str, int, str, Optional[str], str]]:
+        """Returns (product_id, spid, page, url, detail, digest) for every snapshot, in product/page order."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT product_id, spid, page, url, detail, digest FROM snapshots "
+                "ORDER BY product_id, spid, page"
+            ).fetchall()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pages, products, objects, html_bytes = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT product_id || '/' || spid), COUNT(DISTINCT digest), "
+                "COALESCE(SUM(size), 0) FROM snapshots"
+            ).fetchone()
+        stored_bytes = 0
+        for directory, _, files in os.walk(self.objects_dir):
+            stored_bytes += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+        return {"pages": pages, "products": products, "objects": objects,
+                "html_bytes": html_bytes, "stored_bytes": stored_bytes}
+
+
+def load_object(path: str) -> str:
+    with open(path, "rb") as handle:
+        return zlib.decompress(handle.read()).decode("utf-8")
+
+
+# --- Trích xuất lại offline ---
+def _reparse_one(job: Tuple[str, Optional[str], bool, Optional[str]]) -> List[Dict[str, str]]:
+    path, detail, include_extra, backend = job
+    try:
+        rows = extract_reviews_from_html(load_object(path), include_extra=include_extra, backend=backend)
+    except (OSError, zlib.error, UnicodeDecodeError) as e:
+        logging.error(f"Could not read snapshot {path}: {e}")
+        return []
+    for row in rows:
+        row.type = detail if detail is not None else "N/A"
+    return rows
+
+
+def iter_reparsed_rows(archive: SnapshotArchive, workers: Optional[int] = None, include_extra: bool = False,
+                       backend: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """Re-extracts every archived page on a process pool, yielding rows in product/page order."""
+    jobs = [(archive.object_path(digest), detail, include_extra, backend)
+            for _, _, _, _, detail, digest in archive.entries()]
+    if not jobs:
+        return
+    with multiprocessing.Pool(processes=workers or os.cpu_count()) as pool:
+        for rows in pool.imap(_reparse_one, jobs, chunksize=REPARSE_CHUNK_SIZE):
+            yield from rows
+
+
+def reparse_archive(archive_root: str, output_file: str, workers: Optional[int] = None,
+                    include_extra: bool = False, backend: Optional[str] = None) -> int:
+    """Writes the re-extracted reviews of a whole archive to `output_file`; returns the row count."""
+    archive = SnapshotArchive(archive_root)
+    columns = list(REPARSE_COLUMNS)
+    count = 0
+    temp_file = output_file + ".tmp"
+    try:
+        rows = iter_reparsed_rows(archive, workers, include_extra, backend)
+        with open(temp_file, "w", newline="", encoding="utf-8-sig") as handle:
+            if include_extra:
+                # Các cột phụ chỉ biết sau khi trích xuất: gom hết rồi mới ghi
+                rows = list(rows)
+                columns += sorted({name for row in rows for name in row} - set(columns))
+            writer = csv.DictWriter(handle, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        os.replace(temp_file, output_file)
+    finally:
+        archive.close()
+    return count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Inspect or re-extract an archive of review-page snapshots.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    reparse_parser = subparsers.add_parser("reparse", help="Run the offline extractor over every snapshot.")
+    reparse_parser.add_argument("archive", help="Archive directory (e.g. data/snapshots).")
+    reparse_parser.add_argument("output", help="CSV file to write.")
+    reparse_parser.add_argument("--workers", type=int, default=None, help="Processes to use (default: all cores).")
+    reparse_parser.add_argument("--extra", action="store_true",
+                                help="Also write the other review-comment__* fields (author, date, ...).")
+    reparse_parser.add_argument("--parser", choices=PARSER_BACKENDS, default=None,
+                                help="HTML parser backend (default: fastest installed).")
+    stats_parser = subparsers.add_parser("stats", help="Show archive size and deduplication.")
+    stats_parser.add_argument("archive")
+    args = parser.parse_args()
+
+    if args.command == "reparse":
+        started = time.time()
+        total = reparse_archive(args.archive, args.output, workers=args.workers, include_extra=args.extra,
+                                backend=args.parser)
+        logging.info(f"Re-extracted {total} reviews into '{args.output}' in {time.time() - started:.1f}s.")
+    else:
+        archive = SnapshotArchive(args.archive)
+        stats = archive.stats()
+        archive.close()
+        ratio = stats["html_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+        print(f"{stats['pages']} pages of {stats['products']} products in {stats['objects']} objects; "
+              f"{stats['html_bytes'] / 1024:.0f} KiB of HTML stored in {stats['stored_bytes'] / 1024:.0f} KiB "
+              f"({ratio:.1f}x)")
@@ -0,0 +1,12 @@
+# tiki_selectors.py
+"""Selector dùng chung cho các trang sản phẩm Tiki (đường Selenium và các parser offline)."""
+
+REVIEWS_SECTION_ID = "customer-review-widget-id" 
+REVIEW_CONTAINER_CSS = "div.review-comment"
+REVIEW_TITLE_CSS = "div.review-comment__title"
+REVIEW_CONTENT_CSS = "div.review-comment__content"
+SHOW_MORE_CONTENT_CSS = "span.show-more-content" 
+NEXT_PAGE_BUTTON_CSS = "a.btn.next:not(.disabled)" 
+REVIEW_FIELD_CLASS_PREFIX = "review-comment__" # Các trường khác của review (tác giả, ngày, ...)
+REVIEW_SORT_OPTION_CSS = "div.filter-review__item" # Các nút lọc/sắp xếp phía trên danh sách review
+REVIEW_SORT_NEWEST_LABEL = "Mới nhất"
@@ -0,0 +1,197 @@
+# url_canonicalizer.py
+"""
+Chuẩn hoá và lọc URL trước khi đưa vào hàng đợi crawl.
+
+- Sửa lỗi scheme (`ttps://`, `htps://`, `https//`, thiếu scheme...).
+- URL tracking (`tka.tiki.vn/pixel/pixel?data=...`) được giải bằng cách đi theo
+  redirect qua HTTP (không cần trình duyệt); không giải được thì bị loại.
+- Mỗi sản phẩm được quy về khoá (product id, spid) và URL chuẩn
+  `https://tiki.vn/<slug>-p<id>.html?spid=<spid>`; sản phẩm xuất hiện ở nhiều danh
+  mục chỉ được giữ lần đầu.
+- Báo cáo số URL đã sửa / giải / loại và lý do.
+"""
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from http_engine import PRODUCT_ID_PATTERN, HTTP_TIMEOUT, USER_AGENT
+
+# --- Constants ---
+PRODUCT_HOSTS = {"tiki.vn", "www.tiki.vn"}
+TRACKING_HOSTS = {"tka.tiki.vn", "tracking.tiki.vn"}
+REDIRECT_PARAM_NAMES = ("redirect", "redirect_url", "url", "u", "target")  # Tham số có thể chứa URL đích
+RESOLVER_THREADS = 16  # Số request giải URL tracking chạy song song
+MAX_REPORTED_EXAMPLES = 5  # Số ví dụ ghi log cho mỗi lý do bị loại
+
+_SCHEME_PREFIX = re.compile(r"^h?t?t?p?s?(?::/*|/{2,})", re.IGNORECASE)
+_VALID_SCHEME = re.compile(r"^https?://", re.IGNORECASE)
+
+# Lý do bị loại
+DROP_EMPTY = "empty"
+DROP_NOT_PRODUCT = "not a product URL"
+DROP_FOREIGN_HOST = "foreign host"
+DROP_UNRESOLVED_TRACKER = "unresolved tracking URL"
+DROP_DUPLICATE = "duplicate product"
+
+
+def repair_scheme(url: str) -> str:
+    """Fixes truncated or misspelled schemes (`ttps://x` -> `https://x`, `tiki.vn/x` -> `https://tiki.vn/x`)."""
+    url = url.strip()
+    if _VALID_SCHEME.match(url):
+        return url
+    return "https://" + _SCHEME_PREFIX.sub("", url, count=1)
+
+
+def product_key(url: str) -> Optional[Tuple[str, Optional[str]]]:
+    """Returns the (product_id, spid) identity of a product URL, or None."""
+    parsed = urlparse(url)
+    match = PRODUCT_ID_PATTERN.search(parsed.path)
+    if not match:
+        return None
+    spid_values = parse_qs(parsed.query).get("spid")
+    spid = spid_values[0] if spid_values and spid_values[0].isdigit() else None
+    return match.group(1), spid
+
+
+def canonical_product_url(url: str) -> str:
+    """Drops everything but the path and `spid` (tracking params, fragments) from a product URL."""
+    parsed = urlparse(url)
+    key = product_key(url)
+    canonical = f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{parsed.path}"
+    if key and key[1]:
+        canonical += f"?spid={key[1]}"
+    return canonical
+
+
+def embedded_redirect(url: str) -> Optional[str]:
+    """Returns a destination URL carried in a tracking URL's query string, if any."""
+    query = parse_qs(urlparse(url).query)
+    for name in REDIRECT_PARAM_NAMES:
+        for value in query.get(name, []):
+            if value.lower().startswith(("http://", "https://")):
+                return value
+    return None
+
+
+class TrackingResolver:
+    """Resolves tracking wrappers by following their HTTP redirects (results are cached)."""
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, threads: int = RESOLVER_THREADS):
+        self.timeout = timeout
+        self.threads = threads
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        self._cache: Dict[str, Optional[str]] = {}
+
+    def resolve(self, url: str) -> Optional[str]:
+        if url in self._cache:
+            return self._cache[url]
+        destination = embedded_redirect(url)
+        if destination is None:
+            try:
+                # stream=True: chỉ cần URL cuối cùng sau redirect, không tải body
+                with self.session.get(url, allow_redirects=True, stream=True, timeout=self.timeout) as response:
+                    if response.url != url:
+                        destination = response.url
+            except requests.RequestException as e:
+                logging.debug(f"Could not resolve tracking URL {url[:80]}...: {e}")
+        self._cache[url] = destination
+        return destination
+
+    def resolve_many(self, urls: List[str]) -> Dict[str, Optional[str]]:
+        pending = [url for url in dict.fromkeys(urls) if url not in self._cache]
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.threads) as pool:
+                list(pool.map(self.resolve, pending))
+        return {url: self._cache.get(url) for url in urls}
+
+    def close(self):
+        self.session.close()
+
+
+class CanonicalizationReport:
+    """Counts of what the canonicalization stage changed or removed."""
+
+    def __init__(self):
+        self.total = 0
+        self.kept = 0
+        self.schemes_repaired = 0
+        self.trackers_resolved = 0
+        self.dropped: Dict[str, List[str]] = {}
+
+    def drop(self, reason: str, url: str):
+        self.dropped.setdefault(reason, []).append(url)
+
+    def dropped_count(self) -> int:
+        return sum(len(urls) for urls in self.dropped.values())
+
+    def log(self):
+        logging.info(f"URL canonicalization: {self.total} input rows -> {self.kept} products "
+                     f"({self.schemes_repaired} schemes repaired, {self.trackers_resolved} tracking URLs resolved, "
+                     f"{self.dropped_count()} removed).")
+        for reason, urls in self.dropped.items():
+            examples = ", ".join(url[:100] for url in urls[:MAX_REPORTED_EXAMPLES])
+            logging.info(f"  Removed {len(urls)} ({reason}), e.g.: {examples}")
+
+
+def canonicalize_tasks(tasks: Iterable[Tuple[str, str]], resolver: Optional[TrackingResolver] = None,
+                       extra_hosts: Iterable[str] = ()) -> Tuple[List[Tuple[str, str]], CanonicalizationReport]:
+    """Repairs, resolves, canonicalizes and deduplicates (url, detail) tasks.
+
+    Products are accepted on tiki.vn and on `extra_hosts` (e.g. a local test server).
+    Without a resolver, tracking URLs whose destination is not embedded are dropped.
+    """
+    report = CanonicalizationReport()
+    allowed_hosts: Set[str] = PRODUCT_HOSTS | {host.lower() for host in extra_hosts}
+
+    repaired: List[Tuple[str, str]] = []
+    for raw_url, detail in tasks:
+        report.total += 1
+        raw_url = str(raw_url or "").strip()
+        if not raw_url:
+            report.drop(DROP_EMPTY, raw_url)
+            continue
+        url = repair_scheme(raw_url)
+        if url != raw_url:
+            report.schemes_repaired += 1
+        repaired.append((url, detail))
+
+    trackers = [url for url, _ in repaired if urlparse(url).netloc.lower() in TRACKING_HOSTS]
+    destinations: Dict[str, Optional[str]] = {}
+    if trackers:
+        if resolver is not None:
+            logging.info(f"Resolving {len(trackers)} tracking URLs over HTTP...")
+            destinations = resolver.resolve_many(trackers)
+        else:
+            destinations = {url: embedded_redirect(url) for url in trackers}
+
+    seen: Set[Tuple[str, Optional[str]]] = set()
+    clean: List[Tuple[str, str]] = []
+    for url, detail in repaired:
+        host = urlparse(url).netloc.lower()
+        if host in TRACKING_HOSTS:
+            destination = destinations.get(url)
+            if not destination:
+                report.drop(DROP_UNRESOLVED_TRACKER, url)
+                continue
+            report.trackers_resolved += 1
+            url, host = destination, urlparse(destination).netloc.lower()
+        if host not in allowed_hosts:
+            report.drop(DROP_FOREIGN_HOST, url)
+            continue
+        key = product_key(url)
+        if key is None:
+            report.drop(DROP_NOT_PRODUCT, url)
+            continue
+        if key in seen:
+            report.drop(DROP_DUPLICATE, url)
+            continue
+        seen.add(key)
+        clean.append((canonical_product_url(url), detail))
+
+    report.kept = len(clean)
+    return clean, report
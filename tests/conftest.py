@@ -0,0 +1,8 @@
+# conftest.py
+"""Các script nằm phẳng trong `src/` và import lẫn nhau theo tên module, nên test cũng vậy."""
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
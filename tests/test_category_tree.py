@@ -0,0 +1,142 @@
+# test_category_tree.py
+"""Cây danh mục: lần chạy sau chỉ gọi API cho nút mới/đổi/quá hạn, nút biến mất bị tắt, số thứ tự type ổn định."""
+import copy
+import csv
+
+import pytest
+
+from category_tree import (CategoryFetchError, CategoryIndex, CategoryNode, discover_category_tree, legacy_type_order,
+                           write_category_file)
+
+TREE = {
+    2: [{"id": 8322, "url_key": "nha-sach-tiki", "name": "Nhà Sách"}, {"id": 1883, "url_key": "nha-cua"}],
+    8322: [{"id": 10, "url_key": "sach", "is_leaf": True}, {"id": 11, "url_key": "van-phong-pham"}],
+    11: [{"id": 12, "url_key": "but", "is_leaf": True}],
+    1883: [{"id": 20, "url_key": "bep", "is_leaf": True}],
+}
+
+
+class FakeFetcher:
+    """Serves children from a dict and records which parents were requested."""
+
+    def __init__(self, tree, failing=()):
+        self.tree = copy.deepcopy(tree)
+        self.failing = set(failing)
+        self.calls = []
+
+    def fetch_children(self, parent_id):
+        self.calls.append(parent_id)
+        if parent_id in self.failing:
+            raise CategoryFetchError(f"parent {parent_id} unavailable")
+        return self.tree.get(parent_id, [])
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = CategoryIndex(str(tmp_path / "category_index.sqlite"))
+    yield index
+    index.close()
+
+
+def crawl(index, fetcher, **kwargs):
+    stats = discover_category_tree(index, fetcher, workers=2, **kwargs)
+    return stats, [node.id for node in index.crawl_units(stats["started"])]
+
+
+def test_first_run_expands_every_inner_node(index):
+    fetcher = FakeFetcher(TREE)
+    stats, leaves = crawl(index, fetcher)
+    assert sorted(fetcher.calls) == [2, 11, 1883, 8322]
+    assert leaves == [10, 12, 20]
+    assert stats["new"] == 6
+    assert len(index) == 6
+
+
+def test_unchanged_tree_is_reused_from_the_index(index):
+    crawl(index, FakeFetcher(TREE))
+    fetcher = FakeFetcher(TREE)
+    stats, leaves = crawl(index, fetcher)
+    assert fetcher.calls == [2] # Chỉ gốc được gọi lại để phát hiện danh mục cấp 1 mới
+    assert stats["reused"] == 3
+    assert leaves == [10, 12, 20]
+
+
+def test_only_changed_new_or_stale_branches_are_expanded(index):
+    crawl(index, FakeFetcher(TREE))
+    tree = copy.deepcopy(TREE)
+    tree[2][0]["name"] = "Sách"
+    tree[2].append({"id": 99999, "url_key": "moi"})
+    tree[99999] = [{"id": 30, "url_key": "moi-la", "is_leaf": True}]
+    fetcher = FakeFetcher(tree)
+    stats, leaves = crawl(index, fetcher)
+    assert sorted(fetcher.calls) == [2, 8322, 99999] # Nhánh 11 không đổi: lấy từ chỉ mục
+    assert (stats["new"], stats["changed"]) == (2, 1)
+    assert leaves == [10, 12, 20, 30]
+
+    fetcher = FakeFetcher(tree)
+    crawl(index, fetcher, refresh_after=-1)
+    assert sorted(fetcher.calls) == [2, 11, 1883, 8322, 99999]
+    fetcher = FakeFetcher(tree)
+    crawl(index, fetcher, full=True)
+    assert len(fetcher.calls) == 5
+
+
+def test_children_no_longer_listed_are_deactivated(index):
+    crawl(index, FakeFetcher(TREE))
+    tree = copy.deepcopy(TREE)
+    tree[8322] = [{"id": 10, "url_key": "sach", "is_leaf": True}]
+    _, leaves = crawl(index, FakeFetcher(tree), full=True)
+    assert index.lookup(11) is None
+    assert [node.id for node in index.children(8322)] == [10]
+    assert leaves == [10, 20]
+
+
+def test_mark_expanded_keeps_listed_children_only(index):
+    for node in (CategoryNode(1, "cap-1", "", 2, 1, False), CategoryNode(5, "a", "", 1, 2, True),
+                 CategoryNode(6, "b", "", 1, 2, True)):
+        index.upsert(node, 100.0)
+    index.mark_expanded(1, [6], 200.0)
+    assert [node.id for node in index.children(1)] == [6]
+    assert index.lookup(1)[1] == 200.0
+    index.mark_expanded(1, [], 300.0)
+    assert index.children(1) == []
+    # Nút được liệt kê lại thì hoạt động trở lại
+    index.upsert(CategoryNode(5, "a", "", 1, 2, True), 400.0)
+    assert [node.id for node in index.children(1)] == [5]
+
+
+def test_failed_expansion_reuses_indexed_children(index):
+    crawl(index, FakeFetcher(TREE))
+    stats, leaves = crawl(index, FakeFetcher(TREE, failing={8322}), full=True)
+    assert stats["failed"] == 1
+    assert leaves == [10, 12, 20]
+
+
+def test_type_indexes_follow_the_legacy_order_and_number_new_top_levels_after(index, tmp_path):
+    legacy_file = tmp_path / "urls.csv"
+    legacy_file.write_text("URL\nhttps://tiki.vn/nha-cua/c1883\nhttps://tiki.vn/nha-sach-tiki/c8322\n"
+                           "https://tiki.vn/khong-con/c777\n", encoding="utf-8")
+    assert legacy_type_order(str(legacy_file)) == [1883, 8322, 777]
+    assert index.seed_type_indexes(legacy_type_order(str(legacy_file))) == 3
+    assert index.seed_type_indexes([8322, 1883]) == 0 # Đã có số thứ tự: không đánh lại
+
+    tree = copy.deepcopy(TREE)
+    tree[2].append({"id": 99999, "url_key": "moi"})
+    tree[99999] = [{"id": 30, "url_key": "moi-la", "is_leaf": True}]
+    stats = discover_category_tree(index, FakeFetcher(tree), workers=2)
+    nodes = index.crawl_units(stats["started"])
+    assert index.type_indexes(nodes) == {10: 1, 12: 1, 20: 0, 30: 3}
+    assert index.type_indexes(index.crawl_units(stats["started"], top_level=True)) == {1883: 0, 8322: 1, 99999: 3}
+
+    write_category_file(nodes, str(legacy_file), index.type_indexes(nodes), base_url="https://tiki.vn")
+    with open(legacy_file, newline="", encoding="utf-8-sig") as handle:
+        rows = list(csv.DictReader(handle))
+    assert [(row["URL"], row["detail"]) for row in rows] == [
+        ("https://tiki.vn/sach/c10", "1"), ("https://tiki.vn/but/c12", "1"),
+        ("https://tiki.vn/bep/c20", "0"), ("https://tiki.vn/moi-la/c30", "3")]
+    assert legacy_type_order(str(legacy_file)) == [] # File do chỉ mục ghi không được dùng để đánh số lại
+
+
+def test_type_indexes_without_legacy_file_number_by_id(index):
+    stats = discover_category_tree(index, FakeFetcher(TREE), workers=2)
+    assert index.type_indexes(index.crawl_units(stats["started"])) == {10: 1, 12: 1, 20: 0}
@@ -0,0 +1,68 @@
+# test_columnar_writer.py
+"""ColumnarResultWriter: checkpoint chỉ chạy khi file Parquet chứa các dòng đã được đổi tên khỏi `.tmp`."""
+import glob
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from columnar_writer import ColumnarResultWriter, dataset_files, read_reviews, remove_stale_parts
+
+COLUMNS = ["title", "content", "type"]
+
+
+def rows(count: int, review_type: str = "0"):
+    return [{"title": "t", "content": f"c{i}", "type": review_type} for i in range(count)]
+
+
+def test_callbacks_wait_for_the_part_to_be_committed(tmp_path):
+    root = str(tmp_path / "raw_data_parquet")
+    durable = threading.Event()
+    writer = ColumnarResultWriter(root, COLUMNS, file_seconds=3600)
+    writer.fsync_interval = 0.05
+    writer.start()
+    writer.submit(rows(3), on_durable=durable.set)
+    # Dòng đã nằm trong file .tmp nhưng file chưa đóng: chưa được checkpoint
+    assert not durable.wait(0.5)
+    assert glob.glob(os.path.join(root, "type=0", "*.tmp"))
+    writer.close()
+    assert durable.is_set()
+    assert len(read_reviews(root)) == 3
+
+
+def test_parts_are_committed_periodically(tmp_path):
+    root = str(tmp_path / "raw_data_parquet")
+    durable = threading.Event()
+    writer = ColumnarResultWriter(root, COLUMNS, file_seconds=0.1)
+    writer.fsync_interval = 0.05
+    writer.start()
+    writer.submit(rows(2, "1") + rows(2, "2"), on_durable=durable.set)
+    assert durable.wait(5)
+    assert len(dataset_files(root)) == 2
+    writer.close()
+
+
+def test_stale_parts_are_removed(tmp_path):
+    root = str(tmp_path / "raw_data_parquet")
+    os.makedirs(os.path.join(root, "type=0"))
+    open(os.path.join(root, "type=0", "part-x-00001.parquet.tmp"), "wb").close()
+    assert remove_stale_parts(root) == 1
+    assert not glob.glob(os.path.join(root, "type=0", "*"))
+
+
+def test_close_commits_the_other_parts_when_one_fails(tmp_path):
+    from columnar_writer import ParquetDatasetWriter
+
+    root = str(tmp_path / "raw_data_parquet")
+    writer = ParquetDatasetWriter(root, COLUMNS, file_seconds=float("inf"))
+    writer.write_rows(rows(2, "1") + rows(2, "2") + rows(2, "3"))
+    # Đích đổi tên của partition "2" là một thư mục không rỗng: os.replace thất bại
+    blocked = writer._parts["2"].final_path
+    os.makedirs(os.path.join(blocked, "keep"))
+    with pytest.raises(OSError):
+        writer.close()
+    assert writer._parts == {}
+    committed = [path for path in dataset_files(root) if os.path.isfile(path)]
+    assert sorted(os.path.basename(os.path.dirname(path)) for path in committed) == ["type=1", "type=3"]
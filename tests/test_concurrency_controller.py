@@ -0,0 +1,108 @@
+# test_concurrency_controller.py
+"""ConcurrencyController: tăng từng worker khi mọi slot bận, giảm theo hệ số khi quá tải, luôn trong [min, max]."""
+import threading
+from typing import Optional
+
+import pytest
+
+import concurrency_controller
+from concurrency_controller import DECREASE_FACTOR, ConcurrencyController
+
+
+@pytest.fixture
+def machine(monkeypatch):
+    """Lets a test set the CPU and free memory the controller sees (idle machine by default)."""
+    load = {"cpu": 10.0, "free_mb": 8192.0}
+    monkeypatch.setattr(concurrency_controller, "cpu_percent", lambda: load["cpu"])
+    monkeypatch.setattr(concurrency_controller, "free_memory_mb", lambda: load["free_mb"])
+    return load
+
+
+def run_window(controller: ConcurrencyController, latency: float, tasks: Optional[int] = None, timed_out: int = 0) -> int:
+    """Fills every slot, finishes the tasks with the given latency and runs one adjustment."""
+    tasks = controller.limit if tasks is None else tasks
+    for _ in range(tasks):
+        assert controller.acquire(timeout=0)
+    for index in range(tasks):
+        controller.release(latency, timed_out=index < timed_out)
+    return controller.adjust()
+
+
+def test_limit_starts_clamped_to_bounds(machine):
+    assert ConcurrencyController(2, 8).limit == 8
+    assert ConcurrencyController(2, 8, initial=1).limit == 2
+    assert ConcurrencyController(2, 8, initial=20).limit == 8
+    assert ConcurrencyController(0, 0).limit == 1
+
+
+def test_acquire_blocks_beyond_the_limit(machine):
+    controller = ConcurrencyController(1, 4, initial=2)
+    assert controller.acquire(timeout=0)
+    assert controller.acquire(timeout=0)
+    assert not controller.acquire(timeout=0.05)
+    controller.release(0.1)
+    assert controller.acquire(timeout=0)
+
+
+def test_saturated_and_healthy_adds_one_worker(machine):
+    controller = ConcurrencyController(1, 6, initial=3)
+    assert run_window(controller, 0.5) == 4
+    assert run_window(controller, 0.5) == 5
+    assert run_window(controller, 0.5) == 6
+    assert run_window(controller, 0.5) == 6
+    assert [limit for _, limit, _ in controller.history] == [4, 5, 6]
+
+
+def test_idle_slots_or_no_samples_hold_the_limit(machine):
+    controller = ConcurrencyController(1, 6, initial=3)
+    assert run_window(controller, 0.5, tasks=2) == 3
+    assert controller.adjust() == 3
+    assert controller.history == []
+
+
+def test_latency_spike_decreases_multiplicatively(machine):
+    controller = ConcurrencyController(1, 10, initial=10)
+    run_window(controller, 0.5)
+    assert controller.limit == 10
+    assert run_window(controller, 5.0) == int(10 * DECREASE_FACTOR)
+    assert controller.history[-1][2].startswith("decrease: latency")
+
+
+def test_timeouts_decrease_but_not_below_min(machine):
+    controller = ConcurrencyController(3, 10, initial=4)
+    assert run_window(controller, 0.5, timed_out=2) == 3
+    assert run_window(controller, 0.5, timed_out=2) == 3
+
+
+@pytest.mark.parametrize("load", [{"cpu": 99.0}, {"free_mb": 100.0}])
+def test_machine_pressure_decreases(machine, load):
+    machine.update(load)
+    controller = ConcurrencyController(1, 10, initial=10)
+    assert run_window(controller, 0.5) == int(10 * DECREASE_FACTOR)
+
+
+def test_baseline_drifts_up_with_a_slower_site(machine):
+    controller = ConcurrencyController(1, 20, initial=10)
+    run_window(controller, 1.0)
+    # Mỗi chu kỳ mức nền chỉ tăng tối đa BASELINE_DRIFT, nên trễ tăng từ từ không bị coi là quá tải
+    for latency in (1.1, 1.2, 1.3):
+        limit = controller.limit
+        assert run_window(controller, latency) == limit + 1
+
+
+def test_on_change_is_called_with_the_new_limit(machine):
+    changes = []
+    controller = ConcurrencyController(1, 4, initial=2, on_change=changes.append)
+    run_window(controller, 0.5)
+    run_window(controller, 0.5, tasks=1)
+    assert changes == [3]
+
+
+def test_stop_wakes_blocked_workers(machine):
+    controller = ConcurrencyController(1, 1)
+    assert controller.acquire(timeout=0)
+    waiter = threading.Thread(target=controller.acquire)
+    waiter.start()
+    controller.stop()
+    waiter.join(timeout=2)
+    assert not waiter.is_alive()
@@ -0,0 +1,89 @@
+# test_crawl_frontier.py
+"""CrawlFrontier: chạy tiếp từ trang đã checkpoint và chọn lại URL lỗi hoặc làm dở."""
+import pytest
+
+from crawl_frontier import (FRONTIER_MAX_ATTEMPTS, STATE_DONE, STATE_FAILED, STATE_PARTIAL, STATE_PENDING,
+                            CrawlFrontier)
+
+TASKS = [("https://tiki.vn/a-p1.html", "0"), ("https://tiki.vn/b-p2.html", "1"), ("https://tiki.vn/c-p3.html", "2")]
+
+
+@pytest.fixture
+def frontier_path(tmp_path):
+    return str(tmp_path / "crawl_frontier.sqlite")
+
+
+def test_known_urls_keep_their_state(frontier_path):
+    frontier = CrawlFrontier(frontier_path)
+    assert frontier.add_tasks(TASKS) == 3
+    frontier.lease(TASKS[0][0], "worker")
+    frontier.mark_done(TASKS[0][0])
+    assert frontier.add_tasks(TASKS) == 0
+    assert frontier.summary() == {STATE_DONE: 1, STATE_PENDING: 2}
+    frontier.close()
+
+
+def test_restart_resumes_after_the_last_checkpointed_page(frontier_path):
+    url = TASKS[0][0]
+    frontier = CrawlFrontier(frontier_path)
+    frontier.add_tasks(TASKS)
+    assert frontier.lease(url, "worker") == 1
+    frontier.record_page(url, 1, 5)
+    frontier.record_page(url, 2, 5)
+    frontier.close() # Dừng giữa chừng, URL vẫn đang in_progress
+
+    restarted = CrawlFrontier(frontier_path)
+    assert restarted.has_progress()
+    assert restarted.resumable_tasks() == TASKS
+    assert restarted.resume_page(url) == 3
+    assert restarted.lease(url, "worker") == 3
+    assert restarted.review_count(url) == 10
+    restarted.close()
+
+
+def test_active_leases_are_only_stolen_when_asked(frontier_path):
+    frontier = CrawlFrontier(frontier_path)
+    frontier.add_tasks(TASKS)
+    frontier.lease(TASKS[0][0], "other-machine")
+    assert TASKS[0] not in frontier.resumable_tasks(steal_active_leases=False)
+    assert TASKS[0] in frontier.resumable_tasks(steal_active_leases=True)
+    frontier.close()
+
+
+def test_done_urls_are_skipped_and_failed_or_partial_ones_retried(frontier_path):
+    frontier = CrawlFrontier(frontier_path)
+    frontier.add_tasks(TASKS)
+    for url, _ in TASKS:
+        frontier.lease(url, "worker")
+    frontier.mark_done(TASKS[0][0])
+    frontier.mark_failed(TASKS[1][0], "HTTP 500")
+    frontier.record_page(TASKS[2][0], 4, 20)
+    frontier.mark_partial(TASKS[2][0], "pages 5-10 failed after 3 attempts")
+
+    assert frontier.summary() == {STATE_DONE: 1, STATE_FAILED: 1, STATE_PARTIAL: 1}
+    assert frontier.resumable_tasks() == TASKS[1:]
+    # URL làm dở tiếp tục từ chỗ hổng, không từ đầu
+    assert frontier.resume_page(TASKS[2][0]) == 5
+    frontier.close()
+
+
+def test_urls_stop_being_retried_after_max_attempts(frontier_path):
+    url = TASKS[0][0]
+    frontier = CrawlFrontier(frontier_path)
+    frontier.add_tasks(TASKS[:1])
+    for _ in range(FRONTIER_MAX_ATTEMPTS):
+        assert frontier.resumable_tasks() == TASKS[:1]
+        frontier.lease(url, "worker")
+        frontier.mark_failed(url, "HTTP 500")
+    assert frontier.resumable_tasks() == []
+    frontier.close()
+
+
+def test_reset_forgets_progress(frontier_path):
+    frontier = CrawlFrontier(frontier_path)
+    frontier.add_tasks(TASKS)
+    frontier.lease(TASKS[0][0], "worker")
+    frontier.reset()
+    assert not frontier.has_progress()
+    assert frontier.resumable_tasks() == []
+    frontier.close()
@@ -0,0 +1,118 @@
+# test_engines.py
+"""Engine HTTP và asyncio chạy trên fixture server cục bộ, kể cả khi server trả lỗi 5xx ngẫu nhiên."""
+import pytest
+
+from fixture_server import FixtureConfig, FixtureServer
+from http_engine import HttpFetchError, HttpReviewFetcher
+
+FIXTURE_PRODUCTS = 6
+
+
+def fixture_config(failure_rate: float = 0.0) -> FixtureConfig:
+    return FixtureConfig(products=FIXTURE_PRODUCTS, min_pages=2, max_pages=4, reviews_per_page=5,
+                         failure_rate=failure_rate)
+
+
+def crawl_http(server: FixtureServer) -> int:
+    fetcher = HttpReviewFetcher(server.base_url)
+    try:
+        return sum(len(fetcher.fetch_reviews(url, detail))
+                   for url, detail, _ in server.catalogue.product_urls(server.base_url))
+    finally:
+        fetcher.close()
+
+
+@pytest.mark.parametrize("failure_rate", [0.0, 0.05])
+def test_http_engine_collects_every_review(failure_rate):
+    with FixtureServer(fixture_config(failure_rate)) as server:
+        assert crawl_http(server) == server.catalogue.total_reviews()
+
+
+def test_http_engine_reports_pages_that_keep_failing():
+    with FixtureServer(fixture_config(failure_rate=1.0)) as server:
+        url, detail, _ = server.catalogue.product_urls(server.base_url)[0]
+        fetcher = HttpReviewFetcher(server.base_url)
+        try:
+            with pytest.raises(HttpFetchError):
+                fetcher.fetch_reviews(url, detail)
+        finally:
+            fetcher.close()
+
+
+def test_http_engine_hands_pages_to_on_page_in_order():
+    with FixtureServer(fixture_config()) as server:
+        url, detail, count = server.catalogue.product_urls(server.base_url)[0]
+        pages = []
+        fetcher = HttpReviewFetcher(server.base_url)
+        try:
+            kept = fetcher.fetch_reviews(url, detail, start_page=2, on_page=lambda page, rows: pages.append((page, len(rows))))
+        finally:
+            fetcher.close()
+    assert len(kept) == 0
+    assert [page for page, _ in pages] == list(range(2, count // 5 + 1))
+
+
+@pytest.mark.parametrize("failure_rate", [0.0, 0.05])
+def test_async_engine_collects_every_review(monkeypatch, failure_rate):
+    pytest.importorskip("aiohttp")
+    import async_crawler
+
+    monkeypatch.setattr(async_crawler, "RETRY_BACKOFF_SECONDS", 0.01)
+    with FixtureServer(fixture_config(failure_rate)) as server:
+        tasks = [(url, detail) for url, detail, _ in server.catalogue.product_urls(server.base_url)]
+        delivered = []
+        done = []
+        _, failed = async_crawler.run_async_crawl(tasks, base_url=server.base_url, sink=delivered.extend,
+                                                  on_done=lambda url, count: done.append(url))
+        assert failed == []
+        assert len(delivered) == server.catalogue.total_reviews()
+        assert sorted(done) == sorted(url for url, _ in tasks)
+
+
+def delivered_pages(reviews):
+    """Maps product id -> pages present in delivered fixture reviews (content ends with `(#id-page-index)`)."""
+    pages = {}
+    for review in reviews:
+        product_id, page, _ = review["content"].rsplit("(#", 1)[1].rstrip(")").split("-")
+        pages.setdefault(product_id, set()).add(int(page))
+    return pages
+
+
+def test_async_engine_keeps_the_pages_before_a_failed_page(monkeypatch):
+    pytest.importorskip("aiohttp")
+    import async_crawler
+
+    monkeypatch.setattr(async_crawler, "RETRY_BACKOFF_SECONDS", 0.01)
+    config = FixtureConfig(products=FIXTURE_PRODUCTS, min_pages=6, max_pages=8, reviews_per_page=5, failure_rate=0.4)
+    with FixtureServer(config) as server:
+        tasks = [(url, detail) for url, detail, _ in server.catalogue.product_urls(server.base_url)]
+        delivered = []
+        done, partial = {}, {}
+        _, failed = async_crawler.run_async_crawl(
+            tasks, base_url=server.base_url, sink=delivered.extend,
+            on_done=lambda url, count: done.__setitem__(url, count),
+            on_partial=lambda url, saved_through, count: partial.__setitem__(url, (saved_through, count)))
+
+    pages = delivered_pages(delivered)
+    for url, (saved_through, count) in partial.items():
+        product_id = url.split("-p")[-1].split(".")[0]
+        # Chỉ các trang liền mạch từ trang 1 tới trước chỗ hổng được giao
+        assert pages[product_id] == set(range(1, saved_through + 1))
+        assert count == saved_through * 5
+    for url in done:
+        product_id = url.split("-p")[-1].split(".")[0]
+        assert pages[product_id] == set(range(1, server.catalogue.products[product_id][1] + 1))
+    assert set(partial) <= {url for url, _ in failed}
+    assert len(delivered) == sum(done.values()) + sum(count for _, count in partial.values())
+
+
+def test_async_engine_does_not_retry_client_errors(monkeypatch):
+    pytest.importorskip("aiohttp")
+    import async_crawler
+
+    monkeypatch.setattr(async_crawler, "RETRY_BACKOFF_SECONDS", 5.0)
+    with FixtureServer(fixture_config()) as server:
+        missing = (f"{server.base_url}/khong-ton-tai-p999.html?spid=1", "0")
+        _, failed = async_crawler.run_async_crawl([missing], base_url=server.base_url)
+        assert failed == [missing]
+        assert server.requests_served == 1
@@ -0,0 +1,29 @@
+# test_fixture_server.py
+"""Fixture server: catalogue tất định và lỗi được chèn theo cấu hình."""
+import requests
+
+from fixture_server import FixtureCatalogue, FixtureConfig, FixtureServer
+from http_engine import REVIEWS_API_PATH
+
+
+def test_catalogue_is_deterministic_for_a_seed():
+    config = FixtureConfig(products=4, min_pages=1, max_pages=9, seed=7)
+    first, second = FixtureCatalogue(config), FixtureCatalogue(config)
+    assert first.products == second.products
+    assert first.page_payload("100000", 1) == second.page_payload("100000", 1)
+
+
+def test_reviews_api_serves_every_page_of_a_product():
+    with FixtureServer(FixtureConfig(products=1, min_pages=3, max_pages=3, reviews_per_page=4)) as server:
+        pages = [requests.get(f"{server.base_url}{REVIEWS_API_PATH}",
+                              params={"product_id": "100000", "page": page}, timeout=5).json()
+                 for page in (1, 3, 4)]
+        assert server.requests_served == 3
+    assert [len(page["data"]) for page in pages] == [4, 4, 0]
+    assert pages[0]["paging"]["last_page"] == 3
+
+
+def test_injected_failures_return_server_errors():
+    with FixtureServer(FixtureConfig(products=1, failure_rate=1.0)) as server:
+        response = requests.get(f"{server.base_url}{REVIEWS_API_PATH}", params={"product_id": "100000"}, timeout=5)
+    assert response.status_code == 500
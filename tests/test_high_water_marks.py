@@ -0,0 +1,60 @@
+# test_high_water_marks.py
+"""Mốc review mới nhất: so theo id/thời điểm khi có, digest chỉ dùng cho dòng không có id."""
+from high_water_marks import HighWaterMark, HighWaterMarkStore, IncrementalCutoff
+
+BOILERPLATE = {"title": "Cực kì hài lòng", "content": ""}
+
+
+def api_item(review_id, created_at, **fields):
+    return {"id": review_id, "created_at": created_at, **(fields or BOILERPLATE)}
+
+
+def test_newer_review_with_the_same_boilerplate_text_does_not_stop_the_crawl():
+    mark = HighWaterMark.from_api_item(api_item(100, 1_700_000_000), "0")
+    cutoff = IncrementalCutoff("0", mark)
+    assert not cutoff.reached_by_item(api_item(250, 1_700_500_000))
+    assert cutoff.reached_by_item(api_item(100, 1_700_000_000))
+
+
+def test_ids_decide_before_timestamps():
+    mark = HighWaterMark(100, 1_700_000_000, "x")
+    assert mark.covers(HighWaterMark(99, 1_800_000_000, "y"))
+    assert not mark.covers(HighWaterMark(101, 1_600_000_000, "y"))
+
+
+def test_timestamps_decide_when_an_id_is_missing():
+    mark = HighWaterMark(None, 1_700_000_000, "x")
+    assert mark.covers(HighWaterMark(5, 1_600_000_000, "y"))
+    assert not mark.covers(HighWaterMark(5, 1_800_000_000, "x"))
+    # Cùng thời điểm: chỉ digest mới phân biệt được
+    assert mark.covers(HighWaterMark(None, 1_700_000_000, "x"))
+    assert not mark.covers(HighWaterMark(None, 1_700_000_000, "y"))
+
+
+def test_scraped_rows_fall_back_to_the_digest():
+    row = {"title": "Hài lòng", "content": "Giao nhanh", "type": "0"}
+    mark = HighWaterMark.from_row(row)
+    cutoff = IncrementalCutoff("0", mark)
+    assert not cutoff.reached_by_row({"title": "Hài lòng", "content": "Đóng gói kỹ"})
+    assert cutoff.reached_by_row(row)
+
+
+def test_next_mark_is_the_newest_review_seen():
+    previous = HighWaterMark(100, None, "x")
+    cutoff = IncrementalCutoff("0", previous)
+    cutoff.reached_by_item(api_item(300, None))
+    cutoff.reached_by_item(api_item(200, None))
+    assert cutoff.next_mark().review_id == 300
+    assert IncrementalCutoff("0", previous).next_mark() is previous
+
+
+def test_store_round_trips_marks(tmp_path):
+    store = HighWaterMarkStore(str(tmp_path / "high_water_marks.sqlite"))
+    store.put("u1", HighWaterMark(7, 1_700_000_000, "abc"))
+    store.put("u1", HighWaterMark(9, None, "def"))
+    mark = store.get("u1")
+    assert (mark.review_id, mark.created_at, mark.digest) == (9, None, "def")
+    assert store.get("u2") is None
+    store.reset()
+    assert len(store) == 0
+    store.close()
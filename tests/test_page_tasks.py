@@ -0,0 +1,82 @@
+# test_page_tasks.py
+"""PageMerger: trả trang theo thứ tự, chạy lại khoảng trang lỗi và giữ các trang trước chỗ hổng."""
+from page_tasks import PAGE_RANGE_MAX_ATTEMPTS, PageMerger, split_page_range
+
+
+class MergerProbe:
+    """Records what a PageMerger emits, requeues and reports."""
+
+    def __init__(self, first_page: int, range_count: int, requeue: bool = True):
+        self.emitted = []
+        self.requeued = []
+        self.finished = []
+        self.merger = PageMerger("https://tiki.vn/p1.html", first_page, range_count,
+                                 on_emit=lambda page, rows: self.emitted.append(page),
+                                 on_finish=lambda error, saved: self.finished.append((error, saved)),
+                                 requeue=(lambda *args: self.requeued.append(args)) if requeue else None)
+
+    def add_pages(self, first_page: int, last_page: int):
+        for page in range(first_page, last_page + 1):
+            self.merger.add(page, [{"title": str(page)}])
+
+
+def test_split_page_range_covers_every_page_once():
+    assert split_page_range(3, 14, 5) == [(3, 7), (8, 12), (13, 14)]
+    assert split_page_range(1, 1, 5) == [(1, 1)]
+
+
+def test_pages_are_emitted_in_order_whatever_the_arrival_order():
+    probe = MergerProbe(1, 2)
+    probe.add_pages(4, 6)
+    assert probe.emitted == []
+    probe.add_pages(1, 3)
+    probe.merger.range_done()
+    probe.merger.range_done()
+    assert probe.emitted == [1, 2, 3, 4, 5, 6]
+    assert probe.finished == [(None, 6)]
+
+
+def test_failed_range_requeues_only_its_missing_pages():
+    probe = MergerProbe(1, 2)
+    probe.add_pages(1, 5)
+    probe.add_pages(6, 7)
+    assert probe.merger.range_failed(6, 10, "HTTP 500") is True
+    assert probe.requeued == [(8, 10, 2)]
+    assert probe.finished == []
+
+    # Lần thử lại thành công: sản phẩm xong trọn vẹn
+    probe.merger.range_done()
+    probe.add_pages(8, 10)
+    probe.merger.range_done()
+    assert probe.emitted == list(range(1, 11))
+    assert probe.finished == [(None, 10)]
+
+
+def test_range_giving_up_keeps_the_pages_before_the_gap():
+    probe = MergerProbe(1, 3)
+    probe.add_pages(1, 5)
+    probe.add_pages(11, 15)
+    probe.merger.range_done()
+    probe.merger.range_done()
+    assert probe.merger.range_failed(6, 10, "HTTP 500", attempt=PAGE_RANGE_MAX_ATTEMPTS) is False
+    assert probe.requeued == []
+    # Trang 11-15 nằm sau chỗ hổng nên không được trả ra, checkpoint dừng ở trang 5
+    assert probe.emitted == [1, 2, 3, 4, 5]
+    error, saved_through = probe.finished[0]
+    assert f"failed after {PAGE_RANGE_MAX_ATTEMPTS} attempts" in error
+    assert saved_through == 5
+
+
+def test_failure_without_requeue_reports_nothing_saved_before_the_first_page():
+    probe = MergerProbe(6, 1, requeue=False)
+    assert probe.merger.range_failed(6, 10, "timeout") is False
+    assert probe.emitted == []
+    assert probe.finished[0][1] == 5
+
+
+def test_failure_after_the_last_page_of_the_range_is_not_a_gap():
+    probe = MergerProbe(1, 1)
+    probe.add_pages(1, 5)
+    assert probe.merger.range_failed(1, 5, "connection reset") is False
+    assert probe.requeued == []
+    assert probe.finished == [(None, 5)]
@@ -0,0 +1,49 @@
+# test_result_writer.py
+"""StreamingResultWriter: callback `on_durable` chỉ chạy sau khi lô đã được ghi và sync."""
+import csv
+import threading
+
+from result_writer import StreamingResultWriter
+
+COLUMNS = ["title", "content", "type"]
+
+
+def rows(count: int, prefix: str = "r"):
+    return [{"title": prefix, "content": f"{prefix}{i}", "type": "0"} for i in range(count)]
+
+
+def test_rows_are_written_and_callbacks_run_in_submit_order(tmp_path):
+    output = str(tmp_path / "raw_data.csv")
+    order = []
+    writer = StreamingResultWriter(output, COLUMNS, batch_rows=3)
+    writer.start()
+    writer.submit(rows(2, "a"), on_durable=lambda: order.append("a"))
+    writer.when_durable(lambda: order.append("barrier"))
+    writer.submit(rows(4, "b"), on_durable=lambda: order.append("b"))
+    assert writer.close() == 6
+
+    assert order == ["a", "barrier", "b"]
+    with open(output, newline="", encoding="utf-8-sig") as handle:
+        assert [row["content"] for row in csv.DictReader(handle)] == [f"a{i}" for i in range(2)] + [f"b{i}" for i in range(4)]
+
+
+def test_callback_waits_for_the_sync(tmp_path):
+    output = str(tmp_path / "raw_data.csv")
+    synced = threading.Event()
+    writer = StreamingResultWriter(output, COLUMNS, fsync_interval=60)
+    writer.start()
+    writer.submit(rows(1), on_durable=synced.set)
+    # Lô chưa đủ batch_rows và chưa đến lúc fsync: chưa có gì được coi là đã lưu
+    assert not synced.wait(0.3)
+    writer.close()
+    assert synced.is_set()
+
+
+def test_callbacks_never_run_when_the_writer_fails(tmp_path):
+    called = []
+    writer = StreamingResultWriter(str(tmp_path), COLUMNS) # Thư mục: không mở được để ghi
+    writer.start()
+    writer.submit(rows(2), on_durable=lambda: called.append(True))
+    writer.close()
+    assert writer.error is not None
+    assert called == []
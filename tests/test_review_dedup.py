@@ -0,0 +1,101 @@
+# test_review_dedup.py
+"""ReviewDeduplicator: tập đã thấy lưu bền qua các lần chạy và chỉ ghi nhận dòng đã được commit."""
+import pytest
+
+from review_dedup import ReviewDeduplicator, review_digest, seen_set_path_for
+
+
+def review(title: str, content: str, review_type: str = "0"):
+    return {"title": title, "content": content, "type": review_type}
+
+
+@pytest.fixture
+def seen_path(tmp_path):
+    return seen_set_path_for(str(tmp_path / "raw_data.csv"))
+
+
+def test_duplicates_are_dropped_after_normalization(seen_path):
+    dedup = ReviewDeduplicator(seen_path)
+    rows = dedup.filter([review("Hài lòng", "Tốt  lắm"), review("Hài lòng", " Tốt lắm "), review("Hài lòng", "Tốt lắm", "1")])
+    assert len(rows) == 2
+    assert dedup.duplicates_dropped == 1
+    dedup.close()
+
+
+def test_seen_set_survives_a_clean_restart(seen_path):
+    dedup = ReviewDeduplicator(seen_path)
+    dedup.filter([review("a", "first"), review("b", "second")])
+    dedup.close()
+
+    restarted = ReviewDeduplicator(seen_path)
+    assert len(restarted) == 2
+    assert restarted.filter([review("a", "first"), review("c", "third")]) == [review("c", "third")]
+    restarted.close()
+
+    assert len(ReviewDeduplicator(seen_path)) == 3
+
+
+def test_committed_digests_survive_a_crash(seen_path):
+    dedup = ReviewDeduplicator(seen_path)
+    rows, digests = dedup.claim([review("a", "written")])
+    dedup.commit(digests)
+    # Không close(): digest chỉ nằm trong file .pending như sau một crash
+    restarted = ReviewDeduplicator(seen_path)
+    assert restarted.seen(review_digest("a", "written", "0"))
+    restarted.close()
+
+
+def test_claims_are_forgotten_unless_committed(seen_path):
+    dedup = ReviewDeduplicator(seen_path)
+    rows, _ = dedup.claim([review("a", "never written")])
+    assert rows and dedup.claim([review("a", "never written")])[0] == []
+    dedup.close()
+
+    restarted = ReviewDeduplicator(seen_path)
+    assert not restarted.seen(review_digest("a", "never written", "0"))
+    restarted.close()
+
+
+def test_torn_pending_digest_is_ignored(seen_path):
+    dedup = ReviewDeduplicator(seen_path)
+    dedup.filter([review("a", "complete")])
+    with open(dedup.pending_path, "ab") as handle:
+        handle.write(b"\x01\x02\x03") # Digest ghi dở khi crash
+
+    restarted = ReviewDeduplicator(seen_path)
+    assert len(restarted) == 1
+    restarted.close()
+
+
+def test_reset_forgets_every_digest(seen_path):
+    dedup = ReviewDeduplicator(seen_path)
+    dedup.filter([review("a", "old")])
+    dedup.close()
+
+    restarted = ReviewDeduplicator(seen_path)
+    restarted.reset()
+    assert restarted.filter([review("a", "old")]) == [review("a", "old")]
+    restarted.close()
+
+
+def test_writer_commits_digests_only_for_rows_it_wrote(tmp_path, seen_path):
+    from result_writer import StreamingResultWriter
+
+    dedup = ReviewDeduplicator(seen_path)
+    writer = StreamingResultWriter(str(tmp_path / "raw_data.csv"), ["title", "content", "type"], deduplicator=dedup)
+    writer.start()
+    writer.submit([review("a", "written")])
+    writer.close()
+
+    # Đường dẫn output là một thư mục: writer không ghi được gì
+    failing = StreamingResultWriter(str(tmp_path), ["title", "content", "type"], deduplicator=dedup)
+    failing.start()
+    failing.submit([review("b", "lost")])
+    failing.close()
+    assert failing.error is not None
+    dedup.close()
+
+    restarted = ReviewDeduplicator(seen_path)
+    assert restarted.seen(review_digest("a", "written", "0"))
+    assert not restarted.seen(review_digest("b", "lost", "0"))
+    restarted.close()
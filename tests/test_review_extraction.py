@@ -0,0 +1,32 @@
+# test_review_extraction.py
+"""Trích xuất review từ HTML: các trường phụ chỉ được quét và trả về khi được yêu cầu."""
+import pytest
+
+from review_extraction import PARSER_LXML, PARSER_STDLIB, extract_reviews_from_html, rows_from_raw_reviews
+
+WIDGET_HTML = (
+    '<div id="customer-review-widget-id">'
+    '<div class="review-comment"><div class="review-comment__user-name">An</div>'
+    '<div class="review-comment__title">Hài lòng</div>'
+    '<div class="review-comment__content"><span>Giao nhanh</span></div></div>'
+    '<div class="review-comment"><div class="review-comment__title">Bình thường</div></div>'
+    '</div>'
+)
+
+
+@pytest.mark.parametrize("backend", [PARSER_STDLIB, PARSER_LXML])
+def test_rows_carry_extra_fields_only_when_asked(backend):
+    if backend == PARSER_LXML:
+        pytest.importorskip("lxml.cssselect")
+    plain = extract_reviews_from_html(WIDGET_HTML, backend=backend)
+    assert [row.to_dict() for row in plain] == [{"title": "Hài lòng", "content": "Giao nhanh"},
+                                                {"title": "Bình thường", "content": "N/A"}]
+    with_extra = extract_reviews_from_html(WIDGET_HTML, include_extra=True, backend=backend)
+    assert with_extra[0]["user_name"] == "An"
+    assert "user_name" not in with_extra[1]
+
+
+def test_raw_extra_is_dropped_unless_included():
+    raw = [{"title": "a", "content": None, "extra": {"date": "1/1"}}]
+    assert rows_from_raw_reviews(raw)[0].to_dict() == {"title": "a", "content": "N/A"}
+    assert rows_from_raw_reviews(raw, include_extra=True)[0]["date"] == "1/1"
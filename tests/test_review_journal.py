@@ -0,0 +1,117 @@
+# test_review_journal.py
+"""ReviewJournal: khôi phục sau crash, gộp thành CSV và xoá sau khi lượt chạy xong."""
+import csv
+import os
+
+import pytest
+
+from review_journal import ReviewJournal, journal_path_for, tail
+
+COLUMNS = ["title", "content", "type"]
+
+
+def rows_for(url_index: int, count: int):
+    return [{"title": f"t{url_index}", "content": f"c{url_index}-{i}", "type": "0"} for i in range(count)]
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return journal_path_for(str(tmp_path / "raw_data.csv"))
+
+
+def read_csv(path: str):
+    with open(path, newline="", encoding="utf-8") as handle:
+        return list(csv.DictReader(handle))
+
+
+def test_compact_writes_every_journaled_row_in_order(tmp_path, journal_path):
+    journal = ReviewJournal(journal_path, fsync=False)
+    journal.append("u1", rows_for(1, 2))
+    journal.append("u2", [])
+    journal.append("u3", rows_for(3, 3))
+    output = str(tmp_path / "raw_data.csv")
+    assert journal.compact(output, COLUMNS) == 5
+    journal.close()
+
+    assert read_csv(output) == rows_for(1, 2) + rows_for(3, 3)
+    assert not os.path.exists(output + ".tmp")
+
+
+def test_records_survive_reopening(journal_path):
+    journal = ReviewJournal(journal_path, fsync=False)
+    journal.append("u1", rows_for(1, 2))
+    journal.append("u2", rows_for(2, 1))
+    journal.close()
+
+    reopened = ReviewJournal(journal_path, fsync=False)
+    assert len(reopened) == 2
+    assert reopened.review_count() == 3
+    assert reopened.processed_urls() == {"u1", "u2"}
+    reopened.close()
+
+
+def test_torn_tail_is_truncated_on_recovery(journal_path):
+    journal = ReviewJournal(journal_path, fsync=False)
+    journal.append("u1", rows_for(1, 2))
+    journal.close()
+    with open(journal_path, "ab") as handle:
+        handle.write(b"RJ01\x00\x10") # Bản ghi ghi dở khi crash
+
+    reopened = ReviewJournal(journal_path, fsync=False)
+    assert reopened.processed_urls() == {"u1"}
+    reopened.append("u2", rows_for(2, 1))
+    reopened.close()
+    assert [url for url, _ in tail(journal_path)] == ["u1", "u2"]
+
+
+def test_record_missing_from_the_index_is_reindexed(journal_path):
+    journal = ReviewJournal(journal_path, fsync=False)
+    journal.append("u1", rows_for(1, 1))
+    journal.append("u2", rows_for(2, 1))
+    journal.close()
+    # Crash sau khi ghi segment nhưng trước khi ghi index của bản ghi cuối
+    with open(journal_path + ".idx", "r+b") as handle:
+        handle.truncate(os.path.getsize(journal_path + ".idx") // 2)
+
+    reopened = ReviewJournal(journal_path, fsync=False)
+    assert [url for url, _ in reopened.records()] == ["u1", "u2"]
+    reopened.close()
+
+
+def test_reset_after_compaction_empties_the_journal(tmp_path, journal_path):
+    journal = ReviewJournal(journal_path, fsync=False)
+    journal.append("u1", rows_for(1, 2))
+    journal.compact(str(tmp_path / "raw_data.csv"), COLUMNS)
+    journal.reset()
+    journal.append("u9", rows_for(9, 1))
+    journal.close()
+
+    reopened = ReviewJournal(journal_path, fsync=False)
+    assert reopened.processed_urls() == {"u9"}
+    reopened.close()
+
+
+def test_follower_restarts_after_the_journal_is_reset(journal_path):
+    import threading
+
+    journal = ReviewJournal(journal_path, fsync=False)
+    journal.append("u1", rows_for(1, 1))
+    seen = []
+    second_run = threading.Event()
+
+    def follow():
+        for url, _ in tail(journal_path, follow=True, poll_interval=0.01):
+            seen.append(url)
+            if url == "u2":
+                second_run.set()
+                return
+
+    follower = threading.Thread(target=follow, daemon=True)
+    follower.start()
+    while not seen:
+        second_run.wait(0.01)
+    journal.reset()
+    journal.append("u2", rows_for(2, 1))
+    assert second_run.wait(5)
+    assert seen == ["u1", "u2"]
+    journal.close()
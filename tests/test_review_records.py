@@ -0,0 +1,37 @@
+# test_review_records.py
+"""ReviewRecord hành xử như dict nó thay thế; ReviewColumns giữ type dưới dạng mã số."""
+import pytest
+
+from review_records import ReviewColumns, ReviewRecord
+
+
+def test_record_reads_and_writes_like_a_dict():
+    record = ReviewRecord("Hài lòng", "Tốt", "3")
+    record["author"] = "An"
+    assert record["title"] == "Hài lòng"
+    assert record.get("missing", "-") == "-"
+    assert list(record) == ["title", "content", "type", "author"]
+    assert record == {"title": "Hài lòng", "content": "Tốt", "type": "3", "author": "An"}
+    with pytest.raises(KeyError):
+        record["missing"]
+
+
+def test_record_without_type_has_no_type_key():
+    assert dict(ReviewRecord("a", "b")) == {"title": "a", "content": "b"}
+
+
+def test_columns_intern_type_labels():
+    columns = ReviewColumns([{"title": "a", "content": "1", "type": "3"}, ReviewRecord("b", "2", "3"),
+                             ReviewRecord("c", "3", None)])
+    assert list(columns.type_codes) == [0, 0, 1]
+    assert columns.type_labels == ["3", "N/A"]
+    assert [record.to_dict() for record in columns][0] == {"title": "a", "content": "1", "type": "3"}
+
+
+def test_cleared_buffer_forgets_its_type_labels():
+    columns = ReviewColumns([ReviewRecord("a", "1", "old")])
+    columns.clear()
+    columns.append(ReviewRecord("b", "2", "new"))
+    assert len(columns) == 1
+    assert columns.type_labels == ["new"]
+    assert list(columns.type_codes) == [0]
@@ -0,0 +1,102 @@
+# test_scheduler.py
+"""WorkStealingScheduler: chia task lớn trước, worker rảnh lấy việc của worker khác và thoát bằng sentinel."""
+import threading
+
+from scheduler import WorkStealingScheduler
+
+
+def drain(scheduler: WorkStealingScheduler, worker_id: int, count: int):
+    """Takes and finishes `count` tasks as `worker_id`, returning them in order."""
+    taken = []
+    for _ in range(count):
+        taken.append(scheduler.get(worker_id))
+        scheduler.task_done()
+    return taken
+
+
+def test_tasks_are_dealt_largest_first_round_robin():
+    scheduler = WorkStealingScheduler(2)
+    assert scheduler.submit_all([("s", 1), ("xl", 100), ("m", 10), ("l", 50)]) == 4
+    assert scheduler.get(0) == "xl"
+    assert scheduler.get(1) == "l"
+    assert scheduler.get(0) == "m"
+    assert scheduler.get(1) == "s"
+    assert scheduler.steals == 0
+
+
+def test_idle_worker_steals_from_the_busiest_deque():
+    scheduler = WorkStealingScheduler(3)
+    scheduler.submit_all([("a", 90), ("b", 5), ("c", 1), ("d", 80), ("e", 4)])
+    # Worker 0: a, e (94); worker 1: d, c (81); worker 2: b
+    assert drain(scheduler, 2, 1) == ["b"]
+    assert drain(scheduler, 2, 1) == ["a"] # Deque còn nhiều việc nhất là của worker 0
+    assert scheduler.steals == 1
+    assert drain(scheduler, 0, 1) == ["e"]
+    assert drain(scheduler, 0, 2) == ["d", "c"]
+    assert scheduler.steals == 3
+    assert scheduler.pending() == 0
+
+
+def test_submit_goes_to_the_front_of_the_given_worker():
+    scheduler = WorkStealingScheduler(2)
+    scheduler.submit_all([("a", 10), ("b", 5), ("c", 1)])
+    scheduler.submit("follow-up", 3, worker_id=0)
+    assert scheduler.get(0) == "follow-up"
+    scheduler.submit("tail", 3, worker_id=1, front=False)
+    assert [scheduler.get(1) for _ in range(2)] == ["b", "tail"]
+
+
+def test_submit_without_worker_picks_the_least_loaded():
+    scheduler = WorkStealingScheduler(2)
+    scheduler.submit_all([("big", 100)])
+    scheduler.submit("new", 1)
+    assert scheduler.get(1) == "new"
+
+
+def test_empty_submission_releases_workers_at_once():
+    scheduler = WorkStealingScheduler(2)
+    assert scheduler.submit_all([]) == 0
+    assert scheduler.get(0) is None
+    assert scheduler.get(1) is None
+
+
+def test_every_worker_gets_the_sentinel_after_the_last_task():
+    scheduler = WorkStealingScheduler(3)
+    scheduler.submit_all([(f"t{i}", i) for i in range(10)])
+    done = []
+    lock = threading.Lock()
+
+    def work(worker_id):
+        while True:
+            task = scheduler.get(worker_id)
+            if task is None:
+                return
+            if task == "t9":
+                scheduler.submit("t9-rest", 1, worker_id) # Việc thêm trong lúc chạy vẫn được chờ
+            with lock:
+                done.append(task)
+            scheduler.task_done()
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(3)]
+    for thread in workers:
+        thread.start()
+    scheduler.join()
+    for thread in workers:
+        thread.join(timeout=2)
+
+    assert not any(thread.is_alive() for thread in workers)
+    assert sorted(done) == sorted([f"t{i}" for i in range(10)] + ["t9-rest"])
+
+
+def test_waiting_worker_is_woken_by_a_new_task_and_by_close():
+    scheduler = WorkStealingScheduler(2)
+    scheduler.submit_all([("held", 1)])
+    assert scheduler.get(0) == "held" # Chưa task_done(): worker 1 phải chờ, không nhận sentinel
+    results = []
+    waiter = threading.Thread(target=lambda: results.extend([scheduler.get(1), scheduler.get(1)]))
+    waiter.start()
+    scheduler.submit("late", 1, worker_id=0)
+    scheduler.close()
+    waiter.join(timeout=2)
+    assert not waiter.is_alive()
+    assert results == ["late", None]
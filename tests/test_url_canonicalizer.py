@@ -0,0 +1,104 @@
+# test_url_canonicalizer.py
+"""Chuẩn hoá URL: sửa scheme, giải URL tracking, bỏ tham số thừa và loại sản phẩm trùng."""
+import pytest
+
+from url_canonicalizer import (DROP_DUPLICATE, DROP_EMPTY, DROP_FOREIGN_HOST, DROP_NOT_PRODUCT,
+                               DROP_UNRESOLVED_TRACKER, canonical_product_url, canonicalize_tasks,
+                               embedded_redirect, product_key, repair_scheme)
+
+
+class StubResolver:
+    """Resolves tracking URLs from a fixed table instead of over HTTP."""
+
+    def __init__(self, destinations):
+        self.destinations = destinations
+        self.asked = []
+
+    def resolve_many(self, urls):
+        self.asked.extend(urls)
+        return {url: self.destinations.get(url) for url in urls}
+
+
+@pytest.mark.parametrize("raw", [
+    "ttps://tiki.vn/a-p1.html",
+    "htps://tiki.vn/a-p1.html",
+    "https//tiki.vn/a-p1.html",
+    "://tiki.vn/a-p1.html",
+    "tiki.vn/a-p1.html",
+    "  https://tiki.vn/a-p1.html ",
+])
+def test_repair_scheme_fixes_broken_prefixes(raw):
+    assert repair_scheme(raw) == "https://tiki.vn/a-p1.html"
+
+
+def test_repair_scheme_keeps_plain_http():
+    assert repair_scheme("http://localhost:8000/a-p1.html") == "http://localhost:8000/a-p1.html"
+
+
+def test_product_key_reads_id_and_numeric_spid_only():
+    assert product_key("https://tiki.vn/ao-thun-p123.html?spid=456&src=home") == ("123", "456")
+    assert product_key("https://tiki.vn/ao-thun-p123.html?spid=abc") == ("123", None)
+    assert product_key("https://tiki.vn/ao-thun-p123.html") == ("123", None)
+    assert product_key("https://tiki.vn/nha-sach-tiki/c8322") is None
+
+
+def test_canonical_url_keeps_only_path_and_spid():
+    url = "HTTPS://Tiki.VN/ao-thun-p123.html?src=search&spid=456&itm_campaign=x#reviews"
+    assert canonical_product_url(url) == "https://tiki.vn/ao-thun-p123.html?spid=456"
+    assert canonical_product_url("https://tiki.vn/ao-thun-p123.html?src=x") == "https://tiki.vn/ao-thun-p123.html"
+
+
+def test_embedded_redirect_needs_an_absolute_destination():
+    assert embedded_redirect("https://tka.tiki.vn/pixel?redirect=https%3A%2F%2Ftiki.vn%2Fa-p1.html") == \
+        "https://tiki.vn/a-p1.html"
+    assert embedded_redirect("https://tka.tiki.vn/pixel?url=/a-p1.html") is None
+    assert embedded_redirect("https://tka.tiki.vn/pixel?data=abc") is None
+
+
+def test_canonicalize_drops_bad_rows_and_keeps_first_duplicate():
+    tasks = [
+        ("ttps://tiki.vn/a-p1.html?spid=10&src=x", "type-a"),
+        ("https://tiki.vn/a-p1.html?spid=10", "type-b"),
+        ("https://tiki.vn/a-p1.html?spid=11", "type-a"),
+        ("", "type-a"),
+        (None, "type-a"),
+        ("https://shopee.vn/a-p2.html", "type-a"),
+        ("https://tiki.vn/search?q=ao", "type-a"),
+    ]
+    clean, report = canonicalize_tasks(tasks)
+
+    assert clean == [("https://tiki.vn/a-p1.html?spid=10", "type-a"), ("https://tiki.vn/a-p1.html?spid=11", "type-a")]
+    assert report.total == 7
+    assert report.kept == 2
+    assert report.schemes_repaired == 1
+    assert {reason: len(urls) for reason, urls in report.dropped.items()} == {
+        DROP_DUPLICATE: 1, DROP_EMPTY: 2, DROP_FOREIGN_HOST: 1, DROP_NOT_PRODUCT: 1}
+    assert report.dropped_count() == 5
+
+
+def test_tracking_urls_use_embedded_destination_without_resolver():
+    tasks = [
+        ("https://tka.tiki.vn/pixel/pixel?redirect=https%3A%2F%2Ftiki.vn%2Fb-p2.html%3Fspid%3D3", "t"),
+        ("https://tka.tiki.vn/pixel/pixel?data=opaque", "t"),
+    ]
+    clean, report = canonicalize_tasks(tasks)
+
+    assert clean == [("https://tiki.vn/b-p2.html?spid=3", "t")]
+    assert report.trackers_resolved == 1
+    assert list(report.dropped) == [DROP_UNRESOLVED_TRACKER]
+
+
+def test_tracking_urls_go_through_the_resolver_and_are_deduplicated():
+    tracker = "https://tka.tiki.vn/pixel/pixel?data=opaque"
+    resolver = StubResolver({tracker: "https://tiki.vn/b-p2.html?spid=3&src=ad"})
+    clean, report = canonicalize_tasks([(tracker, "t"), ("https://tiki.vn/b-p2.html?spid=3", "t")], resolver=resolver)
+
+    assert resolver.asked == [tracker]
+    assert clean == [("https://tiki.vn/b-p2.html?spid=3", "t")]
+    assert report.trackers_resolved == 1
+    assert list(report.dropped) == [DROP_DUPLICATE]
+
+
+def test_extra_hosts_are_accepted():
+    clean, _ = canonicalize_tasks([("http://127.0.0.1:8000/a-p1.html", "t")], extra_hosts=["127.0.0.1:8000"])
+    assert clean == [("http://127.0.0.1:8000/a-p1.html", "t")]